@@ -0,0 +1,93 @@
+# benchmarks/bench_analytics_queries.py
+"""
+Compare the old "load every row into pandas" analytics path with the
+SQL aggregation layer in utils.analytics_queries, which reads the rollups
+maintained by utils.rollups.
+
+Usage: python -m benchmarks.bench_analytics_queries [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.db_utils import VisitDetail
+from utils.migrations import upgrade
+from utils.rollups import refresh_rollups
+from utils.sample_data import generate_bulk_visits
+from utils.visit_explorer import fetch_page
+from utils import analytics_queries
+
+DEFAULT_SIZES = [10_000, 50_000, 200_000]
+
+def populate(db_path, rows):
+    """Fill a fresh database with synthetic page visits"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    upgrade(engine)
+    generate_bulk_visits(rows, seed=42, engine=engine, bulk_load=True)
+    engine.dispose()
+
+def legacy_path(session):
+    """The original implementation: materialize everything, aggregate in pandas"""
+    results = session.query(VisitDetail).all()
+    df = pd.DataFrame([{
+        "URL": r.url,
+        "Path": r.path,
+        "Referrer": r.referrer if r.referrer else "Direct",
+        "Device": r.device,
+        "Timestamp": r.timestamp
+    } for r in results])
+    len(df)
+    df["URL"].nunique()
+    df["Path"].value_counts().idxmax()
+    df["Referrer"].value_counts().idxmax()
+    df["Date"] = pd.to_datetime(df["Timestamp"]).dt.date
+    df.groupby("Date").size()
+    df["Device"].value_counts()
+    df["Path"].value_counts()
+
+def aggregated_path(session):
+    """The SQL aggregation layer used by the dashboard"""
+    analytics_queries.get_key_metrics(session)
+    analytics_queries.get_visits_per_day(session)
+    analytics_queries.get_referrer_counts(session)
+    analytics_queries.get_device_counts(session)
+    analytics_queries.get_page_counts(session)
+    fetch_page(session)
+
+def measure(func, session):
+    """Return (seconds, peak traced MiB) for one call"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(session)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.expunge_all()
+    return elapsed, peak / (1024 * 1024)
+
+def main(sizes):
+    print(f"{'rows':>10} | {'legacy s':>9} {'legacy MiB':>11} | {'rollup s':>9} | {'sql s':>7} {'sql MiB':>8}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.sqlite")
+            populate(db_path, rows)
+            engine = create_engine(f"sqlite:///{db_path}")
+            # One-off cost of folding the whole table into the rollups
+            start = time.perf_counter()
+            refresh_rollups(engine)
+            rollup_s = time.perf_counter() - start
+            Session = sessionmaker(bind=engine)
+            with Session() as session:
+                legacy_s, legacy_mib = measure(legacy_path, session)
+                sql_s, sql_mib = measure(aggregated_path, session)
+            engine.dispose()
+        print(f"{rows:>10,} | {legacy_s:>9.3f} {legacy_mib:>11.1f} | {rollup_s:>9.3f} | {sql_s:>7.3f} {sql_mib:>8.1f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
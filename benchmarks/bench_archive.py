@@ -0,0 +1,86 @@
+# benchmarks/bench_archive.py
+"""
+Moving old page visits to the Parquet archive (utils.archive): archive
+throughput, storage before and after, and raw-visit reads that now combine
+SQLite with the archive.
+
+Usage: python -m benchmarks.bench_archive [rows] [days_kept]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Point the shared engine and the archive at scratch space before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'archive.sqlite')}"
+os.environ["CODRON_ARCHIVE_DIR"] = os.path.join(_tmp_dir.name, "archive")
+
+from config import ARCHIVE_DIR
+from utils.analytics_queries import get_date_bounds, clear_cache
+from utils.archive import archive_visits
+from utils.db_utils import init_db, session_scope
+from utils.rollups import refresh_rollups
+from utils.sample_data import generate_bulk_visits
+from utils.visit_explorer import fetch_page
+
+DAYS = 365
+
+def database_bytes(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("VACUUM")
+    return os.path.getsize(engine.url.database)
+
+def archive_bytes():
+    return sum(path.stat().st_size for path in ARCHIVE_DIR.rglob("*.parquet"))
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        clear_cache()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def read_timings(session):
+    return {
+        "newest visits page": timed(lambda: fetch_page(session)),
+        "oldest visits page": timed(lambda: fetch_page(session, descending=False)),
+        "page sorted by url": timed(lambda: fetch_page(session, sort="url")),
+        "blog visits page": timed(lambda: fetch_page(session, {"path_prefix": "/blog"}, descending=False)),
+        "date bounds of /blog": timed(lambda: get_date_bounds(session, {"path_prefix": "/blog"}))
+    }
+
+def main(rows, days_kept):
+    engine = init_db()
+    generate_bulk_visits(rows, seed=42, days=DAYS, engine=engine, bulk_load=True)
+    refresh_rollups(engine)
+    sqlite_before = database_bytes(engine)
+    with session_scope() as session:
+        before = read_timings(session)
+
+    start = time.perf_counter()
+    result = archive_visits(days_kept, engine)
+    seconds = time.perf_counter() - start
+    sqlite_after = database_bytes(engine)
+    with session_scope() as session:
+        after = read_timings(session)
+
+    print(f"{rows:,} visits over {DAYS} days, keeping {days_kept} days in SQLite\n")
+    print(
+        f"archived {result['rows']:,} visits into {result['files']:,} files "
+        f"in {seconds:.1f} s ({result['rows'] / seconds:,.0f} visits/s)"
+    )
+    print(
+        f"storage: SQLite {sqlite_before / 1024 / 1024:.1f} MiB -> {sqlite_after / 1024 / 1024:.1f} MiB "
+        f"+ Parquet {archive_bytes() / 1024 / 1024:.1f} MiB\n"
+    )
+    print(f"{'read':<22} | {'SQLite ms':>9} | {'+ archive ms':>12}")
+    for name in before:
+        print(f"{name:<22} | {before[name]:>9.2f} | {after[name]:>12.2f}")
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days_kept = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    main(rows, days_kept)
@@ -0,0 +1,140 @@
+# benchmarks/bench_assistant.py
+"""
+Time to first token and response cache hit rate of the AI Assistant
+(utils.assistant).
+
+Over a scratch database with synthetic visits:
+- context: building the summary the model gets, cold and from the
+  analytics query cache, and its size next to the visits it summarizes
+- time to first token: a provider that waits like a remote model before
+  its first word, for new questions and for cached ones
+- hit rate: a Zipfian stream of questions, typed with varying case,
+  spacing and punctuation, against caches of several sizes, with and
+  without prompt normalization
+
+Usage: python -m benchmarks.bench_assistant [rows] [questions]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'assistant.sqlite')}"
+
+from utils import assistant
+from utils.analytics_queries import clear_cache
+from utils.db_utils import init_db, session_scope
+from utils.rollups import refresh_rollups
+from utils.sample_data import generate_bulk_visits
+
+DISTINCT_QUESTIONS = 500
+TOPICS = ["visits", "pages", "referrers", "devices", "locations", "visitors", "invoices", "overdue invoices", "projects", "traffic"]
+TEMPLATES = [
+    "How many {} did we get?", "Which {} are the most popular?", "Tell me about {}", "Summarize the {}",
+    "What changed in {} this month?", "Any trends in {}?", "Are {} growing?", "Compare {} with last month"
+]
+FIRST_TOKEN_SECONDS = 0.4
+TOKEN_SECONDS = 0.02
+RUNS = 20
+
+class RemoteLikeProvider(assistant.StubProvider):
+    """The stub provider, waiting before its first word like a remote model"""
+
+    name = "remote-like"
+
+    def stream(self, prompt, context):
+        time.sleep(FIRST_TOKEN_SECONDS)
+        yield from super().stream(prompt, context)
+
+def questions():
+    """DISTINCT_QUESTIONS different questions, most popular first"""
+    texts = [template.format(topic) for template in TEMPLATES for topic in TOPICS]
+    texts += [f"{text} ({i})" for i in range(DISTINCT_QUESTIONS) for text in texts][:DISTINCT_QUESTIONS - len(texts)]
+    return texts
+
+def typed(rng, question):
+    """The question as someone might type it"""
+    if rng.random() < 0.3:
+        question = question.lower()
+    if rng.random() < 0.2:
+        question = question.replace(" ", "  ", 1)
+    if rng.random() < 0.3:
+        question = question.rstrip("?") + rng.choice(["", "??", " ?"])
+    return question
+
+def percentiles(values):
+    values = sorted(values)
+    return values[len(values) // 2] * 1000, values[int(len(values) * 0.95)] * 1000
+
+def main(rows, count):
+    engine = init_db()
+    print(f"Generating {rows:,} visits over 60 days...")
+    generate_bulk_visits(rows, seed=42, days=60, engine=engine, bulk_load=True)
+    refresh_rollups(engine)
+
+    clear_cache()
+    with session_scope() as session:
+        start = time.perf_counter()
+        context = assistant.build_context(session)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        assistant.build_context(session)
+        warm = time.perf_counter() - start
+    print(
+        f"\nContext: {len(context.encode()):,} bytes summarizing {rows:,} visits, "
+        f"built in {cold * 1000:.0f} ms cold, {warm * 1000:.1f} ms from the query cache"
+    )
+
+    cache = assistant.ResponseCache(engine)
+    provider = RemoteLikeProvider(TOKEN_SECONDS)
+    misses, hits = [], []
+    for i in range(RUNS):
+        for timings in (misses, hits):
+            reply = assistant.ask(f"Which pages are the most popular ({i})?", context, provider, cache)
+            for _ in reply:
+                pass
+            timings.append(reply.first_token_seconds)
+    print(
+        f"\nTime to first token, provider waiting {FIRST_TOKEN_SECONDS * 1000:.0f} ms "
+        f"then {TOKEN_SECONDS * 1000:.0f} ms per word:"
+    )
+    for label, timings in (("new question", misses), ("cached", hits)):
+        p50, p95 = percentiles(timings)
+        print(f"    {label:<14} p50 {p50:8.2f} ms, p95 {p95:8.2f} ms")
+
+    rng = random.Random(42)
+    texts = questions()
+    weights = [1 / rank for rank in range(1, len(texts) + 1)]
+    stream = [typed(rng, question) for question in rng.choices(texts, weights, k=count)]
+    answer_bytes = sum(len(assistant.StubProvider().answer(text, context).encode()) for text in texts) / len(texts)
+    print(f"\n{count:,} questions, {len(texts):,} distinct, answers of {answer_bytes / 1024:.1f} KiB on average:")
+
+    provider = assistant.StubProvider(token_seconds=0)
+    normalize = assistant.normalize_prompt
+    for answers in (25, 100, 1000):
+        for normalized in (True, False):
+            cache = assistant.ResponseCache(engine, max_bytes=int(answers * answer_bytes))
+            cache.clear()
+            if not normalized:
+                assistant.normalize_prompt = lambda prompt: prompt
+            start = time.perf_counter()
+            for question in stream:
+                for _ in assistant.ask(question, context, provider, cache):
+                    pass
+            seconds = time.perf_counter() - start
+            assistant.normalize_prompt = normalize
+            stats = cache.stats()
+            print(
+                f"    room for {answers:>5,} answers, {'normalized' if normalized else 'raw':<10} prompts: "
+                f"hit rate {stats['hit_rate']:6.1%}, {stats['evictions']:>6,} evictions, "
+                f"{seconds / count * 1000:.2f} ms per question"
+            )
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    )
@@ -0,0 +1,135 @@
+# benchmarks/bench_auth.py
+"""
+Login latency with a large users.json.
+
+- legacy: re-read and parse users.json, scan every user (the old authenticate)
+- indexed: utils.auth_utils.authenticate with the mtime-checked user index
+- cached: the same login repeated within the verification cache TTL
+
+Also logs in from several threads at once. The bcrypt checks must
+overlap on the worker pool, as many at a time as there are workers (or
+threads), and finish faster than one at a time when there is more than
+one CPU.
+
+Usage: python -m benchmarks.bench_auth [users] [threads]
+Exits with status 1 if the checks do not run concurrently.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import bcrypt
+
+from config import BCRYPT_ROUNDS
+from utils import auth_utils
+from utils.json_store import JsonStore
+
+PASSWORD = "correct horse"
+
+def write_users(path, count):
+    """users.json with ``count`` users; only the last one has a real hash"""
+    filler = bcrypt.hashpw(b"filler", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    users = [
+        {"username": f"user{i}", "password_hash": filler, "email": f"user{i}@example.com"}
+        for i in range(count - 1)
+    ]
+    real = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+    users.append({"username": "target", "password_hash": real, "email": None})
+    path.write_text(json.dumps({"users": users}))
+
+def legacy_authenticate(path, username, password):
+    """The old authenticate(): parse the whole file and scan it"""
+    with open(path) as f:
+        users = json.load(f)["users"]
+    for user in users:
+        if user["username"] == username and bcrypt.checkpw(
+            password.encode("utf-8"),
+            user["password_hash"].encode("utf-8")
+        ):
+            return True
+    return False
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+def main(user_count, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "users.json"
+        write_users(path, user_count)
+        auth_utils._users_store = JsonStore(path)
+        print(f"{user_count:,} users, bcrypt cost {BCRYPT_ROUNDS}, {auth_utils.AUTH_VERIFY_WORKERS} verify workers\n")
+
+        legacy_ms = timed(lambda: legacy_authenticate(path, "target", PASSWORD), 5)
+
+        start = time.perf_counter()
+        auth_utils.get_user("target")
+        index_ms = (time.perf_counter() - start) * 1000
+        assert auth_utils.get_user("user0") is not None
+
+        def fresh_login():
+            auth_utils._verified_logins.clear()
+            return auth_utils.authenticate("target", PASSWORD)
+
+        indexed_ms = timed(fresh_login, 5)
+        cached_ms = timed(lambda: auth_utils.authenticate("target", PASSWORD), 100)
+
+        print(f"{'legacy login':<24} {legacy_ms:>9.2f} ms (median)")
+        print(f"{'index build':<24} {index_ms:>9.2f} ms (once per users.json change)")
+        print(f"{'indexed login':<24} {indexed_ms:>9.2f} ms (median, bcrypt)")
+        print(f"{'cached login':<24} {cached_ms:>9.3f} ms (median)")
+
+        # Concurrent logins, each a full bcrypt check, counting how many
+        # checks are running at any moment
+        auth_utils._verified_logins.clear()
+        real_hash = auth_utils.get_user("target")["password_hash"]
+        checkpw = bcrypt.checkpw
+        lock = threading.Lock()
+        running = [0, 0]  # now, peak
+
+        def counted_checkpw(password, hashed):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            try:
+                return checkpw(password, hashed)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        bcrypt.checkpw = counted_checkpw
+        logins = threads * 4
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as sessions:
+                results = list(sessions.map(lambda _: auth_utils._check_password(PASSWORD, real_hash), range(logins)))
+        finally:
+            bcrypt.checkpw = checkpw
+        elapsed = time.perf_counter() - start
+        assert all(results)
+        serial = logins * indexed_ms / 1000
+        overlap = min(threads, auth_utils.AUTH_VERIFY_WORKERS)
+        # Overlapping checks only finish sooner with CPUs to run them on
+        expected = min(overlap, os.cpu_count() or 1)
+        print(
+            f"\n{logins} logins from {threads} threads: {elapsed:.2f} s ({serial / elapsed:.1f}x faster than one at a time, "
+            f"{expected}x possible on {os.cpu_count()} CPUs), up to {running[1]} checks at once (expected {overlap})"
+        )
+        # One check at a time means every login waits for all those before it
+        failures = (running[1] < max(overlap, min(threads, 2))) + (serial / elapsed < 0.7 * expected)
+        print(f"\n{failures} failure{'' if failures == 1 else 's'}")
+        return 1 if failures else 0
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    sys.exit(main(users, threads))
\ No newline at end of file
@@ -0,0 +1,97 @@
+# benchmarks/bench_chart_rerun.py
+"""
+Rerun latency and memory growth of the analytics page charts.
+
+Simulates reruns that draw the four analytics charts from unchanged data:
+
+- legacy:     pyplot figures created on every rerun and never closed (old code)
+- matplotlib: utils.charts PNG rendering with the chart cache
+- native:     utils.charts Vega-Lite specs with the chart cache
+
+Usage: python -m benchmarks.bench_chart_rerun [reruns] [mode ...]
+"""
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import charts
+
+MODES = ["legacy", "matplotlib", "native"]
+
+def rss_mib():
+    """Resident set size of this process from /proc (Linux)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def sample_frames():
+    days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=90).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(0)
+    return {
+        "visits_over_time": pd.DataFrame({"Date": days, "Visits": rng.integers(100, 1000, len(days))}),
+        "traffic_sources": pd.DataFrame({
+            "Referrer": ["https://google.com", "Direct", "https://twitter.com", "https://linkedin.com"],
+            "Visits": [5000, 3000, 800, 200]
+        }),
+        "devices": pd.DataFrame({"Device": ["Desktop", "Mobile", "Tablet"], "Visits": [4000, 4500, 500]}),
+        "top_pages": pd.DataFrame({
+            "Page": [f"/page/{i}" for i in range(10)],
+            "Visit Count": sorted(rng.integers(10, 1000, 10), reverse=True)
+        })
+    }
+
+def legacy_rerun(frames):
+    """What display_analytics used to do: new pyplot figures, never closed"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    for kind, df in frames.items():
+        fig, ax = plt.subplots(figsize=(8, 5))
+        if kind == "visits_over_time":
+            sns.lineplot(x=pd.to_datetime(df["Date"]), y=df["Visits"], ax=ax)
+        elif kind == "traffic_sources":
+            df.set_index("Referrer")["Visits"].plot.pie(autopct='%1.1f%%', startangle=90, ax=ax, label="")
+        elif kind == "devices":
+            sns.barplot(x=df["Device"], y=df["Visits"], ax=ax)
+        else:
+            sns.barplot(x="Visit Count", y="Page", data=df, ax=ax)
+        plt.tight_layout()
+        # st.pyplot renders the figure to PNG
+        fig.savefig(io.BytesIO(), format="png")
+
+def cached_rerun(frames, backend):
+    for kind, df in frames.items():
+        charts.render_chart(kind, df, backend)
+
+def main(reruns, modes):
+    import warnings
+    warnings.filterwarnings("ignore")
+    frames = sample_frames()
+    print(f"{'mode':>10} | {'first ms':>9} | {'mean ms':>8} | {'RSS start':>9} | {'RSS end':>8} | {'growth':>7}")
+    for mode in modes:
+        start_rss = rss_mib()
+        timings = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            if mode == "legacy":
+                legacy_rerun(frames)
+            else:
+                cached_rerun(frames, mode)
+            timings.append(time.perf_counter() - start)
+        end_rss = rss_mib()
+        print(
+            f"{mode:>10} | {timings[0] * 1000:>9.1f} | {np.mean(timings) * 1000:>8.2f} | "
+            f"{start_rss:>8.0f}M | {end_rss:>7.0f}M | {end_rss - start_rss:>6.0f}M"
+        )
+
+if __name__ == "__main__":
+    reruns = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    modes = sys.argv[2:] or MODES
+    main(reruns, modes)
@@ -0,0 +1,113 @@
+# benchmarks/bench_data_profile.py
+"""
+Profiling synthetic CSV files chunk by chunk (utils.data_profile).
+
+1. Throughput: a multi-GB file, profiled in PROFILE_CHUNK_BYTES chunks.
+   Reports MiB/s and the peak memory of the profiling process, then the
+   time to return the cached profile of the same file.
+2. Accuracy: a 1M-row file profiled with the sketches and with pandas,
+   which loads the whole file; distinct count and quantile errors.
+
+Files are generated in a separate process, and the throughput run comes
+first, so that neither counts towards the profiler's peak memory.
+
+Usage: python -m benchmarks.bench_data_profile [gigabytes]
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+# Cache profiles in scratch space before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_PROFILE_CACHE_DIR"] = os.path.join(_tmp_dir.name, "profiles")
+
+from utils.data_profile import QUANTILES, profile_file
+
+CHUNK_ROWS = 500_000
+COUNTRIES = ["US", "IN", "UK", "DE", "CA", "ZA", "AU", "FR", "BR", "JP"]
+
+def _chunk(rng, start, rows):
+    import numpy as np
+    import pyarrow as pa
+    amount = rng.lognormal(3, 1, rows)
+    return pa.table({
+        "order_id": np.arange(start, start + rows),
+        "customer": pa.array(np.char.add("customer-", rng.integers(0, 2_000_000, rows).astype(str))),
+        "country": pa.array(np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), rows)]),
+        "amount": pa.array(amount.round(2), mask=rng.random(rows) < 0.05),
+        "quantity": rng.integers(1, 20, rows),
+        "created_at": pa.array(
+            np.datetime64("2024-01-01") + rng.integers(0, 365 * 86400, rows).astype("timedelta64[s]")
+        ),
+        "paid": rng.random(rows) < 0.8
+    })
+
+def write_csv(path, target_bytes=None, rows=None):
+    """Write synthetic orders until the file reaches target_bytes or rows"""
+    import numpy as np
+    from pyarrow import csv
+    rng = np.random.default_rng(42)
+    written = 0
+    with open(path, "wb") as f:
+        writer = None
+        while (rows is None or written < rows) and (target_bytes is None or f.tell() < target_bytes):
+            size = CHUNK_ROWS if rows is None else min(CHUNK_ROWS, rows - written)
+            table = _chunk(rng, written, size)
+            writer = writer or csv.CSVWriter(f, table.schema)
+            writer.write_table(table)
+            written += size
+        writer.close()
+
+def in_child(target, *args):
+    process = multiprocessing.Process(target=target, args=args)
+    process.start()
+    process.join()
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def accuracy(path):
+    import pandas as pd
+    profile = {column["name"]: column for column in profile_file(path, use_cache=False)["columns"]}
+    frame = pd.read_csv(path)
+    print(f"{'column':<10} {'distinct':>10} {'estimate':>10} {'error':>7}")
+    for name in frame.columns:
+        exact = frame[name].nunique()
+        estimate = profile[name]["distinct"]
+        print(f"{name:<10} {exact:>10,} {estimate:>10,} {abs(estimate - exact) / exact:>7.2%}")
+    values = frame["amount"].dropna().sort_values().to_numpy()
+    errors = [
+        abs(values.searchsorted(profile["amount"]["quantiles"][str(fraction)]) / len(values) - fraction)
+        for fraction in QUANTILES
+    ]
+    print(f"amount quantiles: largest rank error {max(errors):.2%} over {QUANTILES}")
+
+def main(gigabytes):
+    large = os.path.join(_tmp_dir.name, "large.csv")
+    in_child(write_csv, large, int(gigabytes * 1024 ** 3))
+    size_mib = os.path.getsize(large) / 1024 / 1024
+    print(f"1. throughput on {size_mib:,.0f} MiB\n")
+    rss_before = peak_rss_mib()
+    start = time.perf_counter()
+    profile = profile_file(large)
+    elapsed = time.perf_counter() - start
+    print(
+        f"profiled {profile['rows']:,} rows in {elapsed:.1f} s ({size_mib / elapsed:,.0f} MiB/s, "
+        f"of which {profile['seconds']:.1f} s parsing and sketches); "
+        f"peak memory {peak_rss_mib():,.0f} MiB (was {rss_before:,.0f} MiB)"
+    )
+    start = time.perf_counter()
+    cached = profile_file(large)
+    print(f"cached profile in {time.perf_counter() - start:.1f} s (hashing the file), from cache: {cached['cached']}")
+    os.remove(large)
+
+    small = os.path.join(_tmp_dir.name, "small.csv")
+    in_child(write_csv, small, None, 1_000_000)
+    print(f"\n2. accuracy on 1,000,000 rows ({os.path.getsize(small) / 1024 / 1024:.0f} MiB)\n")
+    accuracy(small)
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2)
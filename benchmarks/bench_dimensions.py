@@ -0,0 +1,138 @@
+# benchmarks/bench_dimensions.py
+"""
+Storing repeated visit attributes as dimension ids (utils.dimensions)
+against the original string columns:
+
+- database size of the same visits, indexes included, after VACUUM
+- ingest rate of tracker-sized batches of visit dicts (utils.ingest)
+- DataFrame memory: every visit read into a frame, as the analytics page
+  did with the legacy table, against the frames the page builds now
+
+legacy is page_visits as created by migrations 1 and 2, dimensions the
+current schema. The page now reads only aggregates, so there are no
+per-visit frames left to store with ``category`` columns.
+
+Usage: python -m benchmarks.bench_dimensions [rows] [ingest_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from config import INGEST_BATCH_SIZE, PAGE_VISITS_REFERRER_DEVICE_INDEX
+from pages.analytics import load_analytics_frames
+from utils.db_utils import PageVisit, VisitDetail
+from utils.dimensions import interner
+from utils.migrations import upgrade, _create_page_visits, _index_page_visits
+from utils.sample_data import generate_bulk_visits
+
+COLUMNS = ["url", "path", "referrer", "ip_address", "location", "device", "user_agent", "timestamp"]
+
+# page_visits before migration 5
+LEGACY_VISITS = Table(
+    "page_visits", MetaData(),
+    Column("id", Integer, primary_key=True),
+    *(Column(column, String) for column in COLUMNS[:-1]),
+    Column("timestamp", DateTime)
+)
+
+def legacy_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        _create_page_visits(conn)
+        _index_page_visits(conn)
+        if PAGE_VISITS_REFERRER_DEVICE_INDEX:
+            conn.execute(text("CREATE INDEX ix_page_visits_referrer_device ON page_visits (referrer, device)"))
+    return engine
+
+def copy_to_legacy(engine, legacy_path):
+    """Copy every visit of the dimensions database into a legacy one"""
+    with engine.begin() as conn:
+        conn.execute(text("ATTACH DATABASE :path AS legacy"), {"path": legacy_path})
+        conn.execute(text(
+            f"INSERT INTO legacy.page_visits ({', '.join(COLUMNS)}) "
+            f"SELECT {', '.join(COLUMNS)} FROM page_visit_details ORDER BY id"
+        ))
+    with engine.connect() as conn:
+        conn.execute(text("DETACH DATABASE legacy"))
+
+def database_bytes(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("VACUUM")
+    return os.path.getsize(engine.url.database)
+
+def ingest_rate(engine, events, encode):
+    """Rows per second written like BatchWriter._write, one batch per transaction"""
+    table = PageVisit.__table__ if encode else LEGACY_VISITS
+    start = time.perf_counter()
+    for offset in range(0, len(events), INGEST_BATCH_SIZE):
+        rows = events[offset:offset + INGEST_BATCH_SIZE]
+        if encode:
+            rows = interner.encode(engine, rows)
+        with engine.begin() as conn:
+            conn.execute(insert(table), rows)
+    return len(events) / (time.perf_counter() - start)
+
+def legacy_frame(engine):
+    with engine.connect() as conn:
+        result = conn.execute(text(f"SELECT id, {', '.join(COLUMNS)} FROM page_visits ORDER BY id"))
+        frame = pd.DataFrame(result.all(), columns=["id"] + COLUMNS)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+    return frame
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+def main(rows, ingest_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'dimensions.sqlite')}")
+        upgrade(engine)
+        print(f"generating {rows:,} visits...")
+        generate_bulk_visits(rows, seed=42, engine=engine, bulk_load=True)
+        legacy = legacy_engine(os.path.join(tmp, "legacy.sqlite"))
+        copy_to_legacy(engine, legacy.url.database)
+
+        mib = 1024 * 1024
+        legacy_size, dimensions_size = database_bytes(legacy), database_bytes(engine)
+        print(f"\n{'database size':<20} {legacy_size / mib:>10.1f} MiB legacy {dimensions_size / mib:>10.1f} MiB dimensions")
+
+        # Replay existing visits as tracker events
+        with Session(engine) as session:
+            events = [row._asdict() for row in session.execute(
+                select(*(getattr(VisitDetail, column) for column in COLUMNS)).order_by(VisitDetail.id).limit(ingest_rows)
+            )]
+        legacy_rate = ingest_rate(legacy, events, encode=False)
+        interner.clear()
+        dimensions_rate = ingest_rate(engine, events, encode=True)
+        stats = interner.stats()
+        print(
+            f"{'ingest':<20} {legacy_rate:>10,.0f} rows/s legacy {dimensions_rate:>10,.0f} rows/s dimensions "
+            f"({stats['hits']:,} interner hits, {stats['misses']:,} misses)"
+        )
+
+        start = time.perf_counter()
+        frame = legacy_frame(legacy)
+        legacy_seconds = time.perf_counter() - start
+        legacy_bytes, legacy_rows = frame_bytes(frame), len(frame)
+        del frame
+        start = time.perf_counter()
+        with Session(engine) as session:
+            frames = load_analytics_frames(session, None)
+        dimensions_seconds = time.perf_counter() - start
+        print(
+            f"{'DataFrame memory':<20} {legacy_bytes / mib:>10.1f} MiB legacy {sum(map(frame_bytes, frames.values())) / 1024:>10.1f} KiB page "
+            f"({legacy_rows:,} visit rows read in {legacy_seconds:.1f} s; "
+            f"{sum(map(len, frames.values())):,} aggregate rows in {dimensions_seconds:.1f} s)"
+        )
+        engine.dispose()
+        legacy.dispose()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    )
@@ -0,0 +1,56 @@
+# benchmarks/bench_engine_pool.py
+"""
+Compare creating a new engine for every session (the old get_db_session)
+with the shared, pooled engine from utils.db_utils.
+
+Usage: python -m benchmarks.bench_engine_pool [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+DB_URL = f"sqlite:///{os.path.join(_tmp_dir.name, 'bench.sqlite')}"
+os.environ["CODRON_DATABASE_URL"] = DB_URL
+
+from utils.db_utils import init_db, get_db_session, dispose_engine
+
+QUERY = text("SELECT COUNT(*) FROM page_visits")
+
+def per_call_engine():
+    """The old behaviour: new engine, pool and dialect setup on every call"""
+    engine = create_engine(DB_URL)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.execute(QUERY).scalar()
+    engine.dispose()
+
+def pooled_engine():
+    """A session from the shared engine"""
+    with get_db_session() as session:
+        session.execute(QUERY).scalar()
+
+def run(func, iterations):
+    """Return the mean latency of func in microseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main(iterations):
+    init_db()
+    per_call = run(per_call_engine, iterations)
+    pooled = run(pooled_engine, iterations)
+    print(f"iterations:        {iterations:,}")
+    print(f"per-call engine:   {per_call:10.1f} us/session")
+    print(f"pooled engine:     {pooled:10.1f} us/session")
+    print(f"speedup:           {per_call / pooled:10.1f}x")
+    dispose_engine()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
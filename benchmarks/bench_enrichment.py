@@ -0,0 +1,124 @@
+# benchmarks/bench_enrichment.py
+"""
+Per-event cost of enriching ingested visits (utils.enrichment).
+
+A synthetic range file with as many ranges as the free country databases
+is built in a scratch directory. Events repeat user agents and addresses
+with Zipfian popularity, as real traffic does, and are enriched in
+INGEST_BATCH_SIZE batches:
+
+- uncached: parsing and searching for every event
+- cold and warm: Enricher.enrich() with its LRU caches empty, then filled
+- unique addresses: every event from a new address, so the IP cache misses
+
+Usage: python -m benchmarks.bench_enrichment [events] [ranges]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from config import INGEST_BATCH_SIZE
+from utils.enrichment import Enricher, IPRanges, build_ranges, ip_number, parse_user_agent
+
+COUNTRIES = 250
+DISTINCT_USER_AGENTS = 2_000
+DISTINCT_ADDRESSES = 200_000
+
+USER_AGENT_TEMPLATES = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{v} Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel {v}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.{v}; +http://www.google.com/bot.html)"
+]
+
+def write_ranges_csv(path, count, rng):
+    """``count`` adjacent ranges covering the IPv4 space, one country each"""
+    bounds = sorted(rng.sample(range(1, 2 ** 32), count - 1))
+    with open(path, "w") as file:
+        for start, end in zip([0] + bounds, bounds + [2 ** 32]):
+            country = rng.randrange(COUNTRIES)
+            file.write(f"{start},{end - 1},C{country},Country {country}\n")
+
+def zipf_events(count, rng, addresses):
+    agents = [
+        USER_AGENT_TEMPLATES[i % len(USER_AGENT_TEMPLATES)].format(v=60 + i // len(USER_AGENT_TEMPLATES))
+        for i in range(DISTINCT_USER_AGENTS)
+    ]
+    agent_weights = [1 / rank ** 1.1 for rank in range(1, len(agents) + 1)]
+    address_weights = [1 / rank ** 1.1 for rank in range(1, len(addresses) + 1)]
+    return [
+        {"user_agent": agent, "ip_address": address}
+        for agent, address in zip(
+            rng.choices(agents, agent_weights, k=count),
+            rng.choices(addresses, address_weights, k=count)
+        )
+    ]
+
+def random_address(rng):
+    return ".".join(str(rng.randrange(256)) for _ in range(4))
+
+def per_event(events, enrich):
+    """Microseconds per event of enriching ``events`` in ingest-sized batches"""
+    batches = [[dict(event) for event in events[i:i + INGEST_BATCH_SIZE]] for i in range(0, len(events), INGEST_BATCH_SIZE)]
+    start = time.perf_counter()
+    for batch in batches:
+        enrich(batch)
+    return (time.perf_counter() - start) / len(events) * 1_000_000
+
+def main(count, range_count):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, ranges_path = os.path.join(tmp, "ranges.csv"), os.path.join(tmp, "ranges.bin")
+        write_ranges_csv(csv_path, range_count, rng)
+        start = time.perf_counter()
+        build_ranges(csv_path, ranges_path)
+        print(
+            f"Built {range_count:,} ranges ({os.path.getsize(ranges_path) / 1024 / 1024:.1f} MiB) "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+
+        ranges = IPRanges(ranges_path)
+        numbers = [rng.randrange(2 ** 32) for _ in range(100_000)]
+        start = time.perf_counter()
+        for number in numbers:
+            ranges.country(number)
+        print(f"Binary search of the range file: {(time.perf_counter() - start) / len(numbers) * 1e9:,.0f} ns per address")
+
+        events = zipf_events(count, rng, [random_address(rng) for _ in range(DISTINCT_ADDRESSES)])
+        print(
+            f"\n{count:,} events, {len({e['user_agent'] for e in events}):,} distinct user agents, "
+            f"{len({e['ip_address'] for e in events}):,} distinct addresses, batches of {INGEST_BATCH_SIZE}"
+        )
+
+        def uncached(batch):
+            for event in batch:
+                event["browser"], event["os"], event["device"] = parse_user_agent.__wrapped__(event["user_agent"])
+                number = ip_number(event["ip_address"])
+                event["location"] = ranges.country(number) if number is not None else None
+
+        enricher = Enricher(ranges_path)
+        parse_user_agent.cache_clear()
+        results = [("uncached", per_event(events, uncached)), ("cold caches", per_event(events, enricher.enrich))]
+        stats = enricher.stats()
+        results.append(("warm caches", per_event(events, enricher.enrich)))
+        unique = [dict(event, ip_address=random_address(rng)) for event in events]
+        results.append(("unique addresses", per_event(unique, enricher.enrich)))
+        for label, micros in results:
+            print(f"    {label:<18} {micros:8.2f} µs per event")
+        print(
+            f"    cold run: {stats['user_agent_misses']:,} user agents parsed, "
+            f"{stats['ip_misses']:,} addresses searched"
+        )
+        ranges.close()
+        enricher.ranges.close()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 300_000
+    )
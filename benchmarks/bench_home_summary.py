@@ -0,0 +1,118 @@
+# benchmarks/bench_home_summary.py
+"""
+Latency of the Dashboard Home summary query (utils.home_summary).
+
+Over a scratch database with synthetic visits, monitored websites and
+their checks:
+- uncached summaries: p50, p95 and max against HOME_SUMMARY_TARGET_MS
+- concurrency: many threads asking for an expired summary at once, which
+  must compute it once
+
+Usage: python -m benchmarks.bench_home_summary [rows]
+Exits with status 1 if the target is missed or the summary is computed
+more than once.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'home.sqlite')}"
+
+from sqlalchemy import insert, text
+from config import HOME_SUMMARY_TARGET_MS
+from utils import home_summary
+from utils.db_utils import init_db, session_scope, UptimeTarget, UptimeCheck
+from utils.sample_data import generate_bulk_visits
+
+TARGETS = 20
+CHECKS_PER_TARGET = 5000
+RUNS = 50
+THREADS = 32
+
+def seed(rows):
+    engine = init_db()
+    print(f"Generating {rows:,} visits over 30 days and {TARGETS * CHECKS_PER_TARGET:,} uptime checks...")
+    generate_bulk_visits(rows, seed=42, days=30, engine=engine, bulk_load=True)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(UptimeTarget), [
+            {"url": f"https://site{i}.example.com", "interval_seconds": 60, "enabled": True}
+            for i in range(TARGETS)
+        ])
+        conn.execute(insert(UptimeCheck), [
+            {
+                "target_id": 1 + i % TARGETS,
+                "checked_at": now - timedelta(seconds=60 * (i // TARGETS)),
+                "ok": (i * 7) % 101 != 0,
+                "status_code": 200,
+                "response_ms": 50.0,
+                "attempts": 1
+            }
+            for i in range(TARGETS * CHECKS_PER_TARGET)
+        ])
+        conn.execute(text("ANALYZE"))
+
+def main(rows):
+    seed(rows)
+    failures = 0
+
+    timings = []
+    with session_scope() as session:
+        home_summary.load_home_summary(session)
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            summary = home_summary.load_home_summary(session)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p50, p95 = timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+    print(
+        f"\nUncached summary over {RUNS} runs: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms "
+        f"(target {HOME_SUMMARY_TARGET_MS} ms)"
+    )
+    print(
+        f"    {summary['visits_today']:,} visits today, {summary['sites_today']} sites, "
+        f"uptime {summary['uptime']:.2f}%, {summary['projects_due_this_week']} projects due this week"
+    )
+    if p95 > HOME_SUMMARY_TARGET_MS:
+        print("    TARGET MISSED")
+        failures += 1
+
+    # Count the computations behind many concurrent page views
+    computations = []
+    load = home_summary.load_home_summary
+    def counted(session, now=None):
+        computations.append(1)
+        return load(session, now)
+    home_summary.load_home_summary = counted
+    home_summary.clear_summary_cache()
+    barrier = threading.Barrier(THREADS)
+    latencies = []
+    def view():
+        barrier.wait()
+        start = time.perf_counter()
+        with session_scope() as session:
+            home_summary.get_home_summary(session)
+        latencies.append((time.perf_counter() - start) * 1000)
+    threads = [threading.Thread(target=view) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    home_summary.load_home_summary = load
+    print(
+        f"\n{THREADS} concurrent views of an expired summary: {len(computations)} computation(s), "
+        f"slowest view {max(latencies):.1f} ms"
+    )
+    if len(computations) != 1:
+        failures += 1
+
+    print(f"\n{failures} failure{'' if failures == 1 else 's'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,70 @@
+# benchmarks/bench_instrumentation.py
+"""
+Overhead of the timing instrumentation (utils.instrumentation).
+
+- query: small SELECTs on an SQLite engine with and without the cursor
+  event hooks that time every statement
+- timed: an empty block inside timed(), which is what every section,
+  chart and auth operation pays
+
+The query runs alternate between the two engines and the best of ROUNDS
+is reported, since a shared machine's noise is larger than the overhead.
+
+Usage: python -m benchmarks.bench_instrumentation [iterations]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from utils.instrumentation import instrument_engine, timed, timings
+
+ROUNDS = 5
+
+def time_queries(engine, iterations):
+    statement = text("SELECT value FROM numbers WHERE id = :id")
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for i in range(iterations):
+            conn.execute(statement, {"id": i % 1000}).scalar()
+        return time.perf_counter() - start
+
+def main(iterations):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'numbers.sqlite'}"
+        plain = create_engine(url)
+        with plain.begin() as conn:
+            conn.execute(text("CREATE TABLE numbers (id INTEGER PRIMARY KEY, value INTEGER)"))
+            conn.execute(text("INSERT INTO numbers VALUES (:id, :id)"), [{"id": i} for i in range(1000)])
+        instrumented = instrument_engine(create_engine(url))
+
+        # Warm up both engines' statement caches
+        time_queries(plain, 1000)
+        time_queries(instrumented, 1000)
+        bare = hooked = float("inf")
+        for _ in range(ROUNDS):
+            bare = min(bare, time_queries(plain, iterations))
+            hooked = min(hooked, time_queries(instrumented, iterations))
+        plain.dispose()
+        instrumented.dispose()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with timed("bench", "empty"):
+            pass
+    block = time.perf_counter() - start - loop
+
+    per_query = (hooked - bare) / iterations
+    print(f"{iterations:,} queries, best of {ROUNDS}: {bare / iterations * 1e6:.1f} us plain, {hooked / iterations * 1e6:.1f} us timed "
+          f"({per_query * 1e6:+.1f} us, {(hooked - bare) / bare:+.1%})")
+    print(f"timed() block: {block / iterations * 1e6:.2f} us")
+    print(f"{len(timings.summary())} histograms, {len(timings.recent())} timings in the ring buffer")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,166 @@
+# benchmarks/bench_invoices.py
+"""
+The Invoice & Project Tracker (utils.invoices) over a million invoices.
+
+A scratch database gets synthetic clients, projects, invoices and their
+lines, then:
+- summary: the tracker totals, p50 and p95 against INVOICE_SUMMARY_TARGET_MS,
+  and the same outstanding total computed by adding up lines instead
+- listing: the first page and a page deep into the list, by cursor
+- writes: adding and removing lines of a draft, which update its total
+- check: every invoice total against its lines after the writes
+
+Usage: python -m benchmarks.bench_invoices [invoices]
+Exits with status 1 if the target is missed or a total is wrong.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'invoices.sqlite')}"
+
+from sqlalchemy import func, select, text
+from config import INVOICE_SUMMARY_TARGET_MS
+from utils.db_utils import init_db, session_scope, Invoice, InvoiceLine
+from utils import invoices
+
+CLIENTS = 5_000
+PROJECTS = 20_000
+DAYS = 5 * 365
+CHUNK = 50_000
+RUNS = 30
+
+def seed(count, rng):
+    engine = init_db()
+    today = date.today()
+    print(f"Generating {CLIENTS:,} clients, {PROJECTS:,} projects and {count:,} invoices...")
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO clients (name, email, created_at) VALUES (?, ?, '2020-01-01 00:00:00')",
+            [(f"Client {i}", f"billing@client{i}.example.com") for i in range(CLIENTS)]
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO projects (client_id, name, status, due_on, created_at) VALUES (?, ?, ?, ?, '2020-01-01 00:00:00')",
+            [
+                (1 + i % CLIENTS, f"Project {i}", rng.choices(invoices.PROJECT_STATUSES, (20, 5, 75))[0],
+                 str(today + timedelta(days=rng.randrange(-DAYS, 180))))
+                for i in range(PROJECTS)
+            ]
+        )
+
+    line_id = 0
+    for first in range(1, count + 1, CHUNK):
+        rows, lines = [], []
+        for invoice_id in range(first, min(first + CHUNK, count + 1)):
+            # Older invoices are mostly paid; recent ones still outstanding
+            issued = today - timedelta(days=int(DAYS * (1 - invoice_id / count)))
+            due = issued + timedelta(days=30)
+            age = (today - issued).days
+            status = rng.choices(invoices.INVOICE_STATUSES, (1, 4, 90, 5) if age > 90 else (10, 70, 15, 5))[0]
+            total = 0
+            for _ in range(rng.randint(1, 5)):
+                line_id += 1
+                quantity, price = rng.randint(1, 40), rng.randrange(2_000, 20_000, 500)
+                lines.append((invoice_id, "Consulting", quantity, price, quantity * price))
+                total += quantity * price
+            project = 1 + invoice_id % PROJECTS
+            rows.append((
+                invoice_id, f"INV-{invoice_id:06d}", 1 + (project - 1) % CLIENTS, project, status, str(issued),
+                str(due), str(due - timedelta(days=rng.randrange(0, 20))) if status == "paid" else None, total
+            ))
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO invoices (id, number, client_id, project_id, status, issued_on, due_on, paid_on, "
+                "total_cents, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '2020-01-01 00:00:00')",
+                rows
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO invoice_lines (invoice_id, description, quantity, unit_price_cents, amount_cents) "
+                "VALUES (?, ?, ?, ?, ?)",
+                lines
+            )
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"    {line_id:,} lines, in {time.perf_counter() - started:.0f} s")
+    return engine
+
+def timed_runs(function, runs=RUNS):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)], result
+
+def main(count):
+    rng = random.Random(42)
+    engine = seed(count, rng)
+    failures = 0
+
+    with session_scope() as session:
+        p50, p95, summary = timed_runs(lambda: invoices.get_invoice_summary(session))
+        print(f"\nSummary: p50 {p50:.1f} ms, p95 {p95:.1f} ms (target {INVOICE_SUMMARY_TARGET_MS} ms)")
+        print(
+            f"    {summary['outstanding']:,} outstanding ({invoices.format_money(summary['outstanding_cents'])}), "
+            f"{summary['overdue']:,} overdue, {summary['due_this_week']:,} due this week, "
+            f"{summary['active_projects']:,} active projects"
+        )
+        if p95 > INVOICE_SUMMARY_TARGET_MS:
+            print("    TARGET MISSED")
+            failures += 1
+
+        from_lines = (
+            select(func.sum(InvoiceLine.amount_cents))
+            .join(Invoice, Invoice.id == InvoiceLine.invoice_id)
+            .where(Invoice.status == invoices.OUTSTANDING)
+        )
+        p50, _, cents = timed_runs(lambda: session.execute(from_lines).scalar(), runs=5)
+        print(f"    outstanding total from lines instead: {p50:.1f} ms")
+        if cents != summary["outstanding_cents"]:
+            print("    TOTALS DIFFER")
+            failures += 1
+
+        print("\nListing (page of invoices by due date):")
+        for label, filters in (("all", {}), ("outstanding", {"status": invoices.OUTSTANDING}), ("paid", {"status": "paid"})):
+            first, _, (rows, cursor) = timed_runs(lambda: invoices.list_invoices(session, **filters))
+            # A cursor from the middle of the list, as if paged there
+            middle = session.execute(
+                select(Invoice.due_on, Invoice.id)
+                .where(*([Invoice.status == filters["status"]] if filters else []))
+                .order_by(Invoice.due_on, Invoice.id)
+                .offset(session.execute(
+                    select(func.count()).select_from(Invoice)
+                    .where(*([Invoice.status == filters["status"]] if filters else []))
+                ).scalar() // 2)
+                .limit(1)
+            ).one()
+            deep, _, _ = timed_runs(lambda: invoices.list_invoices(session, after=tuple(middle), **filters))
+            print(f"    {label:<12} first page {first:6.2f} ms, middle page {deep:6.2f} ms")
+
+    draft = invoices.create_invoice(1, [("Design", 2, 15_000)], engine=engine)
+    p50, p95, _ = timed_runs(lambda: invoices.add_invoice_line(draft, "Hosting", 1, 2_500, engine=engine))
+    print(f"\nAdding a line to a draft: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    with session_scope() as session:
+        _, lines = invoices.get_invoice(session, f"INV-{draft:06d}")
+    line_ids = iter([line[0] for line in lines[1:]])
+    p50, p95, _ = timed_runs(lambda: invoices.remove_invoice_line(next(line_ids), engine=engine))
+    print(f"Removing a line from a draft: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+    start = time.perf_counter()
+    with session_scope() as session:
+        mismatched = invoices.check_totals(session)
+    print(f"\nChecked every total against its lines in {time.perf_counter() - start:.1f} s: {len(mismatched)} wrong")
+    failures += bool(mismatched)
+
+    print(f"\n{failures} failure{'' if failures == 1 else 's'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,84 @@
+# benchmarks/bench_live_traffic.py
+"""
+Cost of a live view refresh (utils.live_traffic) against the table size.
+
+The same database is measured at two sizes. At each size:
+- reload: reading the whole table, as the page did before on every rerun
+- rebuild: counting the last LIVE_WINDOW_MINUTES from the timestamp index,
+  what the first refresh does
+- tail: a refresh after k new visits arrived, for several k
+
+Tail times should grow with k and stay the same between the two sizes.
+
+Usage: python -m benchmarks.bench_live_traffic [small rows] [large rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'live.sqlite')}"
+
+import pandas as pd
+from sqlalchemy import func, insert, select
+from utils.db_utils import init_db, session_scope, PageVisit, VisitDetail
+from utils.dimensions import interner
+from utils.live_traffic import LiveTraffic
+from utils.sample_data import generate_bulk_visits
+
+NEW_VISITS = [0, 10, 100, 1000, 10_000]
+
+def add_visits(engine, count):
+    if not count:
+        return
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(PageVisit.__table__), interner.encode(engine, [
+            {
+                "url": f"https://site{i % 3}.example.com",
+                "path": f"/live/{i % 25}",
+                "referrer": "https://google.com" if i % 2 else None,
+                "device": ("Desktop", "Mobile", "Tablet")[i % 3],
+                "timestamp": now
+            }
+            for i in range(count)
+        ]))
+
+def measure(engine, rows):
+    print(f"\n{rows:,} visits")
+    with session_scope() as session:
+        start = time.perf_counter()
+        pd.DataFrame(session.execute(select(*VisitDetail.__table__.columns)).all())
+        print(f"    reload the table         {time.perf_counter() - start:8.3f} s")
+
+        live = LiveTraffic(min_interval=0)
+        start = time.perf_counter()
+        counted = live.refresh(session)
+        print(f"    rebuild the window       {time.perf_counter() - start:8.3f} s ({counted:,} visits)")
+
+    for count in NEW_VISITS:
+        add_visits(engine, count)
+        with session_scope() as session:
+            start = time.perf_counter()
+            read = live.refresh(session)
+            elapsed = time.perf_counter() - start
+        assert read == count and not live.last_rebuilt
+        print(f"    tail {count:>6,} new visits   {elapsed * 1000:8.2f} ms")
+
+def main(small, large):
+    engine = init_db()
+    generate_bulk_visits(small, seed=1, days=30, engine=engine, bulk_load=True)
+    measure(engine, small)
+    generate_bulk_visits(large - small, seed=2, days=30, engine=engine, bulk_load=True)
+    with engine.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(PageVisit)).scalar()
+    measure(engine, total)
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    )
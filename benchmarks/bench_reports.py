@@ -0,0 +1,111 @@
+# benchmarks/bench_reports.py
+"""
+Generating summary reports inline and on the worker pool (utils.reports).
+
+Over a scratch database with synthetic visits and uptime checks, for
+every report type:
+- inline: build_report() in this process, which is what the Reports page
+  used to block on
+- pool, cold and warm: report_jobs.submit() and polling until done, with
+  a new pool (workers start and import the app) and with a started one
+- submit: how long submit() holds the calling thread, and the longest
+  gap between two status() polls while the job runs
+- cached: submitting the same report again
+
+The rollups are refreshed first, so no run pays for folding the visits.
+With a single CPU the pool cannot beat the inline time; what it buys is
+a script thread that stays free while the report is computed.
+
+Usage: python -m benchmarks.bench_reports [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the shared engine at a scratch database before importing the app
+# modules; the spawned workers inherit the environment
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'reports.sqlite')}"
+
+from sqlalchemy import insert
+from utils.db_utils import init_db, UptimeTarget, UptimeCheck
+from utils.reports import REPORT_PERIODS, ReportJobs, build_report
+from utils.rollups import refresh_rollups
+from utils.sample_data import generate_bulk_visits
+
+SITES = 4
+CHECKS = 20_000
+
+def seed(rows):
+    engine = init_db()
+    print(f"Generating {rows:,} visits over 60 days and {CHECKS:,} uptime checks...")
+    generate_bulk_visits(rows, seed=42, days=60, engine=engine, bulk_load=True)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(UptimeTarget), [
+            {"url": f"https://site{i}.example.com", "interval_seconds": 300, "enabled": True}
+            for i in range(SITES)
+        ])
+        conn.execute(insert(UptimeCheck), [
+            {
+                "target_id": 1 + i % SITES,
+                "checked_at": now - timedelta(seconds=300 * i / SITES),
+                "ok": i % 37 != 0,
+                "status_code": 200 if i % 37 else 503,
+                "response_ms": 80.0,
+                "attempts": 1
+            }
+            for i in range(CHECKS)
+        ])
+    refresh_rollups(engine)
+
+def run_job(jobs, period, force=False):
+    """(submit seconds, longest poll gap, total seconds, status) of one job"""
+    started = time.perf_counter()
+    job_id = jobs.submit(period, "bench", force=force)
+    submitted = time.perf_counter()
+    longest_gap = 0
+    last = submitted
+    while True:
+        status = jobs.status(job_id)
+        now = time.perf_counter()
+        longest_gap = max(longest_gap, now - last)
+        last = now
+        if status["state"] in ("done", "failed"):
+            break
+        time.sleep(0.01)
+    if status["state"] == "failed":
+        raise RuntimeError(status["error"])
+    return submitted - started, longest_gap, time.perf_counter() - started, status
+
+def main(rows):
+    seed(rows)
+    jobs = ReportJobs()
+    print(f"\n{jobs.workers} worker processes, {os.cpu_count()} CPUs\n")
+    print(
+        f"{'report':<16} {'inline s':>9} {'cold s':>7} {'warm s':>7} "
+        f"{'submit ms':>10} {'max gap ms':>11} {'cached ms':>10}"
+    )
+    try:
+        for period in REPORT_PERIODS:
+            started = time.perf_counter()
+            build_report(period, "bench")
+            inline = time.perf_counter() - started
+
+            # A new pool for every report type, so each cold run starts workers
+            jobs.shutdown()
+            _, _, cold, _ = run_job(jobs, period, force=True)
+            submit, gap, warm, _ = run_job(jobs, period, force=True)
+            _, _, cached, status = run_job(jobs, period)
+            assert status["cached"]
+            print(
+                f"{period:<16} {inline:>9.2f} {cold:>7.2f} {warm:>7.2f} "
+                f"{submit * 1000:>10.1f} {gap * 1000:>11.1f} {cached * 1000:>10.2f}"
+            )
+    finally:
+        jobs.shutdown()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
@@ -0,0 +1,69 @@
+# benchmarks/bench_session_store.py
+"""
+Per-rerun cost of getting the user's settings, and the session store's
+eviction under a memory cap.
+
+- legacy: open and parse user_settings.json on every rerun (old app.py)
+- context: utils.session_store lookup + context.settings
+
+Then simulates many logged-in users that each remember a DataFrame and
+checks that the store stays under its memory cap.
+
+Usage: python -m benchmarks.bench_session_store [sessions]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import USER_SETTINGS_PATH, load_user_settings
+from utils.session_store import SessionStore
+
+def legacy_rerun():
+    with open(USER_SETTINGS_PATH, "r") as f:
+        return json.load(f)
+
+def timed(fn, repeat=20_000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+def main(session_count):
+    load_user_settings()
+    store = SessionStore()
+    context = store.create("admin")
+
+    legacy_us = timed(legacy_rerun)
+    context_us = timed(lambda: store.get(context.session_id, "admin").settings)
+    print(f"{'legacy settings load':<24} {legacy_us:>8.1f} us per rerun")
+    print(f"{'context lookup':<24} {context_us:>8.1f} us per rerun\n")
+
+    # Each user remembers ~1 MiB of analytics DataFrames
+    frame = pd.DataFrame({"Date": np.arange(65_536), "Visits": np.arange(65_536)})
+    cap = 64 * 1024 * 1024
+    store = SessionStore(max_bytes=cap)
+    start = time.perf_counter()
+    for i in range(session_count):
+        user_context = store.create(f"user{i}")
+        user_context.memo("analytics_frames", lambda: frame.copy())
+        store.enforce_memory_cap()
+    elapsed = time.perf_counter() - start
+    stats = store.stats()
+    print(
+        f"{session_count:,} logins with ~{frame.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MiB each "
+        f"in {elapsed:.2f} s: {stats['live_sessions']:,} live, "
+        f"{stats['memory_bytes'] / 1024 / 1024:.1f} MiB of {cap / 1024 / 1024:.0f} MiB cap, "
+        f"{stats['memory_evictions']:,} evicted for memory"
+    )
+
+    store.idle_timeout = 0
+    time.sleep(0.01)
+    store.create("late user")
+    stats = store.stats()
+    print(f"after the idle timeout: {stats['live_sessions']} live, {stats['idle_evictions']:,} evicted as idle")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
\ No newline at end of file
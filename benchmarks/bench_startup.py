@@ -0,0 +1,102 @@
+# benchmarks/bench_startup.py
+"""
+Cold start of the dashboard.
+
+- import: time to import app.py's dependencies in a fresh interpreter,
+  and which heavy libraries end up loaded
+- render: time of the first script run for the login page and for the
+  first visit to each section (streamlit's AppTest, scratch database)
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "seaborn", "sqlalchemy", "bcrypt"]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_done = time.perf_counter()
+import config, pages, utils.auth_utils
+end = time.perf_counter()
+heavy = [name for name in %r if name in sys.modules]
+print(streamlit_done - start, end - streamlit_done, ",".join(heavy))
+"""
+
+def measure_imports(runs):
+    """Import timings of app.py's module-level imports in fresh interpreters"""
+    streamlit_times, app_times = [], []
+    heavy = ""
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT % HEAVY_MODULES],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.split()
+        streamlit_times.append(float(output[0]))
+        app_times.append(float(output[1]))
+        heavy = output[2] if len(output) > 2 else ""
+    return min(streamlit_times), min(app_times), heavy
+
+def measure_renders(db_url):
+    """First-run latency of the login page and of every section, in order"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["CODRON_DATABASE_URL"] = db_url
+    timings = []
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+    start = time.perf_counter()
+    at.run()
+    timings.append(("Login page", time.perf_counter() - start, len(at.exception)))
+
+    at.session_state["authenticated"] = True
+    at.session_state["username"] = "admin"
+    # Hidden sections are only listed with the ?diagnostics query parameter
+    at.query_params["diagnostics"] = ""
+    for index, page in enumerate(at_pages()):
+        start = time.perf_counter()
+        if index == 0:
+            at.run()
+        else:
+            at.sidebar.radio[0].set_value(page).run()
+        timings.append((page, time.perf_counter() - start, len(at.exception)))
+    return timings
+
+def at_pages():
+    """Every section in sidebar order, hidden ones included"""
+    from pages import enabled_pages
+    return enabled_pages({}, show_hidden=True)
+
+def main(runs):
+    sys.path.insert(0, ROOT)
+    streamlit_time, app_time, heavy = measure_imports(runs)
+    print(f"import streamlit:         {streamlit_time * 1000:8.1f} ms (best of {runs})")
+    print(f"import app dependencies:  {app_time * 1000:8.1f} ms")
+    print(f"heavy modules loaded:     {heavy or 'none'}")
+    print()
+
+    # Work on a copy of the database so the benchmark never touches real data
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(ROOT, "data", "db.sqlite")
+        target = os.path.join(tmp_dir, "db.sqlite")
+        if os.path.exists(source):
+            shutil.copy(source, target)
+        timings = measure_renders(f"sqlite:///{target}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{'first render':<28} | {'ms':>8} | errors")
+    for page, seconds, errors in timings:
+        print(f"{page:<28} | {seconds * 1000:>8.1f} | {errors}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
\ No newline at end of file
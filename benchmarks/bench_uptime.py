@@ -0,0 +1,137 @@
+# benchmarks/bench_uptime.py
+"""
+Uptime checks per second against a local stub HTTP server.
+
+The stub server runs in its own process and listens on several loopback
+addresses, so that the targets spread over as many hosts and the
+per-host limit applies like it would for real websites. One in fifty
+targets answers 503 and is retried.
+
+- fresh: a new connection for every check
+- pooled: HttpPool keep-alive connections, shared by all checks
+- scheduled: run_due_checks with every target due, including the writes
+  to uptime_checks
+
+Usage: python -m benchmarks.bench_uptime [targets] [hosts]
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'uptime.sqlite')}"
+
+from sqlalchemy import func, insert, select
+from utils.db_utils import init_db, session_scope, UptimeTarget, UptimeCheck
+from utils.uptime import HttpPool, check_url, check_urls, run_due_checks, get_uptime_summary
+
+PAGE = b"<html><head><title>Stub site</title></head><body><h1>OK</h1></body></html>"
+
+async def _serve_client(reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()).strip():
+                pass
+            status = b"503 Service Unavailable" if b"/down" in request_line else b"200 OK"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\nContent-Type: text/html\r\n"
+                b"Content-Length: " + str(len(PAGE)).encode() + b"\r\n\r\n" + PAGE
+            )
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+def run_stub_server(hosts, port, ready):
+    async def serve():
+        server = await asyncio.start_server(_serve_client, hosts, port, backlog=4096)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def target_urls(count, hosts, port):
+    return [
+        f"http://{hosts[i % len(hosts)]}:{port}/{'down' if i % 50 == 0 else 'site'}/{i}"
+        for i in range(count)
+    ]
+
+async def check_fresh(urls):
+    """Every check on its own connection"""
+    limit = asyncio.Semaphore(200)
+
+    async def one(url):
+        async with limit:
+            pool = HttpPool()
+            try:
+                return await check_url(pool, url, backoff=0.01)
+            finally:
+                await pool.close()
+
+    return await asyncio.gather(*(one(url) for url in urls))
+
+async def check_pooled(urls):
+    pool = HttpPool()
+    results = await check_urls(urls, pool, backoff=0.01)
+    await pool.close()
+    return results, pool.stats
+
+def timed(label, count, coroutine):
+    start = time.perf_counter()
+    result = asyncio.run(coroutine)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {count / elapsed:>10,.0f} checks/s ({elapsed:.2f} s)")
+    return result
+
+def main(count, host_count):
+    hosts = [f"127.0.0.{i}" for i in range(1, host_count + 1)]
+    port = free_port()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_stub_server, args=(hosts, port, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+    urls = target_urls(count, hosts, port)
+    print(f"{count:,} targets on {host_count} hosts, stub server on port {port}\n")
+
+    try:
+        results = timed("fresh", count, check_fresh(urls))
+        results, stats = timed("pooled", count, check_pooled(urls))
+        up = sum(result["ok"] for result in results)
+        attempts = sum(result["attempts"] for result in results)
+        print(
+            f"{'':<10} {up:,} up, {count - up:,} down, {attempts:,} attempts, "
+            f"{stats['connections']:,} connections opened for {stats['requests']:,} requests"
+        )
+
+        engine = init_db()
+        with engine.begin() as conn:
+            conn.execute(insert(UptimeTarget), [{"url": url, "interval_seconds": 60, "enabled": True} for url in urls])
+        # Uses the configured retry backoff, so the failing targets take a
+        # second or two longer than the rest
+        timed("scheduled", count, run_due_checks(engine))
+        with session_scope() as session:
+            stored = session.execute(select(func.count()).select_from(UptimeCheck)).scalar()
+            uptime = get_uptime_summary(session)["uptime"]
+        print(f"{'':<10} {stored:,} results stored, dashboard uptime {uptime:.1f}%")
+        print(f"{'':<10} {asyncio.run(run_due_checks(engine)):,} targets due again right after")
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 10_000, args[1] if len(args) > 1 else 20)
@@ -0,0 +1,90 @@
+# benchmarks/bench_visit_explorer.py
+"""
+Page fetch latency of the raw visit explorer at increasing depth:
+LIMIT/OFFSET pagination against keyset pagination (utils.visit_explorer),
+plus the throughput of the chunked CSV export.
+
+Usage: python -m benchmarks.bench_visit_explorer [rows]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'explorer.sqlite')}"
+
+from config import EXPLORER_PAGE_SIZE
+from utils.db_utils import init_db, session_scope, PageVisit
+from utils.dimensions import interner
+from utils.visit_explorer import _visits_query, fetch_page, export_csv
+
+DEPTHS = [1, 10, 100, 1000, 5000]
+
+def populate(engine, rows, batch=50_000):
+    now = datetime.now()
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(PageVisit.__table__), interner.encode(engine, [
+                {
+                    "url": f"https://site{i % 3}.com",
+                    "path": f"/page/{i % 500}",
+                    "referrer": "https://google.com" if i % 2 else None,
+                    "device": "Mobile" if i % 3 else "Desktop",
+                    "location": "US",
+                    "timestamp": now - timedelta(seconds=i)
+                }
+                for i in range(offset, min(offset + batch, rows))
+            ]))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+def offset_page(session, page):
+    """The LIMIT/OFFSET equivalent of fetch_page"""
+    query = _visits_query(None, "timestamp", True, None)
+    query = query.limit(EXPLORER_PAGE_SIZE).offset((page - 1) * EXPLORER_PAGE_SIZE)
+    return session.execute(query).all()
+
+def keyset_cursor(session, page):
+    """Cursor for the start of a page, found by walking the pages before it"""
+    cursor = None
+    for _ in range(page - 1):
+        _, cursor = fetch_page(session, after=cursor)
+    return cursor
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main(rows):
+    engine = init_db()
+    populate(engine, rows)
+    print(f"{rows:,} visits, {EXPLORER_PAGE_SIZE} per page\n")
+
+    print(f"{'page':>6} | {'offset ms':>9} | {'keyset ms':>9}")
+    with session_scope() as session:
+        for page in DEPTHS:
+            if (page - 1) * EXPLORER_PAGE_SIZE >= rows:
+                break
+            cursor = keyset_cursor(session, page)
+            offset_ms = timed(lambda: offset_page(session, page))
+            keyset_ms = timed(lambda: fetch_page(session, after=cursor))
+            print(f"{page:>6} | {offset_ms:>9.2f} | {keyset_ms:>9.2f}")
+
+        start = time.perf_counter()
+        output = io.BytesIO()
+        export_csv(session, output)
+        seconds = time.perf_counter() - start
+    print(f"\nCSV export: {rows / seconds:,.0f} rows/s, {len(output.getvalue()) / 1024 / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
\ No newline at end of file
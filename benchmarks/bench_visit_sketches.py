@@ -0,0 +1,129 @@
+# benchmarks/bench_visit_sketches.py
+"""
+Accuracy and speed of the per-day visit sketches (utils.visit_sketches)
+against exact counts over the same visits.
+
+For date ranges of 1, 7, 30 and 90 days, over all sites and over the
+busiest one, compares
+- unique visitors: merged HyperLogLogs vs COUNT(DISTINCT ip, user agent)
+- top 10 paths and referrers: merged Space-Saving/Count-Min vs the rollups
+
+Also reports how much of a rollup refresh goes into the sketches and how
+large they are.
+
+Usage: python -m benchmarks.bench_visit_sketches [rows]
+Exits with status 1 if any estimate is outside its error bounds.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from config import SKETCH_HLL_PRECISION
+from utils.analytics_queries import get_page_counts, get_referrer_counts
+from utils.migrations import upgrade
+from utils.rollups import refresh_rollups
+from utils.sample_data import generate_bulk_visits
+from utils.visit_sketches import fold_visits, merged_sketches
+from sqlalchemy.orm import Session
+
+END = datetime(2024, 6, 1)
+RANGES = [1, 7, 30, 90]
+
+# Unique visitors may be off by three standard errors
+VISITOR_TOLERANCE = 3 * 1.04 / 2 ** (SKETCH_HLL_PRECISION / 2)
+
+def exact_visitors(conn, filters):
+    where = "timestamp >= :start AND timestamp < :end"
+    if filters.get("url"):
+        where += " AND url_id = (SELECT id FROM visit_urls WHERE value = :url)"
+    return conn.execute(
+        text(f"""
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT ip_address, user_agent_id FROM page_visits WHERE {where}
+            )
+        """),
+        {
+            "start": filters["start"].isoformat(sep=" "),
+            "end": filters["end"].isoformat(sep=" "),
+            "url": filters.get("url")
+        }
+    ).scalar()
+
+def check_top(label, estimated, exact):
+    """Print the estimated top values next to their exact counts. Returns the failures."""
+    exact = dict(exact)
+    top_exact = sorted(exact, key=lambda value: -exact[value])[:len(estimated)]
+    found = len({value for value, _, _ in estimated} & set(top_exact))
+    failures = sum(not lower <= exact.get(value, 0) <= count for value, count, lower in estimated)
+    worst = max((count - exact.get(value, 0) for value, count, _ in estimated), default=0)
+    print(
+        f"{'':<30} top {label}: {found}/{len(estimated)} found, "
+        f"counts at most {worst:,} too high{'' if not failures else f', {failures} OUT OF BOUNDS'}"
+    )
+    return failures
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'sketches.sqlite')}")
+        upgrade(engine)
+        print(f"Generating {rows:,} visits over 90 days...")
+        generate_bulk_visits(rows, seed=42, end=END, engine=engine, bulk_load=True)
+
+        start = time.perf_counter()
+        refresh_rollups(engine)
+        refresh = time.perf_counter() - start
+        with engine.connect() as conn:
+            start = time.perf_counter()
+            fold_visits(conn, 0, rows)
+            sketching = time.perf_counter() - start
+            conn.rollback()
+            buckets, size = conn.execute(text(
+                "SELECT COUNT(*), SUM(LENGTH(visitors) + LENGTH(paths) + LENGTH(referrers)) FROM page_visit_sketches"
+            )).one()
+            busiest = conn.execute(text(
+                "SELECT url FROM page_visit_sketches GROUP BY url ORDER BY SUM(visits) DESC LIMIT 1"
+            )).scalar()
+        print(
+            f"Rollup refresh {refresh:.1f} s, of which about {sketching:.1f} s sketches "
+            f"({rows / refresh:,.0f} rows/s); {buckets:,} buckets, {size / 1024 / 1024:.1f} MiB\n"
+        )
+
+        failures = 0
+        print(f"{'range':<30} {'exact':>10} {'estimate':>10} {'error':>7} {'exact s':>8} {'sketch s':>9}")
+        with Session(engine) as session:
+            for days in RANGES:
+                for url in (None, busiest):
+                    filters = {"start": END - timedelta(days=days), "end": END}
+                    if url:
+                        filters["url"] = url
+                    label = f"{days} days, {url or 'all sites'}"
+
+                    started = time.perf_counter()
+                    exact = exact_visitors(session, filters)
+                    exact_seconds = time.perf_counter() - started
+                    started = time.perf_counter()
+                    sketches = merged_sketches(session, filters)
+                    estimate = sketches.visitors.count()
+                    sketch_seconds = time.perf_counter() - started
+
+                    error = abs(estimate - exact) / exact
+                    failures += error > VISITOR_TOLERANCE
+                    print(
+                        f"{label:<30} {exact:>10,} {estimate:>10,} {error:>7.2%} "
+                        f"{exact_seconds:>8.3f} {sketch_seconds:>9.3f}"
+                        f"{' OUT OF BOUNDS' if error > VISITOR_TOLERANCE else ''}"
+                    )
+                    failures += check_top("paths", sketches.paths.top(10), get_page_counts(session, filters))
+                    failures += check_top(
+                        "referrers", sketches.referrers.top(10), get_referrer_counts(session, filters)
+                    )
+
+    print(f"\n{failures} estimate{'' if failures == 1 else 's'} outside their error bounds")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,119 @@
+# benchmarks/check_ingest.py
+"""
+Check that the ingest service (utils.ingest) loses no acknowledged
+pageviews when the database cannot take them.
+
+Over a scratch database and dead-letter directory:
+- a beacon sent while another connection holds the database's write
+  lock is acknowledged, saved to the dead-letter directory and listed on
+  /health
+- replaying the directory writes those visits and removes the files
+- a writer starting up replays what an earlier run saved
+- concurrent first beacons start a single writer
+
+Usage: python -m benchmarks.check_ingest
+Exits with status 1 if any check fails.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+_db_path = os.path.join(_tmp_dir.name, "ingest.sqlite")
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+from sqlalchemy import func, select
+
+from utils import ingest
+from utils.db_utils import PageVisit, init_db
+
+async def request(app, method, path, body=b""):
+    """Send one HTTP request to the ASGI app, returning (status, body)"""
+    scope = {"type": "http", "method": method, "path": path, "headers": [(b"user-agent", b"check")], "client": ("203.0.113.7", 0)}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+def visit_count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(PageVisit)).scalar()
+
+async def run_checks(engine, directory):
+    results = []
+
+    writer = ingest.BatchWriter(engine, retries=0, dead_letter_dir=directory)
+    app = ingest.IngestApp(writer)
+    await app.startup()
+    beacon = json.dumps({"events": [{"url": f"https://example.com/p{i}", "path": f"/p{i}"} for i in range(3)]}).encode()
+
+    # Hold the write lock so the writer's INSERT fails
+    blocker = sqlite3.connect(_db_path, timeout=0)
+    blocker.execute("BEGIN EXCLUSIVE")
+    status, _ = await request(app, "POST", "/collect", beacon)
+    await writer.queue.join()
+    blocker.rollback()
+    blocker.close()
+
+    files = ingest.dead_letter_files(directory)
+    results.append(("beacon acknowledged while the database is locked", status == 202))
+    results.append(("failed batch saved to the dead-letter directory", len(files) == 1 and writer.stats["dead_lettered"] == 3))
+    status, body = await request(app, "GET", "/health")
+    dead_letters = json.loads(body)["dead_letters"] if status == 200 else []
+    results.append(("saved batch listed on /health", [letter["rows"] for letter in dead_letters] == [3]))
+    await app.shutdown()
+
+    written = ingest.replay_dead_letters(engine, directory)
+    results.append(("replay writes the saved visits", written == 3 and visit_count(engine) == 3))
+    results.append(("replay removes the written files", not ingest.dead_letter_files(directory)))
+
+    ingest.save_dead_letter(ingest.parse_beacon(beacon), "OperationalError: database is locked", directory)
+    writer = ingest.BatchWriter(engine, dead_letter_dir=directory)
+    await writer.start()
+    await writer.stop()
+    results.append((
+        "a starting writer replays earlier batches",
+        writer.stats["replayed"] == 3 and visit_count(engine) == 6 and not ingest.dead_letter_files(directory)
+    ))
+
+    app = ingest.IngestApp()
+    original = ingest.BatchWriter
+    created = []
+    ingest.BatchWriter = lambda engine: created.append(original(engine, dead_letter_dir=directory)) or created[-1]
+    try:
+        statuses = await asyncio.gather(*[request(app, "POST", "/collect", beacon) for _ in range(5)])
+    finally:
+        ingest.BatchWriter = original
+    await app.shutdown()
+    results.append((
+        "concurrent first beacons start one writer",
+        len(created) == 1 and all(status == 202 for status, _ in statuses) and visit_count(engine) == 21
+    ))
+    return results
+
+def main():
+    engine = init_db()
+    directory = Path(_tmp_dir.name) / "dead_letters"
+    results = asyncio.run(run_checks(engine, directory))
+
+    failures = 0
+    for label, passed in results:
+        failures += not passed
+        print(f"[{'ok' if passed else 'FAIL'}] {label}")
+    print(f"\n{failures} failure{'' if failures == 1 else 's'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# benchmarks/check_pages.py
+"""
+Check that every dashboard section renders without an exception, with
+the default settings and with saved settings the app no longer knows
+(an older or hand-edited user_settings.json).
+
+Sections are rendered on their own with streamlit's AppTest, over a
+scratch database with the demo visits.
+
+Usage: python -m benchmarks.check_pages
+Exits with status 1 if any section raises.
+"""
+import os
+import sys
+import tempfile
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'pages.sqlite')}"
+
+from config import default_user_settings
+from pages import PAGES
+from utils.db_utils import init_db
+from utils.sample_data import generate_sample_analytics_data
+
+# (label, section, changes to the default settings)
+CASES = [(name, name, {}) for name in PAGES] + [
+    ("Website Analytics, unknown chart backend", "Website Analytics", {"chart_backend": "altair"}),
+    ("Website Analytics, no chart backend", "Website Analytics", {"chart_backend": None}),
+    ("Settings, unknown chart backend", "Settings", {"chart_backend": "altair"}),
+    ("Settings, unknown assistant provider", "Settings", {"assistant_provider": "bogus"})
+]
+
+def render_section(name, settings):
+    from pages import load_page
+    load_page(name)(settings)
+
+def main():
+    from streamlit.testing.v1 import AppTest
+
+    init_db()
+    generate_sample_analytics_data()
+
+    failures = 0
+    for label, name, changes in CASES:
+        at = AppTest.from_function(render_section, args=(name, {**default_user_settings(), **changes}), default_timeout=120)
+        at.run()
+        errors = [str(exception.value) for exception in at.exception]
+        failures += bool(errors)
+        print(f"[{'FAIL' if errors else 'ok'}] {label}")
+        for error in errors:
+            print(f"         {error.splitlines()[0] if error else error}")
+
+    print(f"\n{failures} failure{'' if failures == 1 else 's'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# benchmarks/check_query_plans.py
+"""
+Check that every query issued by the analytics, home and invoice tracker
+pages is served by an index instead of a full table scan.
+
+Usage: python -m benchmarks.check_query_plans
+Exits with status 1 if any query plan scans page_visits or invoices
+without an index.
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'plans.sqlite')}"
+
+from utils.db_utils import init_db, session_scope, PageVisit
+from utils.dimensions import interner
+from utils.rollups import refresh_rollups
+from utils import analytics_queries, home_summary, invoices, visit_explorer
+
+# A plan step that reads a large table without any index. Inside the
+# page_visit_details view page_visits is called v.
+FULL_SCAN = re.compile(r"^SCAN (page_visits|v|invoices)$")
+
+def dashboard_queries(session, filters):
+    """Run the same queries display_analytics runs for a set of filters, the home summary and the tracker's"""
+    home_summary.load_home_summary(session)
+    invoices.get_invoice_summary(session)
+    for status in (None, invoices.OUTSTANDING):
+        for descending in (False, True):
+            rows, cursor = invoices.list_invoices(session, status, descending=descending, page_size=5)
+            invoices.list_invoices(session, status, descending=descending, after=cursor, page_size=5)
+    invoices.list_invoices(session, client_id=1, page_size=5)
+    analytics_queries.get_sites(session)
+    analytics_queries.get_date_bounds(session)
+    analytics_queries.get_key_metrics(session, filters)
+    analytics_queries.get_visits_per_day(session, filters)
+    analytics_queries.get_referrer_counts(session, filters)
+    analytics_queries.get_device_counts(session, filters)
+    analytics_queries.get_page_counts(session, filters, limit=100)
+    analytics_queries.get_location_counts(session, filters, limit=50)
+    # Raw data explorer: first and second page for every sort order
+    for sort in visit_explorer.SORT_KEYS:
+        for descending in (True, False):
+            rows, cursor = visit_explorer.fetch_page(session, filters, sort, descending, page_size=50)
+            if cursor is not None:
+                visit_explorer.fetch_page(session, filters, sort, descending, after=cursor, page_size=50)
+
+def capture_statements(engine, scenarios):
+    """Collect (sql, params) for every statement the dashboard executes"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for filters in scenarios:
+            # Bypass the query cache so every statement reaches the database
+            analytics_queries.clear_cache()
+            with session_scope() as session:
+                dashboard_queries(session, filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+def main():
+    engine = init_db()
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(PageVisit.__table__), interner.encode(engine, [
+            {
+                "url": f"https://site{i % 3}.com",
+                "path": f"/page/{i % 20}",
+                "referrer": "https://google.com" if i % 2 else None,
+                "device": "Mobile" if i % 3 else "Desktop",
+                "timestamp": now - timedelta(hours=i)
+            }
+            for i in range(2000)
+        ]))
+    client_id = invoices.add_client("Client", engine=engine)
+    for i in range(40):
+        project_id = invoices.add_project(client_id, f"Project {i}", engine=engine)
+        invoice_id = invoices.create_invoice(
+            client_id, [("Work", 1 + i, 10_000)], project_id=project_id,
+            issued_on=now.date() - timedelta(days=i), engine=engine
+        )
+        invoices.set_invoice_status(invoice_id, invoices.INVOICE_STATUSES[i % 4], engine=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    refresh_rollups(engine)
+
+    scenarios = [
+        {},
+        {"start": now - timedelta(days=7), "end": now},
+        {"url": "https://site1.com", "start": now - timedelta(days=7), "end": now},
+    ]
+
+    failures = 0
+    with engine.connect() as conn:
+        for statement, parameters in capture_statements(engine, scenarios):
+            plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            status = "FAIL" if scans else "ok"
+            failures += bool(scans)
+            print(f"[{status}] {' '.join(statement.split())[:100]}")
+            for step in plan:
+                print(f"         {step}")
+
+    print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} without an index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# benchmarks/load_test_ingest.py
+"""
+Load test for the pageview ingest service on SQLite.
+
+Concurrent clients post batched beacons straight into the ASGI app (no
+network stack) for a fixed duration. Reports sustained events/sec, how
+many events were rejected by backpressure and the p50/p99 latency from
+enqueue to commit.
+
+Usage: python -m benchmarks.load_test_ingest [seconds] [clients] [events_per_beacon]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Point the shared engine at a scratch database before importing the app modules
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["CODRON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'ingest.sqlite')}"
+
+from sqlalchemy import text
+from utils.db_utils import init_db
+from utils.ingest import BatchWriter, IngestApp
+
+USER_AGENT = b"Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"
+
+async def post(app, body):
+    """Send one POST /collect through the ASGI interface, return the status"""
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/collect",
+        "headers": [(b"user-agent", USER_AGENT)],
+        "client": ("127.0.0.1", 50000)
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = None
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def client(app, deadline, events_per_beacon, client_id, counts):
+    events = [
+        {"type": "pageview", "url": f"https://site{client_id % 5}.com", "path": f"/page/{i % 40}",
+         "referrer": "https://google.com"}
+        for i in range(events_per_beacon)
+    ]
+    body = json.dumps(events if events_per_beacon > 1 else events[0]).encode()
+    while time.perf_counter() < deadline:
+        status = await post(app, body)
+        counts[status] = counts.get(status, 0) + 1
+        if status == 503:
+            # Honour backpressure the way the browser fetch fallback would
+            await asyncio.sleep(0.01)
+        else:
+            await asyncio.sleep(0)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+async def main(seconds, clients, events_per_beacon):
+    engine = init_db()
+    writer = BatchWriter(engine)
+    app = IngestApp(writer)
+    await writer.start()
+
+    counts = {}
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(client(app, deadline, events_per_beacon, i, counts) for i in range(clients)))
+    await writer.stop()
+    elapsed = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT COUNT(*) FROM page_visits")).scalar()
+    latencies = list(writer.write_latencies)
+
+    print(f"duration:           {elapsed:.1f}s, {clients} clients, {events_per_beacon} events/beacon")
+    print(f"responses:          {counts}")
+    print(f"events written:     {writer.stats['written']:,} ({stored:,} rows in page_visits)")
+    print(f"events rejected:    {writer.stats['rejected']:,}")
+    print(f"sustained rate:     {writer.stats['written'] / elapsed:,.0f} events/sec")
+    print(f"group commits:      {writer.stats['batches']:,} "
+          f"(avg {writer.stats['written'] / max(writer.stats['batches'], 1):.0f} rows)")
+    print(f"write latency p50:  {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"write latency p99:  {percentile(latencies, 99) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    seconds = args[0] if len(args) > 0 else 10
+    clients = args[1] if len(args) > 1 else 50
+    events_per_beacon = args[2] if len(args) > 2 else 1
+    asyncio.run(main(seconds, clients, events_per_beacon))
@@ -0,0 +1,136 @@
+# benchmarks/stress_json_store.py
+"""
+Stress test for utils.json_store: many processes, each with several threads,
+update a settings-like and a users-like JSON file at the same time while
+other threads keep reading them.
+
+- naive: open("w") + json.dump, read-modify-write without a lock (old code)
+- store: JsonStore.update (lock file + write-then-rename)
+
+Every update increments a counter in the settings file and appends a user
+to the users file, so afterwards the counter and the number of users must
+both equal the number of updates. Reads must always parse.
+
+Usage: python -m benchmarks.stress_json_store [processes] [threads] [updates]
+"""
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from utils.json_store import JsonStore
+
+MODES = ["naive", "store"]
+
+def naive_update(path, change):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = None
+    if data is None:
+        return False
+    change(data)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return True
+
+def naive_read(path):
+    with open(path) as f:
+        return json.load(f)
+
+def worker(mode, settings_path, users_path, threads, updates, worker_id, results):
+    settings_store = JsonStore(settings_path)
+    users_store = JsonStore(users_path)
+    failures = []
+    stop = threading.Event()
+
+    def increment(settings):
+        settings["counter"] += 1
+
+    def updater(thread_id):
+        for i in range(updates):
+            def add_user(data, name=f"user-{worker_id}-{thread_id}-{i}"):
+                data["users"].append({"username": name})
+            try:
+                if mode == "store":
+                    settings_store.update(increment)
+                    users_store.update(add_user)
+                elif not (naive_update(settings_path, increment) and naive_update(users_path, add_user)):
+                    failures.append("update read a partial file")
+            except Exception as e:
+                failures.append(repr(e))
+
+    def reader():
+        while not stop.is_set():
+            try:
+                if mode == "store":
+                    settings_store.read(copy_result=False)
+                    users_store.read(copy_result=False)
+                else:
+                    naive_read(settings_path)
+                    naive_read(users_path)
+            except Exception as e:
+                failures.append(f"read: {e!r}")
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    updaters = [threading.Thread(target=updater, args=(t,)) for t in range(threads)]
+    for thread in updaters:
+        thread.start()
+    for thread in updaters:
+        thread.join()
+    stop.set()
+    reader_thread.join()
+    results.put(failures)
+
+def run(mode, processes, threads, updates):
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_path = os.path.join(tmp, "user_settings.json")
+        users_path = os.path.join(tmp, "users.json")
+        JsonStore(settings_path).write({"counter": 0, "theme": "dark"})
+        JsonStore(users_path).write({"users": []})
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=worker,
+                args=(mode, settings_path, users_path, threads, updates, worker_id, results)
+            )
+            for worker_id in range(processes)
+        ]
+        start = time.perf_counter()
+        for process in workers:
+            process.start()
+        failures = [failure for _ in workers for failure in results.get()]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        expected = processes * threads * updates
+        try:
+            counter = JsonStore(settings_path).read()["counter"]
+            users = len(JsonStore(users_path).read()["users"])
+        except json.JSONDecodeError:
+            counter = users = "corrupt"
+        ok = counter == expected and users == expected and not failures
+        print(
+            f"{mode:>6} | {elapsed:>6.2f} s | counter {counter} / {expected} | "
+            f"users {users} / {expected} | {len(failures)} errors | {'ok' if ok else 'FAIL'}"
+        )
+        for failure in sorted(set(failures))[:5]:
+            print(f"         {failure}")
+        return ok
+
+def main(processes, threads, updates):
+    print(f"{processes} processes x {threads} threads x {updates} updates\n")
+    results = {mode: run(mode, processes, threads, updates) for mode in MODES}
+    return 0 if results["store"] else 1
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    processes, threads, updates = (args + [4, 4, 50][len(args):])[:3]
+    sys.exit(main(processes, threads, updates))
\ No newline at end of file
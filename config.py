@@ -1,8 +1,9 @@
 # config.py
 import os
-import json
 from pathlib import Path
 
+from utils.json_store import JsonStore
+
 # Base paths
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
@@ -10,38 +11,190 @@ DATA_DIR.mkdir(exist_ok=True)
 
 # Database configuration
 DB_PATH = DATA_DIR / "db.sqlite"  # Use SQLite for simplicity, stored in the 'data' directory
-DATABASE_URL = f"sqlite:///{DB_PATH}"  # SQLAlchemy connection URL format
+DATABASE_URL = os.environ.get("CODRON_DATABASE_URL", f"sqlite:///{DB_PATH}")  # SQLAlchemy connection URL format
+
+# Connection pool settings for the shared engine
+DB_POOL_SIZE = int(os.environ.get("CODRON_DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("CODRON_DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = 30  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = 1800  # Seconds before a pooled connection is replaced
+
+# Pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # Milliseconds
+    "mmap_size": 256 * 1024 * 1024,  # Bytes
+    "cache_size": -64 * 1024  # Negative values are KiB
+}
+
+# Optional (referrer, device) index on page_visits for the breakdown charts
+PAGE_VISITS_REFERRER_DEVICE_INDEX = True
+
+# Ingest service for the JavaScript tracker (utils/ingest.py)
+INGEST_HOST = os.environ.get("CODRON_INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.environ.get("CODRON_INGEST_PORT", 8502))
+INGEST_PUBLIC_URL = os.environ.get("CODRON_INGEST_URL", f"http://localhost:{INGEST_PORT}")
+INGEST_BATCH_SIZE = 500  # Rows per group commit
+INGEST_FLUSH_INTERVAL_MS = 50  # Longest a queued row waits before a commit
+INGEST_QUEUE_SIZE = 10_000  # Queued rows before beacons are rejected with 503
+INGEST_MAX_BODY_BYTES = 256 * 1024
+INGEST_WRITE_RETRIES = 6  # Extra attempts at a batch whose write hit a locked database
+INGEST_RETRY_BACKOFF = 0.5  # Seconds before the first retry, doubled after each
+INGEST_DEAD_LETTER_DIR = Path(os.environ.get("CODRON_DEAD_LETTER_DIR", DATA_DIR / "dead_letters"))  # Batches that could not be written, until replayed
+
+# Browser, OS, device and country of ingested visits (utils/enrichment.py)
+GEOIP_RANGES_PATH = Path(os.environ.get("CODRON_GEOIP_RANGES", DATA_DIR / "geoip" / "ip-country.bin"))  # Built with python -m utils.enrichment build
+ENRICH_USER_AGENT_CACHE_SIZE = 10_000  # Parsed user agents remembered
+ENRICH_IP_CACHE_SIZE = 100_000  # Countries of IP addresses remembered
+
+# Uptime and SEO checker (utils/uptime.py)
+UPTIME_CONCURRENCY = int(os.environ.get("CODRON_UPTIME_CONCURRENCY", 200))  # Checks in flight at once
+UPTIME_PER_HOST_LIMIT = 4  # Concurrent requests, and pooled connections, per host
+UPTIME_TIMEOUT = 10  # Seconds per attempt
+UPTIME_RETRIES = 2  # Extra attempts after a failed one
+UPTIME_RETRY_BACKOFF = 0.5  # Seconds before the first retry, doubled after each, with jitter
+UPTIME_DEFAULT_INTERVAL = 300  # Seconds between checks of a new target
+UPTIME_TICK_SECONDS = 5  # How often the scheduler looks for due targets
+UPTIME_WINDOW_HOURS = 24  # Period of the dashboard's uptime metric
+UPTIME_MAX_BODY_BYTES = 512 * 1024  # Page bytes read for the SEO analysis
+
+# Rollups (utils/rollups.py)
+ROLLUP_CHUNK_ROWS = 200_000  # page_visits rows folded per transaction
+
+# Unique visitor and top value sketches per day and site (utils/visit_sketches.py).
+# Changing these needs a rollup rebuild: python -m utils.rollups --rebuild
+SKETCH_HLL_PRECISION = 12  # 4 KiB per day and site; visitor counts within about 1.6% (one standard error)
+SKETCH_TOP_K = 100  # Paths and referrers kept per day and site; counts too high by at most visits / SKETCH_TOP_K
+SKETCH_CMS_EPSILON = 0.01  # Count-Min counts too high by at most this fraction of visits...
+SKETCH_CMS_DELTA = 0.01  # ...except with this probability
+
+# Page visit dimension tables (utils/dimensions.py)
+DIMENSION_CACHE_SIZE = 100_000  # Ids remembered per attribute by the ingest interning cache
+
+# Parquet archive of old page visits (utils/archive.py)
+ARCHIVE_DIR = Path(os.environ.get("CODRON_ARCHIVE_DIR", DATA_DIR / "archive" / "page_visits"))
+ARCHIVE_AFTER_DAYS = int(os.environ.get("CODRON_ARCHIVE_AFTER_DAYS", 90))  # Visits older than this are archived
+ARCHIVE_CHUNK_ROWS = 200_000  # page_visits rows moved per transaction
+
+# Analytics query cache (utils/analytics_queries.py)
+ANALYTICS_CACHE_SIZE = 256  # Cached results kept, least recently used evicted first
+ANALYTICS_CACHE_TTL = 300  # Seconds before a cached result is recomputed
+
+# Invoice & Project Tracker (utils/invoices.py)
+INVOICE_PAGE_SIZE = 50  # Invoices or projects listed per page
+INVOICE_DUE_DAYS = 30  # Payment term of new invoices
+INVOICE_CURRENCY = os.environ.get("CODRON_CURRENCY", "$")  # Shown before amounts
+INVOICE_SUMMARY_TARGET_MS = 50  # Budget of the tracker totals, checked by benchmarks/bench_invoices.py
+
+# Dashboard Home overview (utils/home_summary.py)
+HOME_SUMMARY_TTL = int(os.environ.get("CODRON_HOME_SUMMARY_TTL", 10))  # Seconds all sessions share one computed summary
+HOME_SUMMARY_TARGET_MS = 50  # Latency target of the summary query, checked by benchmarks/bench_home_summary.py
+
+# Live traffic view of the analytics page (utils/live_traffic.py)
+LIVE_WINDOW_MINUTES = 30  # Minutes of recent visits kept in the per-minute counters
+LIVE_REFRESH_SECONDS = 5  # How often the live view fetches new visits
+LIVE_FETCH_BATCH = 5000  # New visits read per query
+LIVE_MAX_BEHIND = 100_000  # More new visits than this are recounted from the timestamp index instead
+
+# Raw visit explorer (utils/visit_explorer.py)
+EXPLORER_PAGE_SIZE = 100  # Visits shown per page
+EXPLORER_EXPORT_CHUNK_ROWS = 5000  # Visits fetched per query during CSV export
+
+# Bulk sample data (utils/sample_data.py)
+SAMPLE_DATA_CHUNK_ROWS = 100_000  # Visits inserted per transaction
+
+# Profiles of uploaded data files (utils/data_profile.py)
+PROFILE_CHUNK_BYTES = 4 * 1024 * 1024  # CSV bytes parsed per chunk; the reader holds a few dozen chunks' worth
+PROFILE_XLSX_CHUNK_ROWS = 50_000  # Spreadsheet rows per chunk
+PROFILE_CACHE_DIR = Path(os.environ.get("CODRON_PROFILE_CACHE_DIR", DATA_DIR / "profiles"))  # Profiles by file SHA-256
+PROFILE_HLL_PRECISION = 14  # 2 ** 14 HyperLogLog registers per column, ~0.8% distinct count error
+PROFILE_KLL_K = 200  # KLL sketch size per numeric column, ~1% quantile rank error
+
+# Reports (utils/reports.py)
+REPORT_WORKERS = int(os.environ.get("CODRON_REPORT_WORKERS", min(5, os.cpu_count() or 1)))  # Processes computing report sections
+REPORT_START_METHOD = "spawn"  # Workers start fresh instead of forking the threaded Streamlit server
+REPORT_CACHE_SIZE = 32  # Finished reports kept in memory
+REPORT_CACHE_TTL = 600  # Seconds before the same report is computed again
+REPORT_POLL_SECONDS = 1  # How often the Reports page checks a running job
+
+# Chart rendering (utils/charts.py)
+CHART_CACHE_SIZE = 64  # Rendered charts kept in memory
+CHART_CACHE_TTL = 600  # Seconds
+
+# AI Assistant (utils/assistant.py)
+ASSISTANT_PROVIDER = os.environ.get("CODRON_ASSISTANT_PROVIDER", "auto")  # "stub", "openai", or "auto": OpenAI once an API key is saved
+ASSISTANT_OPENAI_URL = os.environ.get("CODRON_OPENAI_URL", "https://api.openai.com/v1/chat/completions")
+ASSISTANT_OPENAI_MODEL = os.environ.get("CODRON_OPENAI_MODEL", "gpt-4o-mini")
+ASSISTANT_TIMEOUT = 60  # Seconds to wait for the provider's next chunk
+ASSISTANT_STUB_TOKEN_SECONDS = 0.02  # Pause between the stub provider's words, so its answers stream like a model's
+ASSISTANT_CONTEXT_DAYS = 30  # Complete days of analytics summarized for the model
+ASSISTANT_CONTEXT_TOP = 5  # Pages, referrers, devices and locations listed in the summary
+ASSISTANT_CACHE_MAX_BYTES = 8 * 1024 * 1024  # Cached answers kept, least recently used evicted first
+
+# Authentication (utils/auth_utils.py)
+BCRYPT_ROUNDS = int(os.environ.get("CODRON_BCRYPT_ROUNDS", 12))  # Cost factor of new password hashes
+# Concurrent bcrypt checks. bcrypt releases the GIL, so at least 4 run at
+# once even on one CPU: a login never waits for a whole queue of others
+AUTH_VERIFY_WORKERS = int(os.environ.get("CODRON_AUTH_VERIFY_WORKERS", max(4, os.cpu_count() or 1)))
+AUTH_VERIFY_CACHE_SIZE = 1024  # Recent successful logins remembered
+AUTH_VERIFY_CACHE_TTL = 300  # Seconds before a remembered login is checked with bcrypt again
+
+# Server-side session contexts (utils/session_store.py)
+SESSION_IDLE_TIMEOUT = 30 * 60  # Seconds without a rerun before a context is dropped
+SESSION_STORE_MAX_BYTES = 256 * 1024 * 1024  # Memory cap across all contexts
+SESSION_MEMO_SIZE = 32  # Results remembered per context
+
+# Timing instrumentation and the Diagnostics page (utils/instrumentation.py)
+INSTRUMENTATION_ENABLED = os.environ.get("CODRON_INSTRUMENTATION", "1") != "0"
+INSTRUMENTATION_BUFFER_SIZE = 5000  # Most recent timings kept for the Diagnostics page
+INSTRUMENTATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Histogram upper bounds, seconds
+RERUN_PROFILER = os.environ.get("CODRON_PROFILE_RERUN", "")  # "cprofile" or "pyinstrument" profiles one rerun of app.py
+DIAGNOSTICS_DIR = Path(os.environ.get("CODRON_DIAGNOSTICS_DIR", DATA_DIR / "diagnostics"))  # Rerun profiles
 
 # App settings
 APP_NAME = "CodRon"
 DEFAULT_THEME = "dark"
+DEFAULT_CHART_BACKEND = "matplotlib"  # or "native" for browser-rendered Vega-Lite charts
 
 # User settings path
 USER_SETTINGS_PATH = DATA_DIR / "user_settings.json"
 
+def default_user_settings():
+    """Settings used until the user saves their own"""
+    return {
+        "theme": DEFAULT_THEME,
+        "chart_backend": DEFAULT_CHART_BACKEND,
+        "enabled_modules": {
+            "analytics": True,
+            "seo_checker": True,
+            "invoice_tracker": True,
+            "learning_goals": True,
+            "data_analysis": True,
+            "ai_assistant": True,
+            "reports": True
+        },
+        "openai_api_key": ""
+    }
+
+_settings_store = JsonStore(USER_SETTINGS_PATH, default=default_user_settings)
+
 def save_user_settings(settings):
     """Save user settings to JSON file"""
-    with open(USER_SETTINGS_PATH, "w") as f:
-        json.dump(settings, f)
-
-def load_user_settings():
-    """Load user settings from JSON file"""
-    if not USER_SETTINGS_PATH.exists():
-        default_settings = {
-            "theme": DEFAULT_THEME,
-            "enabled_modules": {
-                "analytics": True,
-                "seo_checker": True,
-                "invoice_tracker": True,
-                "learning_goals": True,
-                "data_analysis": True,
-                "ai_assistant": True,
-                "reports": True
-            },
-            "openai_api_key": ""
-        }
-        save_user_settings(default_settings)
-        return default_settings
-    
-    with open(USER_SETTINGS_PATH, "r") as f:
-        return json.load(f)
\ No newline at end of file
+    _settings_store.write(settings)
+
+def update_user_settings(changes):
+    """Merge changes into the saved settings, without losing concurrent saves"""
+    _settings_store.update(lambda settings: {**settings, **changes})
+
+def load_user_settings(shared=False):
+    """Load user settings from JSON file.
+
+    With ``shared=True`` the cached settings object is returned instead of a
+    copy. It is replaced, not modified, when the file changes and must not
+    be modified by the caller.
+    """
+    if not _settings_store.exists():
+        # Writes the defaults unless another session just did
+        _settings_store.update(lambda settings: None)
+    return _settings_store.read(copy_result=not shared)
\ No newline at end of file
@@ -0,0 +1,52 @@
+# pages/__init__.py
+"""
+Registry of the dashboard sections shown in the sidebar.
+
+Each section maps to a "module:function" string. The module is only
+imported the first time its section is selected, so one section's heavy
+dependencies are never loaded for the others. Render functions take the
+user's settings dict. Hidden sections are only listed when the URL has a
+``?diagnostics`` query parameter.
+"""
+import importlib
+
+PAGES = {
+    "Dashboard Home": "pages.home:render",
+    "Website Analytics": "pages.analytics:integrate",
+    "SEO & Uptime Checker": "pages.seo:render",
+    "Invoice & Project Tracker": "pages.invoices:render",
+    "Learning Goals + Pomodoro": "pages.learning:render",
+    "Data Analysis": "pages.data_analysis:render",
+    "AI Assistant": "pages.assistant:render",
+    "Reports": "pages.reports:render",
+    "Settings": "pages.settings:render",
+    "Diagnostics": "pages.diagnostics:render"
+}
+
+HIDDEN_PAGES = {"Diagnostics"}
+
+# Sections that can be turned off on the Settings page, by their key in
+# settings["enabled_modules"]. The others are always shown.
+PAGE_MODULES = {
+    "Website Analytics": "analytics",
+    "SEO & Uptime Checker": "seo_checker",
+    "Invoice & Project Tracker": "invoice_tracker",
+    "Learning Goals + Pomodoro": "learning_goals",
+    "Data Analysis": "data_analysis",
+    "AI Assistant": "ai_assistant",
+    "Reports": "reports"
+}
+
+def enabled_pages(enabled_modules, show_hidden=False):
+    """Section names to show, given settings["enabled_modules"]"""
+    return [
+        name for name in PAGES
+        if enabled_modules.get(PAGE_MODULES.get(name), True)
+        and (show_hidden or name not in HIDDEN_PAGES)
+    ]
+
+def load_page(name):
+    """Return the render function of a section, importing its module on first use"""
+    module_name, function_name = PAGES[name].split(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)
@@ -1,18 +1,186 @@
 # pages/analytics.py
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import datetime
-import sys
-import os
+import tempfile
 
-# Add parent directory to path to import modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.db_utils import get_db_session, PageVisit
+from config import (
+    INGEST_PUBLIC_URL,
+    SKETCH_HLL_PRECISION,
+    LIVE_WINDOW_MINUTES,
+    LIVE_REFRESH_SECONDS,
+    load_user_settings
+)
+from utils.db_utils import session_scope
+from utils.rollups import refresh_rollups
+from utils.charts import chart_backend, show_chart, get_chart_cache_stats
+from utils.live_traffic import live_traffic
+from utils.visit_explorer import COLUMNS as EXPLORER_COLUMNS, fetch_page, export_csv
+from utils.analytics_queries import (
+    get_sites,
+    get_date_bounds,
+    get_key_metrics,
+    get_visits_per_day,
+    get_referrer_counts,
+    get_device_counts,
+    get_page_counts,
+    get_location_counts,
+    get_cache_stats,
+    get_data_version
+)
+from utils.cache import freeze
+from utils.session_store import get_current_context
 
-def display_analytics():
+# Maximum number of rows in the Popular Pages table
+POPULAR_PAGES_LIMIT = 100
+
+# Number of values offered by each raw data filter
+FILTER_OPTIONS_LIMIT = 50
+
+# Explorer sort option -> (visit_explorer sort key, descending)
+EXPLORER_SORTS = {
+    "Newest first": ("timestamp", True),
+    "Oldest first": ("timestamp", False),
+    "URL": ("url", False),
+    "Path": ("path", False)
+}
+
+# Website filter option that disables the per-site filter
+ALL_SITES = "All websites"
+
+# Standard error of the unique visitor estimate
+VISITOR_ERROR_PERCENT = 100 * 1.04 / 2 ** (SKETCH_HLL_PRECISION / 2)
+
+def build_filters(site, date_range):
+    """Turn the filter widgets' values into analytics query filters"""
+    filters = {}
+    if site != ALL_SITES:
+        filters["url"] = site
+    # date_input returns a single date while a range is still being picked
+    if date_range:
+        start_date = date_range[0]
+        end_date = date_range[-1]
+        filters["start"] = datetime.datetime.combine(start_date, datetime.time.min)
+        filters["end"] = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+    return filters
+
+def show_visit_explorer(filters):
+    """Page through the raw visits matching the filters, one page at a time"""
+    with session_scope() as session:
+        referrers = [value for value, _ in get_referrer_counts(session, filters, limit=FILTER_OPTIONS_LIMIT)]
+        devices = [value for value, _ in get_device_counts(session, filters, limit=FILTER_OPTIONS_LIMIT) if value]
+        locations = [value for value, _ in get_location_counts(session, filters, limit=FILTER_OPTIONS_LIMIT) if value]
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        path_prefix = st.text_input("Path starts with", key="explorer_path")
+    with col2:
+        referrer = st.selectbox("Referrer", ["Any"] + referrers, key="explorer_referrer")
+    with col3:
+        device = st.selectbox("Device", ["Any"] + devices, key="explorer_device")
+    with col4:
+        location = st.selectbox("Location", ["Any"] + locations, key="explorer_location")
+    with col5:
+        sort_label = st.selectbox("Sort", list(EXPLORER_SORTS), key="explorer_sort")
+    
+    explorer_filters = dict(filters)
+    explorer_filters.update({
+        "path_prefix": path_prefix,
+        "referrer": referrer if referrer != "Any" else None,
+        "device": device if device != "Any" else None,
+        "location": location if location != "Any" else None
+    })
+    sort, descending = EXPLORER_SORTS[sort_label]
+    
+    # Cursors of the pages visited so far; start over when the query changes
+    query_key = (sort_label, tuple(sorted(explorer_filters.items())))
+    if st.session_state.get("explorer_query") != query_key:
+        st.session_state.explorer_query = query_key
+        st.session_state.explorer_cursors = [None]
+    cursors = st.session_state.explorer_cursors
+    
+    with session_scope() as session:
+        rows, next_cursor = fetch_page(session, explorer_filters, sort, descending, after=cursors[-1])
+    
+    page_number = len(cursors)
+    if rows:
+        st.caption(f"Page {page_number} ({len(rows):,} visits)")
+        st.dataframe(pd.DataFrame(rows, columns=EXPLORER_COLUMNS), hide_index=True)
+    else:
+        st.info("No visits match the selected filters.")
+    
+    prev_col, next_col, export_col = st.columns(3)
+    with prev_col:
+        if st.button("Previous page", disabled=page_number == 1, key="explorer_prev"):
+            cursors.pop()
+            st.rerun()
+    with next_col:
+        if st.button("Next page", disabled=next_cursor is None, key="explorer_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+    with export_col:
+        def build_export():
+            # Runs on a separate thread when the button is clicked; rows are
+            # written in chunks to a temporary file rather than a DataFrame
+            export_file = tempfile.TemporaryFile()
+            with session_scope() as session:
+                export_csv(session, export_file, explorer_filters, sort, descending)
+            export_file.seek(0)
+            return export_file
+        
+        st.download_button(
+            "Export CSV",
+            data=build_export,
+            file_name="page_visits.csv",
+            mime="text/csv",
+            key="explorer_export"
+        )
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_live_traffic(url):
+    """Visits of the last LIVE_WINDOW_MINUTES, updated with only the visits added since the last refresh"""
+    with session_scope() as session:
+        live_traffic.refresh(session)
+    snapshot = live_traffic.snapshot(url)
+    per_minute = pd.DataFrame(snapshot["per_minute"], columns=["Minute", "Visits"])
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"Visits (last {LIVE_WINDOW_MINUTES} min)", f"{snapshot['visits']:,}")
+    col2.metric("Visits this minute", f"{per_minute['Visits'].iloc[-1]:,}")
+    col3.metric("Visits per minute", f"{snapshot['visits'] / LIVE_WINDOW_MINUTES:,.1f}")
+    st.bar_chart(per_minute.set_index("Minute"))
+
+    for col, field, label in zip(
+        st.columns(3),
+        ("paths", "referrers", "devices"),
+        ("Page", "Referrer", "Device")
+    ):
+        with col:
+            st.caption(f"Top {label.lower()}s")
+            st.dataframe(pd.DataFrame(snapshot[field], columns=[label, "Visits"]), hide_index=True)
+
+    st.caption(
+        f"Last refresh read {snapshot['rows']:,} visits in {snapshot['seconds'] * 1000:.0f} ms"
+        f"{' (recounted the window)' if snapshot['rebuilt'] else ''}; "
+        f"updates every {LIVE_REFRESH_SECONDS} s."
+    )
+
+def load_analytics_frames(session, filters):
+    """Chart and table data of the analytics page as DataFrames"""
+    return {
+        "visits_per_day": pd.DataFrame(get_visits_per_day(session, filters), columns=["Date", "Visits"]),
+        "referrer_counts": pd.DataFrame(get_referrer_counts(session, filters), columns=["Referrer", "Visits"]),
+        "device_counts": pd.DataFrame(get_device_counts(session, filters), columns=["Device", "Visits"]),
+        "page_counts": pd.DataFrame(
+            get_page_counts(session, filters, limit=POPULAR_PAGES_LIMIT),
+            columns=["Page", "Visit Count"]
+        )
+    }
+
+def display_analytics(settings=None):
     st.title("Website Analytics")
+    settings = settings if settings is not None else load_user_settings()
+    backend = chart_backend(settings)
     
     # Add JS tracker snippet for demonstration
     with st.expander("JavaScript Tracker for Your Website"):
@@ -22,7 +190,7 @@ def display_analytics():
   (function() {
     var d = document;
     var s = d.createElement('script');
-    s.src = 'https://your-analytics-api.com/tracker.js';
+    s.src = '%s/tracker.js';
     s.async = true;
     d.head.appendChild(s);
     
@@ -33,116 +201,135 @@ def display_analytics():
     window.codronTracker('pageview');
   })();
 </script>
-        """, language="html")
-    
-    # Fetch analytics data from the database
-    with get_db_session() as session:
-        results = session.query(PageVisit).all()
-        if not results:
-            st.warning("No analytics data available. Would you like to generate sample data for demonstration?")
-            if st.button("Generate Sample Data"):
-                # Import and run sample data generator
-                from utils.sample_data import generate_sample_analytics_data
-                generate_sample_analytics_data()
-                st.success("Sample data generated successfully! Please refresh the page.")
-                st.rerun()
-            return
-        
-        # Convert to DataFrame for easier manipulation
-        data = [{
-            "URL": r.url,
-            "Path": r.path,
-            "Referrer": r.referrer if r.referrer else "Direct",
-            "Device": r.device,
-            "Location": r.location,
-            "Timestamp": r.timestamp
-        } for r in results]
+        """ % INGEST_PUBLIC_URL, language="html")
+        st.caption("Start the ingest service with `python -m utils.ingest` to receive pageviews.")
+    
+    # Live mode only reads the visits added since its last refresh
+    if st.toggle("Live mode", key="analytics_live", help=f"Visits of the last {LIVE_WINDOW_MINUTES} minutes, as they arrive"):
+        with session_scope() as session:
+            sites = get_sites(session)
+        site = st.selectbox("Website", [ALL_SITES] + sites, key="live_site")
+        show_live_traffic(None if site == ALL_SITES else site)
+        return
+    
+    # Fold visits recorded since the last rerun into the rollups
+    refresh_rollups()
+    
+    # Find out which sites and dates there is data for
+    with session_scope() as session:
+        sites = get_sites(session)
+        first_visit, last_visit = get_date_bounds(session)
+    
+    if first_visit is None:
+        st.warning("No analytics data available. Would you like to generate sample data for demonstration?")
+        if st.button("Generate Sample Data"):
+            # Import and run sample data generator
+            from utils.sample_data import generate_sample_analytics_data
+            generate_sample_analytics_data()
+            st.success("Sample data generated successfully! Please refresh the page.")
+            st.rerun()
+        return
+    
+    # Site and date range filters
+    filter_col1, filter_col2 = st.columns(2)
+    
+    with filter_col1:
+        site = st.selectbox("Website", [ALL_SITES] + sites)
+    
+    with filter_col2:
+        date_range = st.date_input(
+            "Date range",
+            value=(first_visit.date(), last_visit.date()),
+            min_value=first_visit.date(),
+            max_value=last_visit.date()
+        )
+    
+    filters = build_filters(site, date_range)
+    
+    # Fetch the aggregated analytics data from the database
+    with session_scope() as session:
+        metrics = get_key_metrics(session, filters)
+        has_data = metrics["total_visits"] > 0
         
-        df = pd.DataFrame(data)
+        # Only small, pre-aggregated result sets leave the database. The
+        # user's session context keeps the DataFrames between reruns.
+        if has_data:
+            context = get_current_context()
+            if context is None:
+                frames = load_analytics_frames(session, filters)
+            else:
+                key = ("analytics_frames", freeze(filters), get_data_version(session))
+                frames = context.memo(key, lambda: load_analytics_frames(session, filters))
+    
+    if not has_data:
+        st.info("No visits match the selected filters.")
+        return
+    
+    visits_per_day = frames["visits_per_day"]
+    referrer_counts = frames["referrer_counts"]
+    device_counts = frames["device_counts"]
+    page_counts = frames["page_counts"]
     
     # Display key metrics
     st.subheader("Key Metrics")
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        total_visits = len(df)
-        st.metric("Total Visits", f"{total_visits:,}")
+        st.metric("Total Visits", f"{metrics['total_visits']:,}")
     
     with col2:
-        unique_visitors = df["URL"].nunique()
-        st.metric("Unique URLs", f"{unique_visitors:,}")
+        st.metric(
+            "Unique Visitors",
+            f"{metrics['unique_visitors']:,}",
+            help=f"Estimated from IP address and user agent, usually within {VISITOR_ERROR_PERCENT:.1f}%."
+        )
     
     with col3:
-        popular_page = df["Path"].value_counts().idxmax()
-        st.metric("Most Popular Page", popular_page)
+        st.metric("Unique URLs", f"{metrics['unique_urls']:,}")
     
     with col4:
-        top_referrer = df["Referrer"].value_counts().idxmax()
-        st.metric("Top Referrer", top_referrer)
+        st.metric("Most Popular Page", metrics["top_path"])
+    
+    with col5:
+        st.metric("Top Referrer", metrics["top_referrer"])
     
     # Visits over time chart
     st.subheader("Visits Over Time")
-    df["Date"] = pd.to_datetime(df["Timestamp"]).dt.date
-    visits_per_day = df.groupby("Date").size().reset_index(name="Visits")
-    visits_per_day["Date"] = pd.to_datetime(visits_per_day["Date"])
-    
-    fig, ax = plt.subplots(figsize=(10, 4))
-    sns.lineplot(data=visits_per_day, x="Date", y="Visits", ax=ax)
-    plt.tight_layout()
-    st.pyplot(fig)
+    show_chart("visits_over_time", visits_per_day, backend)
     
     # Display additional charts in tabs
     tab1, tab2, tab3 = st.tabs(["Traffic Sources", "Device Breakdown", "Popular Pages"])
     
     with tab1:
         st.subheader("Traffic Sources")
-        referrer_counts = df["Referrer"].value_counts()
-        
-        fig, ax = plt.subplots(figsize=(8, 5))
-        referrer_counts.plot.pie(
-            autopct='%1.1f%%',
-            startangle=90,
-            ax=ax,
-            label=""
-        )
-        plt.axis('equal')
-        plt.title("Traffic Sources")
-        st.pyplot(fig)
+        show_chart("traffic_sources", referrer_counts, backend)
     
     with tab2:
         st.subheader("Device Breakdown")
-        device_counts = df["Device"].value_counts()
-        
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.barplot(x=device_counts.index, y=device_counts.values, ax=ax)
-        plt.title("Visits by Device Type")
-        plt.tight_layout()
-        st.pyplot(fig)
+        show_chart("devices", device_counts, backend)
     
     with tab3:
         st.subheader("Popular Pages")
-        page_counts = df["Path"].value_counts().reset_index()
-        page_counts.columns = ["Page", "Visit Count"]
-        
-        # Sort by visit count in descending order
-        page_counts = page_counts.sort_values("Visit Count", ascending=False)
         
-        # Display as a bar chart
-        fig, ax = plt.subplots(figsize=(10, 6))
-        sns.barplot(x="Visit Count", y="Page", data=page_counts.head(10), ax=ax)
-        plt.title("Top 10 Pages by Visit Count")
-        plt.tight_layout()
-        st.pyplot(fig)
+        # Display as a bar chart (already sorted by visit count)
+        show_chart("top_pages", page_counts.head(10), backend)
         
         # Also display as a table
+        st.caption(f"Top {POPULAR_PAGES_LIMIT} pages by visit count.")
         st.dataframe(page_counts)
     
     # Raw data view
     with st.expander("View Raw Data"):
-        st.dataframe(df)
-
-def integrate():
-    display_analytics()
+        show_visit_explorer(filters)
+    
+    # Query and chart cache statistics
+    cache_stats = get_cache_stats()
+    chart_stats = get_chart_cache_stats()
+    st.caption(
+        f"Query cache: {cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses, "
+        f"{cache_stats['size']} cached results. "
+        f"Chart cache: {chart_stats['hits']:,} hits, {chart_stats['misses']:,} misses."
+    )
 
-if __name__ == "__main__":
-    display_analytics()
\ No newline at end of file
+def integrate(settings=None):
+    display_analytics(settings)
\ No newline at end of file
@@ -0,0 +1,60 @@
+# pages/assistant.py
+import streamlit as st
+
+from config import ASSISTANT_CONTEXT_DAYS
+from utils.assistant import AssistantError, ask, build_context, describe_reply, get_provider, response_cache
+from utils.db_utils import session_scope
+from utils.rollups import refresh_rollups
+
+def show_message(message):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        if message.get("note"):
+            st.caption(message["note"])
+
+def render(settings):
+    """Display the AI Assistant section"""
+    st.title("AI Assistant")
+    st.subheader("CodRon Bot")
+    try:
+        provider = get_provider(settings)
+    except AssistantError as exc:
+        st.error(str(exc))
+        return
+    st.caption(
+        f"Answers ({provider.name} provider) about the last {ASSISTANT_CONTEXT_DAYS} complete days "
+        "of website analytics and your invoice totals."
+    )
+
+    # The model only sees this summary of the rollups, never raw visits
+    refresh_rollups()
+    with session_scope() as session:
+        context = build_context(session)
+    with st.expander("Data shared with the assistant"):
+        st.text(context)
+
+    history = st.session_state.setdefault("assistant_history", [])
+    for message in history:
+        show_message(message)
+
+    prompt = st.chat_input("Ask me anything about your traffic or invoices")
+    if prompt:
+        history.append({"role": "user", "content": prompt})
+        show_message(history[-1])
+        with st.chat_message("assistant"):
+            reply = ask(prompt, context, provider)
+            try:
+                st.write_stream(reply)
+            except AssistantError as exc:
+                st.error(str(exc))
+                return
+            note = describe_reply(reply)
+            st.caption(note)
+        history.append({"role": "assistant", "content": reply.text, "note": note})
+
+    stats = response_cache.stats()
+    st.caption(
+        f"Response cache: {stats['entries']:,} answers in {stats['bytes'] / 1024:,.1f} of "
+        f"{stats['max_bytes'] / 1024:,.0f} KiB; {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']:,} "
+        "questions answered from it since the server started"
+    )
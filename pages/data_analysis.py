@@ -0,0 +1,62 @@
+# pages/data_analysis.py
+import streamlit as st
+import pandas as pd
+
+from utils.data_profile import QUANTILES, profile_file
+
+def _bound(column, bound):
+    """Min or max of a column as text; the length of text values"""
+    value = column.get(bound, column.get(f"{bound}_length"))
+    return "" if value is None else str(value)
+
+def show_profile(profile):
+    """Column statistics of a profiled file"""
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rows", f"{profile['rows']:,}")
+    col2.metric("Columns", len(profile["columns"]))
+    col3.metric("Profiled in", "cached" if profile["cached"] else f"{profile['seconds']:.1f} s")
+
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Column": column["name"],
+                "Type": column["kind"],
+                "Missing (%)": round(100 * column["null_fraction"], 2),
+                "Distinct (approx.)": column["distinct"],
+                "Min": _bound(column, "min"),
+                "Max": _bound(column, "max"),
+                "Mean": column.get("mean"),
+                "Std": column.get("std")
+            }
+            for column in profile["columns"]
+        ]),
+        hide_index=True
+    )
+    st.caption("Min and max of text columns are value lengths. Distinct counts and quantiles are estimates.")
+
+    numeric = [column for column in profile["columns"] if column["kind"] == "number"]
+    if numeric:
+        st.subheader("Quantiles")
+        st.dataframe(
+            pd.DataFrame(
+                [[column["quantiles"][str(fraction)] for fraction in QUANTILES] for column in numeric],
+                index=[column["name"] for column in numeric],
+                columns=[f"p{fraction * 100:g}" for fraction in QUANTILES]
+            )
+        )
+
+def render(settings):
+    """Display the Data Analysis section"""
+    st.title("Data Analysis")
+
+    st.subheader("Upload & Analyze Data")
+    uploaded_file = st.file_uploader("Upload CSV or Excel file", type=["csv", "xlsx"])
+    if uploaded_file is None:
+        return
+    with st.spinner(f"Profiling {uploaded_file.name}..."):
+        try:
+            profile = profile_file(uploaded_file)
+        except (ValueError, RuntimeError) as exc:
+            st.error(f"Could not analyze {uploaded_file.name}: {exc}")
+            return
+    show_profile(profile)
@@ -0,0 +1,102 @@
+# pages/diagnostics.py
+import streamlit as st
+import pandas as pd
+
+from config import RERUN_PROFILER
+from utils.instrumentation import (
+    RERUN_PROFILERS,
+    timings,
+    request_rerun_profile,
+    rerun_profiles,
+    profile_summary
+)
+
+RECENT_LIMIT = 200
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+def show_summary():
+    """Timing histograms per kind and name"""
+    rows = timings.summary()
+    if not rows:
+        st.info("Nothing has been timed yet.")
+        return
+    kinds = sorted({row["kind"] for row in rows})
+    kind = st.selectbox("Kind:", ["All"] + kinds)
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Kind": row["kind"],
+                "Name": row["name"],
+                "Count": row["count"],
+                "Total (s)": round(row["total"], 3),
+                "Mean (ms)": _ms(row["mean"]),
+                "p50 (ms)": _ms(row["p50"]),
+                "p95 (ms)": _ms(row["p95"]),
+                "p99 (ms)": _ms(row["p99"]),
+                "Max (ms)": _ms(row["max"])
+            }
+            for row in rows
+            if kind == "All" or row["kind"] == kind
+        ]),
+        hide_index=True
+    )
+    st.caption("Percentiles are estimated from histogram buckets, like Prometheus' histogram_quantile.")
+
+    st.subheader("Recent Timings")
+    st.dataframe(
+        pd.DataFrame(
+            [
+                (pd.Timestamp(timestamp, unit="s", tz="UTC"), kind, name, _ms(seconds), detail)
+                for timestamp, kind, name, seconds, detail in timings.recent(RECENT_LIMIT, None if kind == "All" else kind)
+            ],
+            columns=["Time (UTC)", "Kind", "Name", "Duration (ms)", "Detail"]
+        ),
+        hide_index=True
+    )
+
+def show_profiles():
+    """Saved rerun profiles"""
+    st.subheader("Rerun Profiles")
+    if RERUN_PROFILER in RERUN_PROFILERS:
+        if st.button("Profile next rerun"):
+            request_rerun_profile()
+            st.rerun()
+    else:
+        st.caption("Start the app with `CODRON_PROFILE_RERUN=cprofile` (or `pyinstrument`) to profile reruns.")
+
+    profiles = rerun_profiles()
+    if not profiles:
+        return
+    path = profiles[0] if len(profiles) == 1 else st.selectbox(
+        "Profile:", profiles, format_func=lambda path: path.name
+    )
+    mime = "text/html" if path.suffix == ".html" else "application/octet-stream"
+    st.download_button(f"Download {path.name}", path.read_bytes(), path.name, mime)
+    if path.suffix == ".prof":
+        st.code(profile_summary(path), language="text")
+
+def render(settings):
+    """Display the hidden Diagnostics section"""
+    st.title("Diagnostics")
+    st.caption("Timings of this server process since it started, or since they were last cleared.")
+
+    show_summary()
+
+    st.subheader("Prometheus Metrics")
+    metrics_text = timings.prometheus_text()
+    export_col, clear_col = st.columns(2)
+    export_col.download_button(
+        "Export Prometheus metrics",
+        metrics_text,
+        file_name="codron_metrics.prom",
+        mime="text/plain; version=0.0.4"
+    )
+    if clear_col.button("Clear timings"):
+        timings.clear()
+        st.rerun()
+    with st.expander("Metrics text"):
+        st.code(metrics_text, language="text")
+
+    show_profiles()
@@ -0,0 +1,81 @@
+# pages/home.py
+import streamlit as st
+
+from config import APP_NAME, HOME_SUMMARY_TTL, UPTIME_WINDOW_HOURS
+from utils.db_utils import session_scope
+from utils.home_summary import get_home_summary
+from utils.invoices import format_money
+
+def render(settings):
+    """Display the dashboard home page with an overview of all modules"""
+    st.title(f"Welcome to {APP_NAME}")
+    st.write("Your personal development dashboard")
+
+    # Every tile comes from one summary query shared by all sessions
+    with session_scope() as session:
+        summary = get_home_summary(session)
+
+    # Create a dashboard overview with columns
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric(
+            label="Visits Today",
+            value=f"{summary['visits_today']:,}",
+            delta=f"{summary['visits_today'] - summary['visits_yesterday']:,}",
+            help="Compared with yesterday up to the same time"
+        )
+
+    with col2:
+        if summary["uptime"] is None:
+            st.metric(label="Website Uptime", value="n/a", help="Add a website on the SEO & Uptime Checker page")
+        else:
+            previous = summary["previous_uptime"]
+            st.metric(
+                label="Website Uptime",
+                value=f"{summary['uptime']:.1f}%",
+                delta=None if previous is None else f"{summary['uptime'] - previous:.1f}%",
+                help=f"Successful checks in the last {UPTIME_WINDOW_HOURS} hours"
+            )
+
+    with col3:
+        st.metric(label="Active Projects", value=f"{summary['active_projects']:,}")
+
+    with col4:
+        st.metric(
+            label="Pending Invoices",
+            value=f"{summary['outstanding']:,}",
+            help=f"{format_money(summary['outstanding_cents'])} outstanding, {summary['overdue']:,} overdue"
+        )
+
+    # Recent activity
+    st.subheader("Recent Activity")
+    st.info("This section will display your recent activities across all modules.")
+
+    # Quick overview of all modules
+    st.subheader("Quick Overview")
+
+    module_cols = st.columns(3)
+
+    with module_cols[0]:
+        st.write("### Analytics")
+        last_visit = summary["last_visit"]
+        st.info(
+            f"{summary['visits_today']:,} visits today across {summary['sites_today']:,} "
+            f"site{'' if summary['sites_today'] == 1 else 's'}. "
+            + ("No visits recorded yet." if last_visit is None else f"Last visit: {last_visit:%Y-%m-%d %H:%M}")
+        )
+
+    with module_cols[1]:
+        st.write("### Projects")
+        due = summary["projects_due_this_week"]
+        st.info(f"{due:,} project{'' if due == 1 else 's'} due this week")
+
+    with module_cols[2]:
+        st.write("### Learning")
+        st.info("Pomodoro sessions are not tracked yet")
+
+    st.caption(
+        f"Updated {summary['computed_at']:%H:%M:%S} in {summary['seconds'] * 1000:.0f} ms; "
+        f"refreshed at most every {HOME_SUMMARY_TTL} seconds."
+    )
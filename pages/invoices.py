@@ -0,0 +1,238 @@
+# pages/invoices.py
+from datetime import date
+
+import streamlit as st
+import pandas as pd
+
+from utils.db_utils import session_scope
+from utils.invoices import (
+    INVOICE_COLUMNS,
+    INVOICE_STATUSES,
+    LINE_COLUMNS,
+    PROJECT_COLUMNS,
+    PROJECT_STATUSES,
+    add_client,
+    add_invoice_line,
+    add_project,
+    create_invoice,
+    format_money,
+    get_clients,
+    get_invoice,
+    get_invoice_summary,
+    get_projects,
+    list_invoices,
+    list_projects,
+    remove_invoice_line,
+    set_invoice_status,
+    set_project_status
+)
+
+def show_summary():
+    with session_scope() as session:
+        summary = get_invoice_summary(session)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(
+        "Outstanding", format_money(summary["outstanding_cents"]),
+        help=f"{summary['outstanding']:,} sent invoices waiting for payment"
+    )
+    col2.metric("Overdue", format_money(summary["overdue_cents"]), help=f"{summary['overdue']:,} invoices past their due date")
+    col3.metric(
+        "Due this week", format_money(summary["due_this_week_cents"]),
+        help=f"{summary['due_this_week']:,} invoices due in the next 7 days"
+    )
+    col4.metric("Active projects", f"{summary['active_projects']:,}", help=f"{summary['drafts']:,} draft invoices")
+
+def paged(key, query_key, fetch, columns):
+    """Show one page of ``fetch(after)`` with Previous/Next buttons.
+
+    The cursors of the pages visited so far are kept in the session and
+    start over when ``query_key`` changes.
+    """
+    if st.session_state.get(f"{key}_query") != query_key:
+        st.session_state[f"{key}_query"] = query_key
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+
+    rows, next_cursor = fetch(cursors[-1])
+    if rows:
+        st.caption(f"Page {len(cursors)}")
+        st.dataframe(pd.DataFrame(rows, columns=columns), hide_index=True)
+    else:
+        st.info("Nothing matches the selected filters.")
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if st.button("Previous page", disabled=len(cursors) == 1, key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with next_col:
+        if st.button("Next page", disabled=next_cursor is None, key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def show_invoices(clients):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        status = st.selectbox("Status", ["Any"] + list(INVOICE_STATUSES), key="invoice_status")
+    with col2:
+        client = st.selectbox("Client", [None] + list(clients), format_func=lambda c: clients.get(c, "Any"), key="invoice_client")
+    with col3:
+        descending = st.selectbox("Due date", ["Earliest first", "Latest first"], key="invoice_order") == "Latest first"
+    status = None if status == "Any" else status
+
+    def fetch(after):
+        with session_scope() as session:
+            rows, cursor = list_invoices(session, status, client, descending=descending, after=after)
+        return [row[:-1] + (format_money(row[-1]),) for row in rows], cursor
+
+    paged("invoices", (status, client, descending), fetch, INVOICE_COLUMNS)
+
+def show_new_invoice(clients):
+    if not clients:
+        st.info("Add a client first.")
+        return
+    with session_scope() as session:
+        projects = {project_id: f"{client} - {name}" for project_id, client, name in get_projects(session)}
+    with st.form("invoice_new", clear_on_submit=True):
+        client = st.selectbox("Client", list(clients), format_func=clients.get)
+        project = st.selectbox("Project (optional)", [None] + list(projects), format_func=lambda p: projects.get(p, "None"))
+        issued_on = st.date_input("Issued on", value=date.today())
+        lines = st.data_editor(
+            pd.DataFrame({"Description": pd.Series(dtype="str"), "Quantity": pd.Series(dtype="float"), "Unit price": pd.Series(dtype="float")}),
+            num_rows="dynamic",
+            hide_index=True
+        )
+        if st.form_submit_button("Create draft"):
+            lines = lines.dropna()
+            try:
+                invoice_id = create_invoice(
+                    client,
+                    [(row["Description"], row["Quantity"], round(row["Unit price"] * 100)) for _, row in lines.iterrows()],
+                    project_id=project,
+                    issued_on=issued_on
+                )
+                st.success(f"Created draft INV-{invoice_id:06d}")
+            except ValueError as exc:
+                st.error(str(exc))
+
+def show_edit_invoice():
+    number = st.text_input("Invoice number", placeholder="INV-000001", key="invoice_edit_number").strip()
+    if not number:
+        return
+    with session_scope() as session:
+        found = get_invoice(session, number)
+    if found is None:
+        st.warning(f"There is no invoice {number}.")
+        return
+    invoice, lines = found
+    st.write(f"**{invoice['number']}** ({invoice['status']}), total {format_money(invoice['total_cents'])}")
+    if lines:
+        st.dataframe(
+            pd.DataFrame(
+                [(id_, description, quantity, format_money(price), format_money(amount))
+                 for id_, description, quantity, price, amount in lines],
+                columns=LINE_COLUMNS
+            ),
+            hide_index=True
+        )
+
+    status_col, button_col = st.columns([3, 1])
+    with status_col:
+        status = st.selectbox("Status", INVOICE_STATUSES, index=INVOICE_STATUSES.index(invoice["status"]), key="invoice_edit_status")
+    with button_col:
+        if st.button("Update status", key="invoice_edit_update"):
+            set_invoice_status(invoice["id"], status)
+            st.rerun()
+
+    if invoice["status"] != "draft":
+        return
+    with st.form("invoice_add_line", clear_on_submit=True):
+        description = st.text_input("Description")
+        quantity = st.number_input("Quantity", min_value=0.0, value=1.0)
+        price = st.number_input("Unit price", min_value=0.0, value=0.0, step=1.0)
+        if st.form_submit_button("Add line"):
+            try:
+                add_invoice_line(invoice["id"], description, quantity, round(price * 100))
+                st.rerun()
+            except ValueError as exc:
+                st.error(str(exc))
+    if lines:
+        line_col, remove_col = st.columns([3, 1])
+        with line_col:
+            line_id = st.selectbox("Line", [line[0] for line in lines], format_func=dict((line[0], line[1]) for line in lines).get, key="invoice_line")
+        with remove_col:
+            if st.button("Remove line", key="invoice_remove_line"):
+                remove_invoice_line(line_id)
+                st.rerun()
+
+def show_projects(clients):
+    col1, col2 = st.columns(2)
+    with col1:
+        status = st.selectbox("Status", ["Any"] + list(PROJECT_STATUSES), key="project_status")
+    with col2:
+        client = st.selectbox("Client", [None] + list(clients), format_func=lambda c: clients.get(c, "Any"), key="project_client")
+    status = None if status == "Any" else status
+
+    def fetch(after):
+        with session_scope() as session:
+            return list_projects(session, status, client, after=after)
+
+    paged("projects", (status, client), fetch, PROJECT_COLUMNS)
+
+    if not clients:
+        st.info("Add a client to start a project.")
+        return
+    with st.form("project_new", clear_on_submit=True):
+        st.write("**New project**")
+        client = st.selectbox("Client", list(clients), format_func=clients.get)
+        name = st.text_input("Project name")
+        due_on = st.date_input("Due on", value=None)
+        if st.form_submit_button("Add project"):
+            try:
+                add_project(client, name, due_on)
+                st.success(f"Added {name.strip()}")
+            except ValueError as exc:
+                st.error(str(exc))
+
+    project_col, status_col, button_col = st.columns([2, 2, 1])
+    with project_col:
+        project_id = st.number_input("Project ID", min_value=1, step=1, key="project_edit_id")
+    with status_col:
+        new_status = st.selectbox("New status", PROJECT_STATUSES, key="project_edit_status")
+    with button_col:
+        if st.button("Update", key="project_edit_update"):
+            set_project_status(int(project_id), new_status)
+            st.rerun()
+
+def show_new_client():
+    with st.form("client_new", clear_on_submit=True):
+        name = st.text_input("Client name")
+        email = st.text_input("Billing email")
+        if st.form_submit_button("Add client"):
+            try:
+                add_client(name, email.strip())
+                st.success(f"Added {name.strip()}")
+            except ValueError as exc:
+                st.error(str(exc))
+
+def render(settings):
+    """Display the Invoice & Project Tracker section"""
+    st.title("Invoice & Project Tracker")
+    show_summary()
+
+    with session_scope() as session:
+        clients = dict(get_clients(session))
+
+    invoices_tab, new_tab, edit_tab, projects_tab, clients_tab = st.tabs(
+        ["Invoices", "New invoice", "Edit invoice", "Projects", "Clients"]
+    )
+    with invoices_tab:
+        show_invoices(clients)
+    with new_tab:
+        show_new_invoice(clients)
+    with edit_tab:
+        show_edit_invoice()
+    with projects_tab:
+        show_projects(clients)
+    with clients_tab:
+        show_new_client()
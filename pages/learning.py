@@ -0,0 +1,11 @@
+# pages/learning.py
+import streamlit as st
+
+def render(settings):
+    """Display the Learning Goals + Pomodoro section"""
+    st.title("Learning Goals + Pomodoro")
+    st.info("This module is under development. Check back soon!")
+
+    # Placeholder for learning tracker
+    st.subheader("Learning Goals")
+    st.write("Track your learning progress and use the Pomodoro timer.")
\ No newline at end of file
@@ -0,0 +1,74 @@
+# pages/reports.py
+import streamlit as st
+import pandas as pd
+
+from config import REPORT_POLL_SECONDS
+from utils.reports import REPORT_PERIODS, report_jobs
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def show_progress(job_id):
+    """Progress of a running job, refreshed without rerunning the page"""
+    status = report_jobs.status(job_id)
+    if status is None or status["state"] in ("done", "failed"):
+        st.rerun()
+    st.progress(
+        status["done"] / status["total"],
+        text=f"Generating {status['period']}... step {status['done']} of {status['total']} "
+             f"({status['seconds']:.0f} s)"
+    )
+
+def show_report(report, outputs):
+    """Download buttons and the sections of a finished report"""
+    st.subheader(report["title"])
+    st.caption(report["subtitle"])
+    file_name = f"{report['period'].lower().replace(' ', '_')}_{report['end']:%Y-%m-%d}"
+    html_col, pdf_col, csv_col = st.columns(3)
+    html_col.download_button("Download HTML", outputs["html"], f"{file_name}.html", "text/html")
+    pdf_col.download_button("Download PDF", outputs["pdf"], f"{file_name}.pdf", "application/pdf")
+    csv_col.download_button("Download CSV", outputs["csv"], f"{file_name}.csv", "text/csv")
+
+    for section in report["sections"]:
+        st.subheader(section["title"])
+        if section["metrics"]:
+            for col, (label, value) in zip(st.columns(len(section["metrics"])), section["metrics"]):
+                col.metric(label, "n/a" if value is None else (f"{value:,}" if isinstance(value, int) else value))
+        if section.get("note"):
+            st.info(section["note"])
+        for table in section["tables"]:
+            st.caption(table["title"])
+            frame = pd.DataFrame(table["rows"], columns=table["columns"])
+            if table.get("chart") and not frame.empty:
+                st.line_chart(frame.set_index(table["columns"][0]))
+            else:
+                st.dataframe(frame, hide_index=True)
+
+def render(settings):
+    """Display the Reports section"""
+    st.title("Reports")
+
+    st.subheader("Generate Reports")
+    report_type = st.selectbox("Select report type:", list(REPORT_PERIODS))
+    force = st.checkbox("Ignore cached report", help="Compute the report again even if it was generated recently")
+    if st.button("Generate Report"):
+        st.session_state.report_job = report_jobs.submit(report_type, st.session_state.get("username") or "", force=force)
+
+    job_id = st.session_state.get("report_job")
+    status = report_jobs.status(job_id) if job_id else None
+    if status is None:
+        st.caption("Reports cover complete days up to yesterday and are generated in the background.")
+        return
+    if status["state"] in ("queued", "running"):
+        show_progress(job_id)
+    elif status["state"] == "failed":
+        st.error(f"Could not generate the {status['period']}: {status['error']}")
+    else:
+        # The job may have been forgotten since its status was read
+        result = report_jobs.result(job_id)
+        if result is None:
+            st.info(f"The {status['period']} is no longer available; generate it again.")
+            return
+        if status["cached"]:
+            st.caption("Generated recently; showing the cached report.")
+        else:
+            st.caption(f"Generated in {status['seconds']:.1f} s.")
+        show_report(*result)
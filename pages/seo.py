@@ -0,0 +1,96 @@
+# pages/seo.py
+import asyncio
+
+import streamlit as st
+import pandas as pd
+
+from config import UPTIME_DEFAULT_INTERVAL, UPTIME_WINDOW_HOURS
+from utils.db_utils import session_scope
+from utils.uptime import HttpError, add_target, remove_target, analyze_seo, get_target_status, run_due_checks
+
+def show_uptime_targets():
+    """Monitored websites with their latest check and recent uptime"""
+    with st.form("uptime_add", clear_on_submit=True):
+        url = st.text_input("Website URL to monitor:", placeholder="https://example.com")
+        interval = st.number_input("Check every (seconds):", min_value=30, value=UPTIME_DEFAULT_INTERVAL, step=30)
+        if st.form_submit_button("Add website"):
+            try:
+                add_target(url.strip(), int(interval))
+                st.success(f"Monitoring {url.strip()}")
+            except ValueError as exc:
+                st.error(str(exc))
+
+    with session_scope() as session:
+        targets = get_target_status(session)
+    if not targets:
+        st.info("No websites are monitored yet.")
+        return
+
+    if st.button("Check all now"):
+        with st.spinner(f"Checking {len(targets):,} websites..."):
+            asyncio.run(run_due_checks(due_only=False))
+        st.rerun()
+    st.caption("Scheduled checks run in the background service: `python -m utils.uptime`")
+
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "URL": target["url"],
+                "Status": "Not checked" if target["ok"] is None else ("Up" if target["ok"] else "Down"),
+                "HTTP": target["status_code"],
+                "Response (ms)": None if target["response_ms"] is None else round(target["response_ms"]),
+                f"Uptime {UPTIME_WINDOW_HOURS}h (%)": None if target["uptime"] is None else round(target["uptime"], 2),
+                "Last check": target["checked_at"],
+                "Every (s)": target["interval_seconds"],
+                "Error": target["error"]
+            }
+            for target in targets
+        ]),
+        hide_index=True
+    )
+
+    remove_col, button_col = st.columns([3, 1])
+    with remove_col:
+        urls = {target["url"]: target["id"] for target in targets}
+        to_remove = st.selectbox("Stop monitoring:", list(urls), key="uptime_remove")
+    with button_col:
+        if st.button("Remove", key="uptime_remove_button"):
+            remove_target(urls[to_remove])
+            st.rerun()
+
+def show_seo_analysis():
+    url = st.text_input("Enter a website URL to check:", "https://example.com")
+    if not st.button("Analyze SEO"):
+        return
+    with st.spinner(f"Fetching {url}..."):
+        try:
+            report = asyncio.run(analyze_seo(url.strip()))
+        except asyncio.TimeoutError:
+            st.error("The website did not respond in time.")
+            return
+        except (OSError, EOFError, HttpError, ValueError) as exc:
+            st.error(f"Could not fetch {url}: {exc}")
+            return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("HTTP status", report["status_code"])
+    col2.metric("Response time", f"{report['response_ms']:,.0f} ms")
+    col3.metric("Issues found", len(report["issues"]))
+    st.write(f"**Final URL:** {report['url']}")
+    st.write(f"**Title:** {report['title'] or '(none)'}")
+    st.write(f"**Meta description:** {report['description'] or '(none)'}")
+    if report["issues"]:
+        for issue in report["issues"]:
+            st.warning(issue)
+    else:
+        st.success("No common on-page SEO issues found.")
+
+def render(settings):
+    """Display the SEO & Uptime Checker section"""
+    st.title("SEO & Uptime Checker")
+
+    st.subheader("Uptime Monitoring")
+    show_uptime_targets()
+
+    st.subheader("Check Website SEO")
+    show_seo_analysis()
@@ -0,0 +1,73 @@
+# pages/settings.py
+import streamlit as st
+import pandas as pd
+
+from config import ASSISTANT_PROVIDER, update_user_settings
+from utils.charts import chart_backend
+from utils.session_store import session_store
+
+def render(settings):
+    """Display the Settings section"""
+    st.title("Settings")
+
+    # Theme selection
+    theme = st.selectbox(
+        "Select theme:",
+        ["Dark", "Light"],
+        index=0 if settings["theme"] == "dark" else 1
+    )
+
+    # Chart rendering backend
+    chart_backends = {"Matplotlib (PNG)": "matplotlib", "Native (browser-rendered)": "native"}
+    current_backend = chart_backend(settings)
+    backend_label = st.selectbox(
+        "Chart rendering:",
+        list(chart_backends),
+        index=list(chart_backends.values()).index(current_backend)
+    )
+
+    # Module toggles
+    st.subheader("Enable/Disable Modules")
+    enabled_modules = {
+        module: st.toggle(f"Enable {module.replace('_', ' ').title()}", value=enabled)
+        for module, enabled in settings["enabled_modules"].items()
+    }
+
+    # OpenAI API key for AI assistant
+    st.subheader("API Keys")
+    api_key = st.text_input(
+        "OpenAI API Key", 
+        value=settings["openai_api_key"],
+        type="password"
+    )
+    assistant_providers = {"Automatic (OpenAI once a key is saved)": "auto", "OpenAI": "openai", "Offline stub": "stub"}
+    current_provider = settings.get("assistant_provider", ASSISTANT_PROVIDER)
+    assistant_provider = st.selectbox(
+        "AI Assistant provider:",
+        list(assistant_providers),
+        index=list(assistant_providers.values()).index(current_provider) if current_provider in assistant_providers.values() else 0
+    )
+
+    # Save button
+    if st.button("Save Settings"):
+        # Every session's context picks up the new settings on its next rerun
+        update_user_settings({
+            "theme": "dark" if theme == "Dark" else "light",
+            "openai_api_key": api_key,
+            "assistant_provider": assistant_providers[assistant_provider],
+            "chart_backend": chart_backends[backend_label],
+            "enabled_modules": enabled_modules
+        })
+        st.success("Settings saved successfully!")
+    
+    # Server-side session contexts of this process
+    st.subheader("Active Sessions")
+    stats = session_store.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Live sessions", stats["live_sessions"])
+    col2.metric("Session memory", f"{stats['memory_bytes'] / 1024 / 1024:.1f} MiB")
+    col3.metric("Evicted", stats["idle_evictions"] + stats["memory_evictions"])
+    st.dataframe(
+        pd.DataFrame(stats["sessions"], columns=["username", "idle_seconds", "age_seconds", "memory_bytes"]),
+        hide_index=True
+    )
\ No newline at end of file
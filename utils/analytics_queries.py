@@ -0,0 +1,259 @@
+# utils/analytics_queries.py
+import functools
+from datetime import datetime
+from sqlalchemy import func, distinct, select, union_all, literal, or_
+
+from config import ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL
+from utils.cache import TTLCache, freeze
+from utils.db_utils import PageVisit, VisitDetail, HourlyVisitRollup, DailyVisitRollup, RollupState
+from utils.dimensions import DIMENSIONS
+from utils.visit_sketches import merged_sketches
+
+# Label used for visits without a referrer
+DIRECT_REFERRER = "Direct"
+
+# Results of the data-access functions below, shared by all sessions
+_query_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+def get_data_version(session):
+    """Cheap probe that changes whenever visits are added or rolled up.
+
+    The result is remembered for the lifetime of the session, so one rerun
+    of the analytics page probes the database once.
+    """
+    if "analytics_data_version" not in session.info:
+        max_id = session.query(func.max(PageVisit.id)).scalar()
+        watermark = session.query(RollupState.last_visit_id).filter(RollupState.name == "page_visits").scalar()
+        session.info["analytics_data_version"] = (max_id, watermark)
+    return session.info["analytics_data_version"]
+
+def cached_query(func):
+    """Cache a data-access function by its arguments and the data version.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+    @functools.wraps(func)
+    def wrapper(session, *args, **kwargs):
+        key = (func.__name__, freeze(args), freeze(kwargs), get_data_version(session))
+        return _query_cache.get_or_compute(key, lambda: func(session, *args, **kwargs))
+    return wrapper
+
+def get_cache_stats():
+    """Hit/miss counters of the analytics query cache"""
+    return _query_cache.stats()
+
+def clear_cache():
+    _query_cache.clear()
+
+def referrer_label(column=VisitDetail.referrer):
+    """Referrer column with missing values reported as direct traffic"""
+    return func.coalesce(func.nullif(column, ""), DIRECT_REFERRER)
+
+def _dimension_ids(attribute, condition):
+    """Ids of an attribute's values matching condition.
+
+    Never correlated with the outer query, which may join the same table.
+    """
+    model = DIMENSIONS[attribute]
+    return select(model.id).where(condition(model.value)).correlate(None)
+
+def _value_id(attribute, value):
+    """Id of one attribute value as a scalar subquery, NULL if it is unknown"""
+    return _dimension_ids(attribute, lambda column: column == value).scalar_subquery()
+
+def apply_filters(query, filters=None, visits=PageVisit):
+    """Restrict a page_visits query to a site and/or time range.
+
+    ``filters`` is a dict with optional ``url`` and ``path`` values and
+    ``start`` (inclusive) / ``end`` (exclusive) datetimes. Raw visit queries
+    also accept ``path_prefix``, ``referrer`` (DIRECT_REFERRER matches visits
+    without one), ``device`` and ``location``; visit_counts ignores those.
+    Values are matched through their dimension ids, so ``visits`` can be
+    PageVisit or VisitDetail.
+    """
+    filters = filters or {}
+    for attribute in ("url", "path", "device", "location"):
+        if filters.get(attribute):
+            column = getattr(visits, f"{attribute}_id")
+            query = query.filter(column == _value_id(attribute, filters[attribute]))
+    if filters.get("path_prefix"):
+        prefix = filters["path_prefix"]
+        query = query.filter(visits.path_id.in_(
+            _dimension_ids("path", lambda column: column.startswith(prefix, autoescape=True))
+        ))
+    if filters.get("referrer") == DIRECT_REFERRER:
+        query = query.filter(or_(visits.referrer_id.is_(None), visits.referrer_id == _value_id("referrer", "")))
+    elif filters.get("referrer"):
+        query = query.filter(visits.referrer_id == _value_id("referrer", filters["referrer"]))
+    if filters.get("start") is not None:
+        query = query.filter(visits.timestamp >= filters["start"])
+    if filters.get("end") is not None:
+        query = query.filter(visits.timestamp < filters["end"])
+    return query
+
+def _filter_counts(query, time_column, url_column, path_column, filters):
+    """Apply the analytics filters to one part of the visit counts union"""
+    if filters.get("url"):
+        query = query.where(url_column == filters["url"])
+    if filters.get("path"):
+        query = query.where(path_column == filters["path"])
+    if filters.get("start") is not None:
+        query = query.where(time_column >= filters["start"])
+    if filters.get("end") is not None:
+        query = query.where(time_column < filters["end"])
+    return query
+
+def visit_counts(filters=None, now=None):
+    """Visit counts per day and visit attributes, as a subquery.
+
+    Completed days come from the daily rollup, completed hours of today from
+    the hourly rollup and only the current, unfinished hour from page_visits.
+    Rollups must be refreshed (utils.rollups.refresh_rollups) beforehand.
+    Time filters are applied at bucket granularity, so ``start`` and ``end``
+    should fall on day boundaries.
+
+    Columns: day, url, path, referrer, device, location, visits. Missing
+    referrer, device and location values are empty strings.
+    """
+    filters = filters or {}
+    now = now or datetime.now()
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    day_start = hour_start.replace(hour=0)
+
+    parts = []
+    for model, lower, upper in (
+        (DailyVisitRollup, None, day_start),
+        (HourlyVisitRollup, day_start, hour_start)
+    ):
+        query = select(
+            func.date(model.bucket).label("day"),
+            model.url,
+            model.path,
+            model.referrer,
+            model.device,
+            model.location,
+            model.visits
+        ).where(model.bucket < upper)
+        if lower is not None:
+            query = query.where(model.bucket >= lower)
+        parts.append(_filter_counts(query, model.bucket, model.url, model.path, filters))
+
+    keys = (
+        func.date(VisitDetail.timestamp).label("day"),
+        VisitDetail.url,
+        VisitDetail.path,
+        func.coalesce(VisitDetail.referrer, literal("")).label("referrer"),
+        func.coalesce(VisitDetail.device, literal("")).label("device"),
+        func.coalesce(VisitDetail.location, literal("")).label("location")
+    )
+    raw = (
+        select(*keys, func.count(VisitDetail.id).label("visits"))
+        .where(VisitDetail.timestamp >= hour_start)
+        .group_by(*keys)
+    )
+    parts.append(_filter_counts(raw, VisitDetail.timestamp, VisitDetail.url, VisitDetail.path, filters))
+
+    return union_all(*parts).subquery("visit_counts")
+
+def _counts_by(session, label, filters=None, limit=None):
+    """Visit counts grouped by a visit_counts column, most visited first.
+
+    ``label`` maps the visit_counts subquery to the grouping expression.
+    """
+    counts = visit_counts(filters)
+    column = label(counts)
+    visits = func.sum(counts.c.visits).label("visits")
+    query = (
+        select(column.label("value"), visits)
+        .group_by(column)
+        .order_by(visits.desc(), column)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [(value, count) for value, count in session.execute(query).all()]
+
+@cached_query
+def get_sites(session):
+    """All tracked site URLs, alphabetically"""
+    counts = visit_counts()
+    query = select(counts.c.url).distinct().order_by(counts.c.url)
+    return [url for url, in session.execute(query).all()]
+
+@cached_query
+def get_date_bounds(session, filters=None):
+    """Timestamps of the first and last visit, or (None, None) without data"""
+    from utils.archive import archive_bounds, has_archive
+
+    # Two queries, because SQLite answers a lone min() or max() from the
+    # index but scans it for both together
+    first = apply_filters(session.query(func.min(PageVisit.timestamp)), filters).scalar()
+    last = apply_filters(session.query(func.max(PageVisit.timestamp)), filters).scalar()
+    if has_archive(session):
+        archived_first, archived_last = archive_bounds(session, filters)
+        first = min((value for value in (first, archived_first) if value is not None), default=None)
+        last = max((value for value in (last, archived_last) if value is not None), default=None)
+    return first, last
+
+@cached_query
+def get_key_metrics(session, filters=None):
+    """Compute the headline numbers shown at the top of the analytics page.
+
+    Unique visitors and the top path and referrer are estimated from the
+    per-day sketches (utils/visit_sketches.py). Sketches are not kept per
+    path, so with a path filter the top values are counted exactly and
+    unique visitors are None.
+    """
+    counts = visit_counts(filters)
+    total_visits, unique_urls = session.execute(
+        select(func.sum(counts.c.visits), func.count(distinct(counts.c.url)))
+    ).one()
+
+    if (filters or {}).get("path"):
+        unique_visitors = None
+        top_paths = _counts_by(session, lambda c: c.c.path, filters, limit=1)
+        top_referrers = _counts_by(session, lambda c: referrer_label(c.c.referrer), filters, limit=1)
+    else:
+        sketches = merged_sketches(session, filters)
+        # The estimate can be off by a little; never report more visitors than visits
+        unique_visitors = min(sketches.visitors.count(), sketches.visits)
+        top_paths = sketches.paths.top(1)
+        top_referrers = sketches.referrers.top(1)
+
+    return {
+        "total_visits": total_visits or 0,
+        "unique_urls": unique_urls,
+        "unique_visitors": unique_visitors,
+        "top_path": top_paths[0][0] if top_paths else None,
+        "top_referrer": top_referrers[0][0] if top_referrers else None
+    }
+
+@cached_query
+def get_visits_per_day(session, filters=None):
+    """Number of visits per calendar day as (YYYY-MM-DD, visits) pairs"""
+    counts = visit_counts(filters)
+    query = (
+        select(counts.c.day, func.sum(counts.c.visits))
+        .group_by(counts.c.day)
+        .order_by(counts.c.day)
+    )
+    return [(date, count) for date, count in session.execute(query).all()]
+
+@cached_query
+def get_referrer_counts(session, filters=None, limit=None):
+    """Visits per referrer, with missing referrers counted as direct traffic"""
+    return _counts_by(session, lambda c: referrer_label(c.c.referrer), filters, limit=limit)
+
+@cached_query
+def get_device_counts(session, filters=None, limit=None):
+    """Visits per device type"""
+    return _counts_by(session, lambda c: func.nullif(c.c.device, ""), filters, limit=limit)
+
+@cached_query
+def get_page_counts(session, filters=None, limit=None):
+    """Visits per page path"""
+    return _counts_by(session, lambda c: c.c.path, filters, limit=limit)
+
+@cached_query
+def get_location_counts(session, filters=None, limit=None):
+    """Visits per location"""
+    return _counts_by(session, lambda c: func.nullif(c.c.location, ""), filters, limit=limit)
@@ -0,0 +1,355 @@
+# utils/archive.py
+"""
+Columnar Parquet archive of old page visits.
+
+archive_visits() moves visits older than ARCHIVE_AFTER_DAYS out of the
+page_visits table into zstd-compressed Parquet files, one directory per day:
+
+    data/archive/page_visits/day=2024-05-01/part-<uuid>.parquet
+
+url, path, referrer, device, location and user_agent are dictionary encoded.
+A file is registered in page_visit_archive_files in the same transaction
+that deletes its visits from page_visits, so every visit is in exactly one
+place. Files left behind by an interrupted run are not in that manifest,
+are never read and are removed by the next run.
+
+Visit counts come from the rollups, which keep counting archived visits.
+Readers of raw visits (the visit explorer, date bounds, rollup rebuilds)
+combine page_visits with the functions below, which only open the day
+partitions a query can match.
+
+    python -m utils.archive            # archive visits older than ARCHIVE_AFTER_DAYS
+    python -m utils.archive --days 30
+
+delete_archive() removes every archived visit, for a reset of the data.
+"""
+import argparse
+import time as timer
+import uuid
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from sqlalchemy import select, insert, delete, func
+
+from config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_ROWS, EXPLORER_PAGE_SIZE
+from utils.db_utils import PageVisit, VisitDetail, ArchivedVisitFile, init_db
+from utils.json_store import file_lock
+from utils.rollups import refresh_rollups, get_watermark
+
+# Archived page_visits columns, in file order
+COLUMNS = ["id", "url", "path", "referrer", "ip_address", "location", "device", "user_agent", "timestamp"]
+DICTIONARY_COLUMNS = ["url", "path", "referrer", "location", "device", "user_agent"]
+
+# Sort option of utils.visit_explorer -> key columns, as in its SORT_KEYS
+SORT_KEYS = {
+    "timestamp": ("timestamp", "id"),
+    "url": ("url", "timestamp", "id"),
+    "path": ("path", "timestamp", "id")
+}
+
+# Rollup table -> timestamp unit of its buckets
+ROLLUP_UNITS = {
+    "page_visit_rollups_hourly": "hour",
+    "page_visit_rollups_daily": "day"
+}
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("url", pa.string()),
+        ("path", pa.string()),
+        ("referrer", pa.string()),
+        ("ip_address", pa.string()),
+        ("location", pa.string()),
+        ("device", pa.string()),
+        ("user_agent", pa.string()),
+        ("timestamp", pa.timestamp("us"))
+    ])
+
+def _write_day(table, day):
+    """Write one day of visits to a new file. Returns its manifest row."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    relative = f"day={day}/part-{uuid.uuid4().hex}.parquet"
+    path = ARCHIVE_DIR / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp_path, compression="zstd", use_dictionary=DICTIONARY_COLUMNS)
+    tmp_path.replace(path)
+    ids = pc.min_max(table["id"])
+    timestamps = pc.min_max(table["timestamp"])
+    return {
+        "path": relative,
+        "day": day,
+        "rows": table.num_rows,
+        "min_visit_id": ids["min"].as_py(),
+        "max_visit_id": ids["max"].as_py(),
+        "min_timestamp": timestamps["min"].as_py(),
+        "max_timestamp": timestamps["max"].as_py(),
+        "created_at": datetime.now()
+    }
+
+def _remove_orphans(engine):
+    """Delete files of interrupted runs, which the manifest never registered"""
+    with engine.connect() as conn:
+        registered = set(conn.execute(select(ArchivedVisitFile.path)).scalars())
+    for path in list(ARCHIVE_DIR.glob("day=*/*")):
+        if path.relative_to(ARCHIVE_DIR).as_posix() not in registered:
+            path.unlink()
+
+def archive_visits(older_than_days=ARCHIVE_AFTER_DAYS, engine=None, chunk_rows=ARCHIVE_CHUNK_ROWS, now=None):
+    """Move visits from before midnight ``older_than_days`` days ago to Parquet.
+
+    Returns a dict with the visits moved, files written, their total size
+    and the cutoff.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    engine = engine or init_db()
+    now = now or datetime.now()
+    cutoff = datetime.combine(now.date() - timedelta(days=older_than_days), time.min)
+    schema = _schema()
+    result = {"rows": 0, "files": 0, "bytes": 0, "cutoff": cutoff}
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    with file_lock(ARCHIVE_DIR / ".lock"):
+        _remove_orphans(engine)
+        # Only visits already folded into the rollups are moved. The newest
+        # visit always stays, because SQLite reuses the ids of deleted rows
+        # at the end of the table, and those would fall below the watermark.
+        refresh_rollups(engine)
+        with engine.connect() as conn:
+            max_id = conn.execute(select(func.max(PageVisit.id))).scalar() or 0
+            last_id = min(get_watermark(conn), max_id - 1)
+
+        columns = [getattr(VisitDetail, column) for column in COLUMNS]
+        low = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(*columns)
+                    .where(VisitDetail.id > low, VisitDetail.id <= last_id, VisitDetail.timestamp < cutoff)
+                    .order_by(VisitDetail.id)
+                    .limit(chunk_rows)
+                ).all()
+            if not rows:
+                break
+            high = rows[-1].id
+
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            ).sort_by("timestamp")
+            files = []
+            offset = 0
+            days = pc.value_counts(pc.strftime(table["timestamp"], format="%Y-%m-%d"))
+            for day, count in zip(days.field("values").to_pylist(), days.field("counts").to_pylist()):
+                files.append(_write_day(table.slice(offset, count), day))
+                offset += count
+
+            with engine.begin() as conn:
+                conn.execute(insert(ArchivedVisitFile), files)
+                conn.execute(
+                    delete(PageVisit)
+                    .where(PageVisit.id > low, PageVisit.id <= high, PageVisit.timestamp < cutoff)
+                )
+            result["rows"] += len(rows)
+            result["files"] += len(files)
+            result["bytes"] += sum((ARCHIVE_DIR / file["path"]).stat().st_size for file in files)
+            low = high
+    return result
+
+def delete_archive(engine=None):
+    """Remove every archived visit: the manifest first, then the files it listed"""
+    engine = engine or init_db()
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    with file_lock(ARCHIVE_DIR / ".lock"):
+        with engine.begin() as conn:
+            conn.execute(delete(ArchivedVisitFile))
+        # Unregistered now, so the same cleanup as after an interrupted run
+        _remove_orphans(engine)
+        for directory in list(ARCHIVE_DIR.glob("day=*")):
+            if not any(directory.iterdir()):
+                directory.rmdir()
+
+def has_archive(conn):
+    """True if any visits have been archived"""
+    return conn.execute(select(ArchivedVisitFile.id).limit(1)).first() is not None
+
+def _archive_files(conn, filters=None, first_day=None, last_day=None):
+    """Manifest rows of the files that can hold visits matching the filters"""
+    filters = filters or {}
+    query = select(ArchivedVisitFile.path, ArchivedVisitFile.day).order_by(ArchivedVisitFile.day)
+    if filters.get("start") is not None:
+        query = query.where(ArchivedVisitFile.day >= filters["start"].date().isoformat())
+    if filters.get("end") is not None:
+        # end is exclusive
+        query = query.where(ArchivedVisitFile.day <= (filters["end"] - timedelta(microseconds=1)).date().isoformat())
+    if first_day is not None:
+        query = query.where(ArchivedVisitFile.day >= first_day)
+    if last_day is not None:
+        query = query.where(ArchivedVisitFile.day <= last_day)
+    return conn.execute(query).all()
+
+def _timestamp(value):
+    import pyarrow as pa
+    return pa.scalar(value, pa.timestamp("us"))
+
+def _filter_expression(filters):
+    """pyarrow.dataset expression matching utils.analytics_queries.apply_filters"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    from utils.analytics_queries import DIRECT_REFERRER
+
+    filters = filters or {}
+    conditions = []
+    for key in ("url", "path", "device", "location"):
+        if filters.get(key):
+            conditions.append(ds.field(key) == filters[key])
+    if filters.get("path_prefix"):
+        conditions.append(pc.starts_with(ds.field("path"), pattern=filters["path_prefix"]))
+    if filters.get("referrer") == DIRECT_REFERRER:
+        conditions.append(ds.field("referrer").is_null() | (ds.field("referrer") == ""))
+    elif filters.get("referrer"):
+        conditions.append(ds.field("referrer") == filters["referrer"])
+    if filters.get("start") is not None:
+        conditions.append(ds.field("timestamp") >= _timestamp(filters["start"]))
+    if filters.get("end") is not None:
+        conditions.append(ds.field("timestamp") < _timestamp(filters["end"]))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _after_expression(key, after, descending):
+    """Rows whose key comes after the cursor: (a, b) < (x, y) is a < x or (a == x and b < y)"""
+    import pyarrow.dataset as ds
+
+    column, value = key[0], after[0]
+    if column == "timestamp":
+        value = _timestamp(value)
+    field = ds.field(column)
+    first = field < value if descending else field > value
+    if len(key) == 1:
+        return first
+    return first | ((field == value) & _after_expression(key[1:], after[1:], descending))
+
+def _read(files, expression=None, columns=None):
+    """Rows of the given archive files matching an expression, as a pyarrow Table"""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset([str(ARCHIVE_DIR / file.path) for file in files], schema=_schema(), format="parquet")
+    return dataset.to_table(columns=columns, filter=expression)
+
+def fetch_archived_page(conn, filters=None, sort="timestamp", descending=True, after=None,
+                        limit=EXPLORER_PAGE_SIZE, until=None):
+    """Up to ``limit`` archived visits, ordered and continued like utils.visit_explorer.fetch_page.
+
+    Only rows between the cursors ``after`` and ``until`` (both exclusive,
+    either may be None) are returned. Rows are tuples in
+    utils.visit_explorer.COLUMNS order.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from utils.analytics_queries import DIRECT_REFERRER
+
+    key = SORT_KEYS[sort]
+    first_day = last_day = None
+    if sort == "timestamp":
+        newest, oldest = (after, until) if descending else (until, after)
+        last_day = newest[0].date().isoformat() if newest is not None else None
+        first_day = oldest[0].date().isoformat() if oldest is not None else None
+    files = _archive_files(conn, filters, first_day, last_day)
+    if not files:
+        return []
+
+    conditions = [_filter_expression(filters)]
+    if after is not None:
+        conditions.append(_after_expression(key, after, descending))
+    if until is not None:
+        conditions.append(_after_expression(key, until, not descending))
+    expression = None
+    for condition in conditions:
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    columns = ["id", "url", "path", "referrer", "device", "location", "timestamp"]
+    if sort == "timestamp":
+        # Days do not overlap, so whole days are read in sort order until
+        # they hold enough rows
+        tables = []
+        found = 0
+        for _, day_files in groupby(reversed(files) if descending else files, key=lambda file: file.day):
+            tables.append(_read(list(day_files), expression, columns))
+            found += tables[-1].num_rows
+            if found >= limit:
+                break
+        table = pa.concat_tables(tables)
+    else:
+        table = _read(files, expression, columns)
+    if table.num_rows == 0:
+        return []
+
+    order = "descending" if descending else "ascending"
+    sort_keys = [(column, order) for column in key]
+    # Keys are unique, so the first rows can be picked without sorting them all
+    table = table.take(pc.select_k_unstable(table, min(limit, table.num_rows), sort_keys)).sort_by(sort_keys)
+    referrer = pc.fill_null(table["referrer"], "")
+    table = table.set_column(3, "referrer", pc.if_else(pc.equal(referrer, ""), DIRECT_REFERRER, referrer))
+    return list(zip(*(table[column].to_pylist() for column in columns)))
+
+def archive_bounds(conn, filters=None):
+    """Timestamps of the first and last archived visit matching the filters"""
+    import pyarrow.compute as pc
+
+    if not any(value is not None and value != "" for value in (filters or {}).values()):
+        return conn.execute(
+            select(func.min(ArchivedVisitFile.min_timestamp), func.max(ArchivedVisitFile.max_timestamp))
+        ).one()
+    files = _archive_files(conn, filters)
+    if not files:
+        return None, None
+    bounds = pc.min_max(_read(files, _filter_expression(filters), ["timestamp"])["timestamp"])
+    return bounds["min"].as_py(), bounds["max"].as_py()
+
+def iter_rollup_counts(conn, rollup_table):
+    """Archived visit counts per bucket of a rollup table, one file at a time.
+
+    Yields lists of dicts with the rollup columns. The same bucket can be
+    yielded once per file.
+    """
+    import pyarrow.compute as pc
+
+    unit = ROLLUP_UNITS[rollup_table]
+    keys = ["bucket", "url", "path", "referrer", "device", "location"]
+    for file in _archive_files(conn):
+        table = _read([file], columns=keys[1:] + ["timestamp"])
+        # Same text as the strftime() formats of utils.rollups.ROLLUP_TABLES
+        bucket = pc.strftime(pc.floor_temporal(table["timestamp"], unit=unit), format="%Y-%m-%d %H:%M:%S")
+        table = table.drop_columns(["timestamp"]).append_column("bucket", bucket)
+        for column in ("referrer", "device", "location"):
+            table = table.set_column(table.schema.get_field_index(column), column, pc.fill_null(table[column], ""))
+        counts = table.group_by(keys).aggregate([([], "count_all")])
+        yield [
+            {**{key: row[key] for key in keys}, "visits": row["count_all"]}
+            for row in counts.to_pylist()
+        ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.archive", description="Move old page visits to Parquet.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archive visits older than this many days (default: {ARCHIVE_AFTER_DAYS})")
+    args = parser.parse_args(argv)
+
+    start = timer.perf_counter()
+    result = archive_visits(args.days)
+    elapsed = timer.perf_counter() - start
+    print(
+        f"Archived {result['rows']:,} visits from before {result['cutoff']:%Y-%m-%d} "
+        f"into {result['files']:,} files ({result['bytes'] / 1024 / 1024:.1f} MiB) in {elapsed:.1f} s."
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+# utils/assistant.py
+"""
+Backend of the AI Assistant section.
+
+Questions are answered by a provider, looked up by name in PROVIDERS:
+- "stub": answers offline from the context alone, word by word
+- "openai": the Chat Completions API, streamed, with the key saved on the
+  Settings page
+
+With the "auto" setting the OpenAI provider is used once a key is saved.
+Other providers are added with register_provider(); they only need a
+``stream(prompt, context)`` method yielding text chunks.
+
+The model never sees raw visits. Its context is a short text summary of
+the daily rollups of the last ASSISTANT_CONTEXT_DAYS complete days and of
+the invoice totals (build_context), so it only changes when a day ends
+or an invoice changes, and answers can be reused. Answers are cached in the assistant_responses
+table by provider, normalized prompt and context hash; once the cache
+holds more than ASSISTANT_CACHE_MAX_BYTES, the least recently used
+answers are evicted. Time to first token is recorded as an "assistant"
+timing for the Diagnostics page:
+
+    reply = ask("Which page gets the most visits?", context, provider)
+    for chunk in reply:
+        ...
+    reply.cached, reply.first_token_seconds, reply.text
+
+    python -m utils.assistant "Which page gets the most visits?"
+    python -m utils.assistant --stats
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+
+from config import (
+    ASSISTANT_PROVIDER,
+    ASSISTANT_OPENAI_URL,
+    ASSISTANT_OPENAI_MODEL,
+    ASSISTANT_TIMEOUT,
+    ASSISTANT_STUB_TOKEN_SECONDS,
+    ASSISTANT_CONTEXT_DAYS,
+    ASSISTANT_CONTEXT_TOP,
+    ASSISTANT_CACHE_MAX_BYTES
+)
+from utils.db_utils import init_db, AssistantResponse
+from utils.instrumentation import timings
+
+SYSTEM_PROMPT = (
+    "You are CodRon Bot, the assistant of a freelancer's dashboard. Answer briefly, "
+    "using only the dashboard summary below. Say so when it does not cover the question."
+)
+
+class AssistantError(Exception):
+    """Raised when a provider is not configured or its request fails"""
+
+# Providers
+
+class StubProvider:
+    """Offline provider that quotes the context lines sharing words with the prompt"""
+
+    name = "stub"
+
+    def __init__(self, token_seconds=ASSISTANT_STUB_TOKEN_SECONDS):
+        self.token_seconds = token_seconds
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    def answer(self, prompt, context):
+        words = {word for word in re.findall(r"\w+", prompt.casefold()) if len(word) > 3}
+        lines = [line for line in context.splitlines() if line.startswith("- ")]
+        matching = [line for line in lines if words & set(re.findall(r"\w+", line.casefold()))]
+        if not matching:
+            return "I can only answer from the dashboard summary. Here is what it shows:\n\n" + "\n".join(lines)
+        return "From the dashboard summary:\n\n" + "\n".join(matching)
+
+    def stream(self, prompt, context):
+        for word in re.findall(r"\S+\s*", self.answer(prompt, context)):
+            if self.token_seconds:
+                time.sleep(self.token_seconds)
+            yield word
+
+class OpenAIProvider:
+    """The OpenAI Chat Completions API, read as server-sent events"""
+
+    name = "openai"
+
+    def __init__(self, api_key, model=ASSISTANT_OPENAI_MODEL, url=ASSISTANT_OPENAI_URL, timeout=ASSISTANT_TIMEOUT):
+        self.api_key = api_key
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls, settings):
+        if not settings.get("openai_api_key"):
+            raise AssistantError("Save an OpenAI API key on the Settings page to use the OpenAI provider.")
+        return cls(settings["openai_api_key"])
+
+    def stream(self, prompt, context):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({
+                "model": self.model,
+                "stream": True,
+                "messages": [
+                    {"role": "system", "content": f"{SYSTEM_PROMPT}\n\n{context}"},
+                    {"role": "user", "content": prompt}
+                ]
+            }).encode(),
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                for line in response:
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    for choice in json.loads(data).get("choices", []):
+                        content = choice.get("delta", {}).get("content")
+                        if content:
+                            yield content
+        except urllib.error.HTTPError as exc:
+            raise AssistantError(f"The OpenAI request failed: {exc.code} {exc.reason}") from exc
+        except (urllib.error.URLError, TimeoutError) as exc:
+            raise AssistantError(f"Could not reach the OpenAI API: {getattr(exc, 'reason', exc)}") from exc
+        except ValueError as exc:
+            # json.JSONDecodeError included: a malformed server-sent event
+            raise AssistantError(f"The OpenAI API sent a malformed response: {exc}") from exc
+
+    @property
+    def cache_name(self):
+        # Answers of one model are not reused for another
+        return f"{self.name}:{self.model}"
+
+PROVIDERS = {"stub": StubProvider, "openai": OpenAIProvider}
+
+def register_provider(name, provider_class):
+    """Make a provider selectable by name; ``provider_class.from_settings(settings)`` creates it"""
+    PROVIDERS[name] = provider_class
+
+def provider_name(settings):
+    name = settings.get("assistant_provider") or ASSISTANT_PROVIDER
+    if name == "auto":
+        return "openai" if settings.get("openai_api_key") else "stub"
+    return name
+
+def get_provider(settings):
+    """The provider chosen in the user's settings"""
+    name = provider_name(settings)
+    if name not in PROVIDERS:
+        raise AssistantError(f"Unknown assistant provider: {name}")
+    return PROVIDERS[name].from_settings(settings)
+
+# Context
+
+def _top(counts):
+    return ", ".join(f"{value or 'unknown'} ({visits:,})" for value, visits in counts) or "none"
+
+def build_context(session, today=None):
+    """Text summary of the analytics of the last ASSISTANT_CONTEXT_DAYS complete
+    days and of the invoice totals, for the model.
+
+    Visits come from the daily rollups and sketches only, so the rollups
+    should be refreshed beforehand, as for the analytics page.
+    """
+    from utils.analytics_queries import (
+        get_key_metrics,
+        get_visits_per_day,
+        get_page_counts,
+        get_referrer_counts,
+        get_device_counts,
+        get_location_counts
+    )
+    from utils.invoices import format_money, get_invoice_summary
+
+    today = today or date.today()
+    first = today - timedelta(days=ASSISTANT_CONTEXT_DAYS)
+    # Whole days before today only, so the visit figures change once a day
+    filters = {"start": datetime.combine(first, datetime.min.time()), "end": datetime.combine(today, datetime.min.time())}
+    metrics = get_key_metrics(session, filters)
+    per_day = get_visits_per_day(session, filters)
+    lines = [f"Website analytics from {first} to {today - timedelta(days=1)}:"]
+    if per_day:
+        busiest = max(per_day, key=lambda day: day[1])
+        quietest = min(per_day, key=lambda day: day[1])
+        lines += [
+            f"- Total visits: {metrics['total_visits']:,} on {metrics['unique_urls']:,} sites, "
+            f"about {metrics['unique_visitors']:,} unique visitors",
+            f"- Average visits per day: {metrics['total_visits'] / ASSISTANT_CONTEXT_DAYS:,.0f}; "
+            f"busiest day {busiest[0]} ({busiest[1]:,}), quietest day {quietest[0]} ({quietest[1]:,})",
+            f"- Top pages: {_top(get_page_counts(session, filters, limit=ASSISTANT_CONTEXT_TOP))}",
+            f"- Top referrers: {_top(get_referrer_counts(session, filters, limit=ASSISTANT_CONTEXT_TOP))}",
+            f"- Devices: {_top(get_device_counts(session, filters, limit=ASSISTANT_CONTEXT_TOP))}",
+            f"- Locations: {_top(get_location_counts(session, filters, limit=ASSISTANT_CONTEXT_TOP))}"
+        ]
+    else:
+        lines.append("- No visits recorded")
+
+    invoices = get_invoice_summary(session, today)
+    lines += [
+        f"Invoices as of {today}:",
+        f"- Outstanding invoices: {invoices['outstanding']:,}, totalling {format_money(invoices['outstanding_cents'])}",
+        f"- Overdue invoices: {invoices['overdue']:,}, totalling {format_money(invoices['overdue_cents'])}",
+        f"- Invoices due this week: {invoices['due_this_week']:,}, totalling {format_money(invoices['due_this_week_cents'])}",
+        f"- Draft invoices: {invoices['drafts']:,}; active projects: {invoices['active_projects']:,}"
+    ]
+    return "\n".join(lines)
+
+# Response cache
+
+def normalize_prompt(prompt):
+    """The prompt without differences in case, spacing and trailing punctuation"""
+    prompt = unicodedata.normalize("NFKC", prompt).casefold()
+    return " ".join(prompt.split()).rstrip(" ?!.")
+
+def _cache_name(provider):
+    return getattr(provider, "cache_name", provider.name)
+
+def cache_key(provider, prompt, context):
+    context_hash = hashlib.sha256(context.encode()).hexdigest()
+    return hashlib.sha256(f"{_cache_name(provider)}\0{normalize_prompt(prompt)}\0{context_hash}".encode()).hexdigest()
+
+class ResponseCache:
+    """Answers stored in assistant_responses, shared by all processes.
+
+    Once the answers take more than ``max_bytes``, the least recently used
+    ones are evicted. Hit and miss counters are kept for this process.
+    """
+
+    def __init__(self, engine=None, max_bytes=ASSISTANT_CACHE_MAX_BYTES):
+        self._engine = engine
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = init_db()
+        return self._engine
+
+    def get(self, key):
+        """The cached answer for key, or None; a hit marks it recently used"""
+        with self.engine.begin() as conn:
+            response = conn.execute(
+                update(AssistantResponse)
+                .where(AssistantResponse.key == key)
+                .values(hits=AssistantResponse.hits + 1, last_used_at=datetime.now())
+                .returning(AssistantResponse.response)
+            ).scalar()
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, key, provider, prompt, response):
+        size = len(response.encode())
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            conn.execute(insert(AssistantResponse).prefix_with("OR REPLACE"), {
+                "key": key,
+                "provider": provider,
+                "prompt": normalize_prompt(prompt),
+                "response": response,
+                "size_bytes": size,
+                "hits": 0,
+                "created_at": now,
+                "last_used_at": now
+            })
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute(select(func.coalesce(func.sum(AssistantResponse.size_bytes), 0))).scalar()
+        if total <= self.max_bytes:
+            return
+        keys = []
+        for key, size in conn.execute(
+            select(AssistantResponse.key, AssistantResponse.size_bytes).order_by(AssistantResponse.last_used_at)
+        ):
+            if total <= self.max_bytes:
+                break
+            keys.append(key)
+            total -= size
+        conn.execute(delete(AssistantResponse).where(AssistantResponse.key.in_(keys)))
+        with self._lock:
+            self.evictions += len(keys)
+
+    def clear(self):
+        with self.engine.begin() as conn:
+            conn.execute(delete(AssistantResponse))
+
+    def stats(self):
+        """Stored answers and their size, and this process' counters, as a dict"""
+        with self.engine.connect() as conn:
+            entries, size = conn.execute(
+                select(func.count(), func.coalesce(func.sum(AssistantResponse.size_bytes), 0))
+            ).one()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+# Shared by all sessions of the process
+response_cache = ResponseCache()
+
+class Reply:
+    """One answer, from the cache or streamed from the provider.
+
+    Iterate over it once for its text chunks. Afterwards ``cached`` tells
+    where it came from, ``first_token_seconds`` how long the first chunk
+    took (None if the provider sent no text) and ``text`` holds the whole
+    answer. Interrupted answers are not
+    cached.
+    """
+
+    def __init__(self, prompt, context, provider, cache):
+        self.prompt = prompt
+        self.context = context
+        self.provider = provider
+        self.cache = cache
+        self.cached = None
+        self.first_token_seconds = None
+        self.text = None
+
+    def _first_token(self, start):
+        self.first_token_seconds = time.perf_counter() - start
+        timings.record("assistant", "first token", self.first_token_seconds, "cached" if self.cached else self.provider.name)
+
+    def __iter__(self):
+        start = time.perf_counter()
+        key = cache_key(self.provider, self.prompt, self.context)
+        self.text = self.cache.get(key)
+        self.cached = self.text is not None
+        if self.cached:
+            self._first_token(start)
+            yield self.text
+            return
+
+        chunks = []
+        for chunk in self.provider.stream(self.prompt, self.context):
+            if not chunks:
+                self._first_token(start)
+            chunks.append(chunk)
+            yield chunk
+        timings.record("assistant", "answer", time.perf_counter() - start, self.provider.name)
+        self.text = "".join(chunks)
+        if self.text:
+            self.cache.set(key, _cache_name(self.provider), self.prompt, self.text)
+
+def describe_reply(reply):
+    """Where an answer came from and how long it took to start, for display"""
+    if reply.cached:
+        return "From the response cache"
+    if reply.first_token_seconds is None:
+        return "No answer"
+    return f"First token after {reply.first_token_seconds * 1000:,.0f} ms"
+
+def ask(prompt, context, provider, cache=None):
+    """Reply to prompt given the context text; see Reply"""
+    return Reply(prompt, context, provider, cache or response_cache)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.assistant", description="Ask the AI Assistant a question.")
+    parser.add_argument("question", nargs="?")
+    parser.add_argument("--provider", help=f"one of {', '.join(PROVIDERS)} (default: from the saved settings)")
+    parser.add_argument("--stats", action="store_true", help="show the response cache size")
+    parser.add_argument("--clear", action="store_true", help="empty the response cache")
+    args = parser.parse_args(argv)
+
+    if args.clear:
+        response_cache.clear()
+        print("Emptied the response cache.")
+    if args.stats:
+        stats = response_cache.stats()
+        print(f"{stats['entries']:,} cached answers, {stats['bytes'] / 1024:,.0f} of {stats['max_bytes'] / 1024:,.0f} KiB")
+    if not args.question:
+        if not (args.clear or args.stats):
+            parser.error("ask a question, or use --stats or --clear")
+        return
+
+    from config import load_user_settings
+    from utils.db_utils import session_scope
+    from utils.rollups import refresh_rollups
+
+    settings = load_user_settings()
+    if args.provider:
+        settings["assistant_provider"] = args.provider
+    try:
+        provider = get_provider(settings)
+        refresh_rollups()
+        with session_scope() as session:
+            context = build_context(session)
+        reply = ask(args.question, context, provider)
+        for chunk in reply:
+            print(chunk, end="", flush=True)
+    except AssistantError as exc:
+        raise SystemExit(str(exc))
+    print(f"\n\n({describe_reply(reply)})")
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,146 @@
 # utils/auth_utils.py
 import streamlit as st
-import bcrypt
-import json
+import hashlib
+import hmac
 import os
-import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Add parent directory to path to import config
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATA_DIR
+from config import (
+    DATA_DIR,
+    BCRYPT_ROUNDS,
+    AUTH_VERIFY_WORKERS,
+    AUTH_VERIFY_CACHE_SIZE,
+    AUTH_VERIFY_CACHE_TTL
+)
+from utils.cache import TTLCache
+from utils.instrumentation import timed
+from utils.json_store import JsonStore
+from utils.session_store import start_session, end_session
 
 # Path to store user credentials
 USERS_DB_PATH = DATA_DIR / "users.json"
 
+_users_store = JsonStore(USERS_DB_PATH, default=lambda: {"users": []})
+
+# Users by username, rebuilt whenever the store loads a new users.json
+_user_index = {}
+_user_index_source = None
+_user_index_lock = threading.Lock()
+
+# bcrypt checks run on this pool instead of the calling script thread, so
+# the number of CPU-bound checks in flight is bounded however many
+# sessions log in at once. bcrypt releases the GIL, so up to
+# AUTH_VERIFY_WORKERS checks run at the same time. Created on first use.
+_verify_pool = None
+_verify_pool_lock = threading.Lock()
+
+# Successful logins by a keyed digest of (username, stored hash, password).
+# The key is random per process, so the digests are useless outside it.
+_verified_logins = TTLCache(maxsize=AUTH_VERIFY_CACHE_SIZE, ttl=AUTH_VERIFY_CACHE_TTL)
+_verify_cache_key = os.urandom(32)
+
+# Hash checked for unknown usernames so that they take as long to reject
+# as a wrong password
+_dummy_hash = None
+
 def create_users_db_if_not_exists():
     """Create users database if it doesn't exist"""
-    if not USERS_DB_PATH.exists():
-        # Create default admin user
-        default_password = "admin123"
-        password_bytes = default_password.encode("utf-8")
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password_bytes, salt).decode("utf-8")
-        
-        default_admin = {
-            "username": "admin",
-            "password_hash": hashed_password,
-            "email": "admin@example.com"
-        }
+    if not _users_store.exists():
+        def add_default_admin(data):
+            # Another session may have created the file in the meantime
+            if data["users"]:
+                return
+            
+            # Create default admin user
+            default_admin = {
+                "username": "admin",
+                "password_hash": _hash_password("admin123"),
+                "email": "admin@example.com"
+            }
+            data["users"].append(default_admin)
         
-        with open(USERS_DB_PATH, "w") as f:
-            json.dump({"users": [default_admin]}, f)
+        _users_store.update(add_default_admin)
 
 def load_users():
     """Load users from the JSON database"""
     create_users_db_if_not_exists()
-    with open(USERS_DB_PATH, "r") as f:
-        return json.load(f)["users"]
+    return _users_store.read()["users"]
 
 def save_users(users):
     """Save users to the JSON database"""
-    with open(USERS_DB_PATH, "w") as f:
-        json.dump({"users": users}, f)
+    _users_store.write({"users": users})
+
+def get_user(username):
+    """Look up a user by username, or None. The result must not be modified."""
+    global _user_index, _user_index_source
+    create_users_db_if_not_exists()
+    # The store returns the same object until users.json changes
+    data = _users_store.read(copy_result=False)
+    with _user_index_lock:
+        if data is not _user_index_source:
+            index = {}
+            for user in data["users"]:
+                # The first entry wins, as with the old linear scan
+                index.setdefault(user["username"], user)
+            _user_index = index
+            _user_index_source = data
+        return _user_index.get(username)
 
+def _get_verify_pool():
+    global _verify_pool
+    if _verify_pool is None:
+        with _verify_pool_lock:
+            if _verify_pool is None:
+                _verify_pool = ThreadPoolExecutor(max_workers=AUTH_VERIFY_WORKERS, thread_name_prefix="bcrypt")
+    return _verify_pool
+
+@timed("auth", "hash_password")
+def _hash_password(password):
+    import bcrypt
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+
+def _check_password(password, password_hash):
+    """bcrypt check on the worker pool"""
+    import bcrypt
+    future = _get_verify_pool().submit(bcrypt.checkpw, password.encode("utf-8"), password_hash.encode("utf-8"))
+    return future.result()
+
+@timed("auth", "authenticate")
 def authenticate(username, password):
     """Authenticate a user"""
-    users = load_users()
-    for user in users:
-        if user["username"] == username and bcrypt.checkpw(
-            password.encode("utf-8"), 
-            user["password_hash"].encode("utf-8")
-        ):
-            return True
+    global _dummy_hash
+    user = get_user(username)
+    if user is None:
+        if _dummy_hash is None:
+            _dummy_hash = _hash_password("dummy password")
+        _check_password(password, _dummy_hash)
+        return False
+    
+    # A login that succeeded recently with the same stored hash is not
+    # checked with bcrypt again; changing the password changes the key
+    digest = hmac.new(
+        _verify_cache_key,
+        "\0".join([username, user["password_hash"], password]).encode("utf-8"),
+        hashlib.sha256
+    ).digest()
+    if _verified_logins.get(digest):
+        return True
+    if _check_password(password, user["password_hash"]):
+        _verified_logins.set(digest, True)
+        return True
     return False
 
+@timed("auth", "create_user")
 def create_user(username, password, email=None):
     """Create a new user"""
-    users = load_users()
-    
     # Check if username already exists
-    if any(user["username"] == username for user in users):
+    if get_user(username) is not None:
         return False, "Username already exists"
     
     # Hash the password
-    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    password_hash = _hash_password(password)
     
     # Create new user
     new_user = {
@@ -71,8 +149,17 @@ def create_user(username, password, email=None):
         "email": email
     }
     
-    users.append(new_user)
-    save_users(users)
+    def add_user(data):
+        # Check again under the store's lock in case of a concurrent sign-up
+        if any(user["username"] == username for user in data["users"]):
+            raise ValueError("Username already exists")
+        data["users"].append(new_user)
+    
+    create_users_db_if_not_exists()
+    try:
+        _users_store.update(add_user)
+    except ValueError as e:
+        return False, str(e)
     return True, "User created successfully"
 
 def init_auth():
@@ -96,6 +183,7 @@ def login_page():
             if authenticate(username, password):
                 st.session_state.authenticated = True
                 st.session_state.username = username
+                start_session(username)
                 st.success("Login successful!")
                 st.rerun()
             else:
@@ -122,5 +210,6 @@ def login_page():
 
 def logout():
     """Log out the current user"""
+    end_session()
     st.session_state.authenticated = False
     st.session_state.username = None
\ No newline at end of file
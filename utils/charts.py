@@ -0,0 +1,162 @@
+# utils/charts.py
+"""
+Chart rendering for the analytics page.
+
+Charts are built from the small aggregated DataFrames the analytics queries
+return and cached by a hash of that data, so a rerun with unchanged data
+does no rendering at all. Two backends are available:
+
+- "matplotlib": seaborn/matplotlib charts rendered to PNG bytes
+- "native": Vega-Lite specs drawn by the browser, no plotting libraries needed
+"""
+import hashlib
+import io
+
+from config import CHART_CACHE_SIZE, CHART_CACHE_TTL, DEFAULT_CHART_BACKEND
+from utils.cache import TTLCache
+from utils.instrumentation import timed
+
+CHART_BACKENDS = ["native", "matplotlib"]
+
+_chart_cache = TTLCache(maxsize=CHART_CACHE_SIZE, ttl=CHART_CACHE_TTL)
+
+def chart_backend(settings):
+    """The user's chart backend, or the default one if the saved value is unknown"""
+    backend = settings.get("chart_backend")
+    return backend if backend in CHART_BACKENDS else DEFAULT_CHART_BACKEND
+
+def data_hash(df):
+    """Stable hash of a DataFrame's column names and values"""
+    import pandas as pd
+    digest = hashlib.sha1(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+# Matplotlib renderers. Each draws on a Figure created without pyplot, so the
+# figure is never registered with pyplot's global figure manager and is freed
+# as soon as the PNG bytes have been written.
+
+def _new_figure(figsize):
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+def _to_png(fig):
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format="png")
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+def _visits_over_time_png(df):
+    import pandas as pd
+    import seaborn as sns
+    fig = _new_figure((10, 4))
+    ax = fig.subplots()
+    sns.lineplot(x=pd.to_datetime(df["Date"]), y=df["Visits"], ax=ax)
+    ax.set_xlabel("Date")
+    fig.tight_layout()
+    return _to_png(fig)
+
+def _traffic_sources_png(df):
+    fig = _new_figure((8, 5))
+    ax = fig.subplots()
+    ax.pie(df["Visits"], labels=df["Referrer"], autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+    ax.set_title("Traffic Sources")
+    return _to_png(fig)
+
+def _devices_png(df):
+    import seaborn as sns
+    fig = _new_figure((8, 5))
+    ax = fig.subplots()
+    sns.barplot(x=df["Device"].fillna("Unknown"), y=df["Visits"], ax=ax)
+    ax.set_title("Visits by Device Type")
+    fig.tight_layout()
+    return _to_png(fig)
+
+def _top_pages_png(df):
+    import seaborn as sns
+    fig = _new_figure((10, 6))
+    ax = fig.subplots()
+    sns.barplot(x="Visit Count", y="Page", data=df, ax=ax)
+    ax.set_title("Top 10 Pages by Visit Count")
+    fig.tight_layout()
+    return _to_png(fig)
+
+# Vega-Lite specs with the aggregated data inlined
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+def _visits_over_time_spec(df):
+    return {
+        "data": {"values": _records(df)},
+        "mark": {"type": "line", "point": True},
+        "encoding": {
+            "x": {"field": "Date", "type": "temporal"},
+            "y": {"field": "Visits", "type": "quantitative"}
+        }
+    }
+
+def _traffic_sources_spec(df):
+    return {
+        "data": {"values": _records(df)},
+        "mark": {"type": "arc", "tooltip": True},
+        "encoding": {
+            "theta": {"field": "Visits", "type": "quantitative"},
+            "color": {"field": "Referrer", "type": "nominal"}
+        }
+    }
+
+def _devices_spec(df):
+    return {
+        "data": {"values": _records(df.fillna({"Device": "Unknown"}))},
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "x": {"field": "Device", "type": "nominal", "sort": "-y"},
+            "y": {"field": "Visits", "type": "quantitative"}
+        }
+    }
+
+def _top_pages_spec(df):
+    return {
+        "data": {"values": _records(df)},
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "y": {"field": "Page", "type": "nominal", "sort": "-x"},
+            "x": {"field": "Visit Count", "type": "quantitative"}
+        }
+    }
+
+RENDERERS = {
+    "visits_over_time": (_visits_over_time_png, _visits_over_time_spec),
+    "traffic_sources": (_traffic_sources_png, _traffic_sources_spec),
+    "devices": (_devices_png, _devices_spec),
+    "top_pages": (_top_pages_png, _top_pages_spec)
+}
+
+def render_chart(kind, df, backend="native"):
+    """Return PNG bytes ("matplotlib") or a Vega-Lite spec ("native") for a chart.
+
+    Results are cached by chart kind, backend and a hash of ``df``.
+    """
+    if backend not in CHART_BACKENDS:
+        raise ValueError(f"Unknown chart backend: {backend}")
+    png_renderer, spec_renderer = RENDERERS[kind]
+    renderer = png_renderer if backend == "matplotlib" else spec_renderer
+    key = (kind, backend, data_hash(df))
+    return _chart_cache.get_or_compute(key, lambda: renderer(df))
+
+def show_chart(kind, df, backend="native"):
+    """Draw a chart on the current Streamlit page"""
+    import streamlit as st
+    with timed("chart", f"{kind} ({backend})"):
+        chart = render_chart(kind, df, backend)
+        if backend == "matplotlib":
+            st.image(chart, width="stretch")
+        else:
+            st.vega_lite_chart(spec=chart, width="stretch")
+
+def get_chart_cache_stats():
+    return _chart_cache.stats()
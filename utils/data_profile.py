@@ -0,0 +1,323 @@
+# utils/data_profile.py
+"""
+Column profiles of uploaded CSV and Excel files, computed chunk by chunk.
+
+Files are read in blocks of PROFILE_CHUNK_BYTES (CSV, with pyarrow's
+streaming reader) or PROFILE_XLSX_CHUNK_ROWS rows (Excel, with openpyxl
+in read-only mode), so memory use does not grow with the file. Every
+column keeps running counts and moments, a HyperLogLog of its distinct
+values and, for numbers, a KLL sketch of its quantiles (utils/sketches.py).
+Profiles are cached in PROFILE_CACHE_DIR by the SHA-256 of the file:
+
+    python -m utils.data_profile sales.csv
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+
+from config import (
+    PROFILE_CHUNK_BYTES,
+    PROFILE_XLSX_CHUNK_ROWS,
+    PROFILE_CACHE_DIR,
+    PROFILE_HLL_PRECISION,
+    PROFILE_KLL_K
+)
+from utils.sketches import HyperLogLog, KLLSketch
+
+# Fractions reported as quantiles of numeric columns
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# Bumped when the profile format changes, so older cached profiles are ignored
+PROFILE_VERSION = 1
+
+# Bytes hashed per read
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+def _kind(data_type):
+    import pyarrow as pa
+    if pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        return "number"
+    if pa.types.is_boolean(data_type):
+        return "boolean"
+    if pa.types.is_temporal(data_type):
+        return "datetime"
+    if pa.types.is_null(data_type):
+        return None
+    return "text"
+
+def _plain(value):
+    """A scalar as a JSON-friendly Python value"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ") if hasattr(value, "hour") else value.isoformat()
+    return str(value)
+
+class ColumnProfile:
+    """Running statistics of one column, updated one chunk at a time.
+
+    A column whose chunks disagree on their type (say numbers first, text
+    later) becomes "mixed" and only keeps its counts from then on.
+    """
+
+    def __init__(self, name, precision=PROFILE_HLL_PRECISION, k=PROFILE_KLL_K):
+        self.name = name
+        self.kind = None
+        self.count = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog(precision)
+        self.min = None
+        self.max = None
+        # Numbers: mean and sum of squared deviations (Chan et al. parallel update)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.quantiles = KLLSketch(k)
+        # Text: shortest and longest value
+        self.min_length = None
+        self.max_length = None
+        # Booleans: number of true values
+        self.true_count = 0
+
+    def update(self, array):
+        import pyarrow.compute as pc
+
+        self.nulls += array.null_count
+        valid = pc.drop_null(array)
+        if not len(valid):
+            return
+        self.count += len(valid)
+        kind = _kind(valid.type)
+        # Hashing fixed-width values is cheaper than finding the unique ones
+        # first; text values are converted to Python strings, so fewer is better
+        self.distinct.add((pc.unique(valid) if kind == "text" else valid).to_numpy(zero_copy_only=False))
+
+        if self.kind is None:
+            self.kind = kind
+        elif kind != self.kind:
+            self.kind = "mixed"
+        if self.kind == "mixed":
+            return
+
+        if kind in ("number", "datetime"):
+            bounds = pc.min_max(valid)
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        if kind == "number":
+            import numpy as np
+            values = valid.cast("float64").to_numpy(zero_copy_only=False)
+            self._add_moments(len(values), float(np.mean(values)), float(np.sum((values - np.mean(values)) ** 2)))
+            self.quantiles.add(values)
+        elif kind == "boolean":
+            self.true_count += pc.sum(valid).as_py() or 0
+        elif kind == "text":
+            bounds = pc.min_max(pc.utf8_length(valid.cast("string")))
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            self.min_length = low if self.min_length is None else min(self.min_length, low)
+            self.max_length = high if self.max_length is None else max(self.max_length, high)
+
+    def _add_moments(self, count, mean, m2):
+        previous = self.count - count
+        delta = mean - self.mean
+        self.mean += delta * count / self.count
+        self.m2 += m2 + delta * delta * previous * count / self.count
+
+    def result(self):
+        rows = self.count + self.nulls
+        profile = {
+            "name": self.name,
+            "kind": self.kind or "empty",
+            "count": self.count,
+            "nulls": self.nulls,
+            "null_fraction": self.nulls / rows if rows else 0.0,
+            # The estimate can be off by a little; never report more distinct values than values
+            "distinct": min(self.distinct.count(), self.count)
+        }
+        if self.kind in ("number", "datetime"):
+            profile.update(min=_plain(self.min), max=_plain(self.max))
+        if self.kind == "number":
+            profile.update(
+                mean=_plain(self.mean),
+                std=_plain(math.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else None,
+                quantiles={str(fraction): _plain(value) for fraction, value in zip(
+                    QUANTILES, self.quantiles.quantiles(QUANTILES)
+                )}
+            )
+        elif self.kind == "boolean":
+            profile["true_fraction"] = self.true_count / self.count
+        elif self.kind == "text":
+            profile.update(min_length=self.min_length, max_length=self.max_length)
+        return profile
+
+def profile_batches(batches):
+    """Profile of a stream of pyarrow RecordBatches with the same columns"""
+    columns = None
+    rows = 0
+    for batch in batches:
+        if columns is None:
+            columns = [ColumnProfile(name) for name in batch.schema.names]
+        rows += batch.num_rows
+        for column, array in zip(columns, batch.columns):
+            column.update(array)
+    return {"rows": rows, "columns": [column.result() for column in columns or []]}
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+def _csv_batches(source, chunk_bytes, column_types):
+    from pyarrow import csv
+    reader = csv.open_csv(
+        _rewind(source),
+        read_options=csv.ReadOptions(block_size=chunk_bytes),
+        # Empty cells are missing values, in text columns too
+        convert_options=csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+    names = reader.schema.names
+    try:
+        for batch in reader:
+            yield batch
+    except Exception as exc:
+        exc.column_names = names
+        raise
+
+def profile_csv(source, chunk_bytes=PROFILE_CHUNK_BYTES):
+    """Profile a CSV file given as a path or a binary file object.
+
+    Column types are inferred from the first chunk. If a later chunk does
+    not fit (a decimal in an integer column, text in a number column), the
+    column is widened to float or text and the profile starts over.
+    """
+    import pyarrow as pa
+
+    column_types = {}
+    while True:
+        try:
+            return profile_batches(_csv_batches(source, chunk_bytes, column_types))
+        except pa.ArrowInvalid as exc:
+            match = re.search(r"CSV column #(\d+).*conversion error to (\w+)", str(exc))
+            if not match or not hasattr(exc, "column_names"):
+                raise
+            name = exc.column_names[int(match.group(1))]
+            if match.group(2) == "int64" and name not in column_types:
+                column_types[name] = pa.float64()
+            elif column_types.get(name) != pa.string():
+                column_types[name] = pa.string()
+            else:
+                raise
+
+def _arrow_array(values):
+    """Arrow array of spreadsheet cell values, as text if their types are mixed"""
+    import pyarrow as pa
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+def _xlsx_batches(source, chunk_rows):
+    import pyarrow as pa
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Profiling Excel files requires openpyxl: pip install openpyxl")
+
+    workbook = openpyxl.load_workbook(_rewind(source), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [str(value) if value is not None else f"column_{i + 1}" for i, value in enumerate(header)]
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            yield pa.RecordBatch.from_arrays(
+                [_arrow_array([row[i] if i < len(row) else None for row in chunk]) for i in range(len(names))],
+                names=names
+            )
+    finally:
+        workbook.close()
+
+def profile_xlsx(source, chunk_rows=PROFILE_XLSX_CHUNK_ROWS):
+    """Profile the first sheet of an Excel workbook; its first row holds the column names"""
+    return profile_batches(_xlsx_batches(source, chunk_rows))
+
+def file_sha256(source):
+    """Hex SHA-256 of a file given as a path or a binary file object"""
+    digest = hashlib.sha256()
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else _rewind(source)
+    try:
+        for block in iter(lambda: handle.read(_HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    finally:
+        if handle is not source:
+            handle.close()
+    return digest.hexdigest()
+
+def _file_type(source, file_type):
+    if file_type is None:
+        name = str(getattr(source, "name", source))
+        file_type = os.path.splitext(name)[1].lstrip(".").lower()
+    if file_type not in ("csv", "xlsx"):
+        raise ValueError(f"Unsupported file type: {file_type or 'unknown'} (expected csv or xlsx)")
+    return file_type
+
+def profile_file(source, file_type=None, use_cache=True):
+    """Profile of a CSV or XLSX file, from the cache if the same file was profiled before.
+
+    ``source`` is a path or a binary file object such as a Streamlit
+    upload; ``file_type`` defaults to its extension.
+    """
+    file_type = _file_type(source, file_type)
+    sha256 = file_sha256(source)
+    cache_path = PROFILE_CACHE_DIR / f"{sha256}.json"
+    if use_cache:
+        try:
+            with open(cache_path) as f:
+                profile = json.load(f)
+            if profile.get("version") == PROFILE_VERSION:
+                return dict(profile, cached=True)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    start = time.perf_counter()
+    profile = profile_csv(source) if file_type == "csv" else profile_xlsx(source)
+    profile.update(
+        version=PROFILE_VERSION,
+        sha256=sha256,
+        file_type=file_type,
+        seconds=time.perf_counter() - start
+    )
+    if use_cache:
+        PROFILE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, cache_path)
+    return dict(profile, cached=False)
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        sys.exit("Usage: python -m utils.data_profile FILE.csv|FILE.xlsx ...")
+    for path in paths:
+        profile = profile_file(path)
+        source = "cache" if profile["cached"] else f"{profile['seconds']:.1f} s"
+        print(f"{path}: {profile['rows']:,} rows, {len(profile['columns'])} columns ({source})")
+        for column in profile["columns"]:
+            details = f"{column['kind']:<8} {column['nulls']:>12,} nulls {column['distinct']:>12,} distinct"
+            if column["kind"] in ("number", "datetime"):
+                details += f"  {column['min']} .. {column['max']}"
+            print(f"  {column['name']:<24} {details}")
+
+if __name__ == "__main__":
+    main()
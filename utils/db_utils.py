@@ -1,43 +1,387 @@
-import os
-import sys
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Boolean, Column, Date, Float, ForeignKey, Integer, LargeBinary, String, Text, DateTime, Index, UniqueConstraint, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
+from sqlalchemy.orm import sessionmaker, scoped_session
 from datetime import datetime
 from pathlib import Path
 
-# Add parent directory to path to import config
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    SQLITE_PRAGMAS
+)
+from utils.instrumentation import instrument_engine
 
 # Define the SQLAlchemy base class
 Base = declarative_base()
 
-# Define PageVisit model as an example
+class _DimensionMixin:
+    """Distinct values of one page visit attribute (see utils/dimensions.py)"""
+    id = Column(Integer, primary_key=True)
+    value = Column(String(255), nullable=False, unique=True)
+
+class VisitUrl(_DimensionMixin, Base):
+    __tablename__ = "visit_urls"
+
+class VisitPath(_DimensionMixin, Base):
+    __tablename__ = "visit_paths"
+
+class VisitReferrer(_DimensionMixin, Base):
+    __tablename__ = "visit_referrers"
+
+class VisitLocation(_DimensionMixin, Base):
+    __tablename__ = "visit_locations"
+
+class VisitDevice(_DimensionMixin, Base):
+    __tablename__ = "visit_devices"
+
+class VisitUserAgent(_DimensionMixin, Base):
+    __tablename__ = "visit_user_agents"
+
+class VisitBrowser(_DimensionMixin, Base):
+    __tablename__ = "visit_browsers"
+
+class VisitOperatingSystem(_DimensionMixin, Base):
+    __tablename__ = "visit_operating_systems"
+
 class PageVisit(Base):
+    """A page view. Repeated attributes are stored as dimension table ids."""
     __tablename__ = "page_visits"
     
     id = Column(Integer, primary_key=True)
-    url = Column(String(255), nullable=False)
-    path = Column(String(255), nullable=False)
-    referrer = Column(String(255), nullable=True)
+    url_id = Column(Integer, ForeignKey("visit_urls.id"), nullable=False)
+    path_id = Column(Integer, ForeignKey("visit_paths.id"), nullable=False)
+    referrer_id = Column(Integer, ForeignKey("visit_referrers.id"), nullable=True)
     ip_address = Column(String(50), nullable=True)
-    location = Column(String(100), nullable=True)
-    device = Column(String(100), nullable=True)
-    user_agent = Column(String(255), nullable=True)
+    location_id = Column(Integer, ForeignKey("visit_locations.id"), nullable=True)
+    device_id = Column(Integer, ForeignKey("visit_devices.id"), nullable=True)
+    user_agent_id = Column(Integer, ForeignKey("visit_user_agents.id"), nullable=True)
     timestamp = Column(DateTime, default=datetime.now)
+    browser_id = Column(Integer, ForeignKey("visit_browsers.id"), nullable=True)
+    os_id = Column(Integer, ForeignKey("visit_operating_systems.id"), nullable=True)
+
+    # Created by utils/migrations.py; keep the two in sync
+    __table_args__ = (
+        Index("ix_page_visits_timestamp", "timestamp"),
+        Index("ix_page_visits_url_timestamp", "url_id", "timestamp"),
+        Index("ix_page_visits_path_timestamp", "path_id", "timestamp"),
+    )
+
+class VisitDetail(Base):
+    """Read-only page_visit_details view: page visits with their attribute values"""
+    __tablename__ = "page_visit_details"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String(255))
+    path = Column(String(255))
+    referrer = Column(String(255))
+    ip_address = Column(String(50))
+    location = Column(String(255))
+    device = Column(String(255))
+    user_agent = Column(String(255))
+    timestamp = Column(DateTime)
+    url_id = Column(Integer)
+    path_id = Column(Integer)
+    referrer_id = Column(Integer)
+    location_id = Column(Integer)
+    device_id = Column(Integer)
+    user_agent_id = Column(Integer)
+    browser = Column(String(255))
+    os = Column(String(255))
+    browser_id = Column(Integer)
+    os_id = Column(Integer)
+
+class _VisitRollupMixin:
+    """Visit counts per time bucket and visit attributes.
+
+    Missing referrer, device and location values are stored as empty strings
+    so that they take part in the unique key.
+    """
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)
+    url = Column(String(255), nullable=False)
+    path = Column(String(255), nullable=False)
+    referrer = Column(String(255), nullable=False, default="")
+    device = Column(String(100), nullable=False, default="")
+    location = Column(String(100), nullable=False, default="")
+    visits = Column(Integer, nullable=False, default=0)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            UniqueConstraint(
+                "bucket", "url", "path", "referrer", "device", "location",
+                name=f"uq_{cls.__tablename__}_key"
+            ),
+            Index(f"ix_{cls.__tablename__}_url_bucket", "url", "bucket"),
+        )
+
+class HourlyVisitRollup(_VisitRollupMixin, Base):
+    __tablename__ = "page_visit_rollups_hourly"
+
+class DailyVisitRollup(_VisitRollupMixin, Base):
+    __tablename__ = "page_visit_rollups_daily"
+
+class VisitSketch(Base):
+    """Mergeable summaries of one day of visits to one site (see utils/visit_sketches.py)"""
+    __tablename__ = "page_visit_sketches"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(String(10), nullable=False)  # YYYY-MM-DD
+    url = Column(String(255), nullable=False)
+    visits = Column(Integer, nullable=False, default=0)
+    visitors = Column(LargeBinary, nullable=False)  # HyperLogLog of (ip_address, user_agent)
+    paths = Column(LargeBinary, nullable=False)  # Space-Saving and Count-Min of paths
+    referrers = Column(LargeBinary, nullable=False)  # The same for referrers
+
+    __table_args__ = (
+        UniqueConstraint("day", "url", name="uq_page_visit_sketches_day_url"),
+    )
+
+class RollupState(Base):
+    """High-water mark of the page_visits rows already folded into the rollups"""
+    __tablename__ = "rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    last_visit_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+class ArchivedVisitFile(Base):
+    """A Parquet file of page visits moved out of page_visits by utils/archive.py.
+
+    A file only counts as archived once its row is committed, in the same
+    transaction that deletes its visits from page_visits.
+    """
+    __tablename__ = "page_visit_archive_files"
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String(255), nullable=False, unique=True)  # Relative to ARCHIVE_DIR
+    day = Column(String(10), nullable=False, index=True)  # YYYY-MM-DD partition
+    rows = Column(Integer, nullable=False)
+    min_visit_id = Column(Integer, nullable=False)
+    max_visit_id = Column(Integer, nullable=False)
+    min_timestamp = Column(DateTime, nullable=False)
+    max_timestamp = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class UptimeTarget(Base):
+    """A URL checked by utils/uptime.py every ``interval_seconds``"""
+    __tablename__ = "uptime_targets"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String(255), nullable=False, unique=True)
+    interval_seconds = Column(Integer, nullable=False)
+    enabled = Column(Boolean, nullable=False, default=True)
+    next_check_at = Column(DateTime, nullable=True, index=True)  # NULL until the first check
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class UptimeCheck(Base):
+    """Result of one uptime check, including its retries"""
+    __tablename__ = "uptime_checks"
+
+    id = Column(Integer, primary_key=True)
+    target_id = Column(Integer, ForeignKey("uptime_targets.id"), nullable=False)
+    checked_at = Column(DateTime, nullable=False)
+    ok = Column(Boolean, nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL when no response arrived
+    response_ms = Column(Float, nullable=True)  # Of the last attempt
+    attempts = Column(Integer, nullable=False)
+    error = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("ix_uptime_checks_checked_at", "checked_at"),
+        Index("ix_uptime_checks_target_checked_at", "target_id", "checked_at"),
+        Index("ix_uptime_checks_failed", "checked_at", sqlite_where=text("ok = 0")),
+    )
+
+class Client(Base):
+    """A client of the Invoice & Project Tracker (utils/invoices.py)"""
+    __tablename__ = "clients"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False, unique=True)
+    email = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class Project(Base):
+    """A client project; status is active, on_hold or completed"""
+    __tablename__ = "projects"
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    name = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default="active")
+    due_on = Column(Date, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_projects_status_due_on", "status", "due_on"),
+        Index("ix_projects_client_id", "client_id"),
+    )
+
+class Invoice(Base):
+    """An invoice; status is draft, sent, paid or void.
+
+    total_cents is the sum of the invoice's lines, kept up to date by every
+    write to them, so readers never add up lines.
+    """
+    __tablename__ = "invoices"
+
+    id = Column(Integer, primary_key=True)
+    number = Column(String(50), nullable=False, unique=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    status = Column(String(20), nullable=False, default="draft")
+    issued_on = Column(Date, nullable=False)
+    due_on = Column(Date, nullable=False)
+    paid_on = Column(Date, nullable=True)
+    total_cents = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # Covers the per-status totals, so they never read the invoices
+        Index("ix_invoices_status_due_on", "status", "due_on", "total_cents"),
+        Index("ix_invoices_due_on", "due_on"),
+        Index("ix_invoices_issued_on", "issued_on"),
+        Index("ix_invoices_paid_on", "paid_on"),
+        Index("ix_invoices_client_id", "client_id"),
+        Index("ix_invoices_project_id", "project_id"),
+    )
+
+class InvoiceLine(Base):
+    """A line of an invoice; amount_cents is quantity times unit_price_cents, rounded"""
+    __tablename__ = "invoice_lines"
+
+    id = Column(Integer, primary_key=True)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False)
+    description = Column(String(255), nullable=False)
+    quantity = Column(Float, nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
+    amount_cents = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_invoice_lines_invoice_id", "invoice_id"),
+    )
+
+class AssistantResponse(Base):
+    """A cached AI Assistant answer (utils/assistant.py).
+
+    key is the SHA-256 of the provider, the normalized prompt and the
+    context the answer was given with.
+    """
+    __tablename__ = "assistant_responses"
+
+    key = Column(String(64), primary_key=True)
+    provider = Column(String(100), nullable=False)
+    prompt = Column(Text, nullable=False)  # Normalized
+    response = Column(Text, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    last_used_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # Eviction reads the least recently used answers and their sizes from the index alone
+        Index("ix_assistant_responses_last_used_at", "last_used_at", "size_bytes"),
+    )
+
+# Process-wide engine and session registry. Streamlit re-executes app.py on
+# every rerun but keeps imported modules loaded, so these are shared by all
+# reruns and browser sessions served by the same process.
+_engine = None
+_session_registry = None
+_engine_lock = threading.Lock()
+_db_initialized = False
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure every new SQLite connection opened by the pool"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def create_db_engine(url=DATABASE_URL):
+    """Create an engine with the configured pool and SQLite pragmas, timing every statement"""
+    url = make_url(url)
+    options = {"pool_pre_ping": True}
+    # In-memory SQLite uses a single shared connection and takes no pool options
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE
+        )
+    engine = create_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return instrument_engine(engine)
+
+def get_engine():
+    """Get the shared database engine, creating it on first use"""
+    global _engine, _session_registry
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_db_engine()
+                _session_registry = scoped_session(sessionmaker(bind=engine))
+                _engine = engine
+    return _engine
+
+def get_scoped_session():
+    """Get the thread-local session registry bound to the shared engine"""
+    get_engine()
+    return _session_registry
 
-# Create the engine, bind it to the sessionmaker
 def get_db_session():
-    """Get a database session"""
-    engine = create_engine(DATABASE_URL)
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """Get a new database session bound to the shared engine"""
+    return get_scoped_session().session_factory()
+
+@contextmanager
+def session_scope():
+    """Provide a transactional scope around a series of operations.
+
+    Uses the current thread's scoped session, commits on success, rolls back
+    on error and releases the session afterwards. Scopes must not be nested.
+    """
+    registry = get_scoped_session()
+    session = registry()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        registry.remove()
+
+def dispose_engine():
+    """Close all pooled connections and drop the shared engine"""
+    global _engine, _session_registry
+    global _db_initialized
+    with _engine_lock:
+        if _session_registry is not None:
+            _session_registry.remove()
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _session_registry = None
+        _db_initialized = False
 
 # Initialize the database if this file is run directly
 def init_db():
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
+    """Bring the database schema up to date. Runs once per process."""
+    global _db_initialized
+    engine = get_engine()
+    if not _db_initialized:
+        from utils.migrations import upgrade
+        upgrade(engine)
+        _db_initialized = True
     return engine
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+# utils/dimensions.py
+"""
+Dimension tables of the repeated page visit attributes.
+
+page_visits stores url, path, referrer, location, device, user_agent,
+browser and os as integer ids into one small table of distinct values per
+attribute (visit_urls, visit_paths, ...). Readers that need the values select from
+the page_visit_details view (VisitDetail), or join the dimension tables
+themselves where the join order matters. Writers turn values into ids
+with ``interner``, which remembers the ids it has seen, so steady-state
+ingest does not look anything up.
+"""
+import threading
+from sqlalchemy import insert, select
+
+from config import DIMENSION_CACHE_SIZE
+from utils.db_utils import (
+    VisitUrl,
+    VisitPath,
+    VisitReferrer,
+    VisitLocation,
+    VisitDevice,
+    VisitUserAgent,
+    VisitBrowser,
+    VisitOperatingSystem
+)
+
+# Attribute -> dimension table. page_visits has an ``<attribute>_id`` column for each.
+DIMENSIONS = {
+    "url": VisitUrl,
+    "path": VisitPath,
+    "referrer": VisitReferrer,
+    "location": VisitLocation,
+    "device": VisitDevice,
+    "user_agent": VisitUserAgent,
+    "browser": VisitBrowser,
+    "os": VisitOperatingSystem
+}
+
+# Values looked up per statement, below SQLite's bound parameter limit
+_LOOKUP_CHUNK = 500
+
+class ValueInterner:
+    """Value -> id cache of the dimension tables, shared by all threads.
+
+    Missing values are added in their own transaction and only cached after
+    it commits, so a rolled back insert never leaves a dangling id behind.
+    Each attribute keeps at most ``max_values`` ids and starts over when
+    it would grow past that.
+    """
+
+    def __init__(self, max_values=DIMENSION_CACHE_SIZE):
+        self.max_values = max_values
+        # (database URL, attribute) -> {value: id}
+        self._ids = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ids(self, engine, attribute, values):
+        """Dict mapping each of ``values`` to its id, adding unknown values.
+
+        None is skipped; a missing attribute has no id.
+        """
+        values = set(values)
+        with self._lock:
+            cache = self._ids.setdefault((str(engine.url), attribute), {})
+            found = {value: cache[value] for value in values if value in cache}
+            missing = [value for value in values if value is not None and value not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+
+        model = DIMENSIONS[attribute]
+        added = {}
+        with engine.begin() as conn:
+            for start in range(0, len(missing), _LOOKUP_CHUNK):
+                chunk = missing[start:start + _LOOKUP_CHUNK]
+                conn.execute(insert(model).prefix_with("OR IGNORE"), [{"value": value} for value in chunk])
+                added.update(conn.execute(select(model.value, model.id).where(model.value.in_(chunk))).all())
+        with self._lock:
+            if len(cache) + len(added) > self.max_values:
+                cache.clear()
+            cache.update(added)
+        found.update(added)
+        return found
+
+    def encode(self, engine, rows):
+        """page_visits rows with attribute values replaced by their ids.
+
+        ``rows`` are dicts with the VisitDetail column names; other keys are
+        kept as they are.
+        """
+        ids = [
+            (attribute, f"{attribute}_id", self.ids(engine, attribute, {row.get(attribute) for row in rows}))
+            for attribute in DIMENSIONS
+        ]
+        encoded = []
+        for row in rows:
+            values = dict(row)
+            for attribute, key, attribute_ids in ids:
+                values[key] = attribute_ids.get(values.pop(attribute, None))
+            encoded.append(values)
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached_values": sum(len(cache) for cache in self._ids.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+# Shared by every writer in this process
+interner = ValueInterner()
@@ -0,0 +1,263 @@
+# utils/enrichment.py
+"""
+Browser, operating system, device class and country of page visits,
+filled in by the ingest service before each batch is written.
+
+User agents are matched against a short list of patterns. Countries come
+from a range file: the IPv4 ranges of a country CSV (the free DB-IP or
+IP2Location "lite" downloads both work), sorted and stored as arrays that
+are memory-mapped and binary searched, so a lookup touches a few pages
+the OS keeps cached instead of a table loaded into every process:
+
+    python -m utils.enrichment build dbip-country-lite.csv
+    python -m utils.enrichment lookup 8.8.8.8
+
+Repeated user agents and addresses are answered from LRU caches, and a
+batch looks up each distinct value once. Without a range file, visits
+get no location.
+"""
+import argparse
+import bisect
+import csv
+import ipaddress
+import mmap
+import re
+import socket
+import struct
+import threading
+from array import array
+from functools import lru_cache
+from pathlib import Path
+
+from config import GEOIP_RANGES_PATH, ENRICH_USER_AGENT_CACHE_SIZE, ENRICH_IP_CACHE_SIZE
+
+# Range file header: magic, byte order check, range count, size of the
+# country names. The header and the arrays that follow are in the byte
+# order of the machine that built the file.
+_MAGIC = b"CODRGEO1"
+_HEADER = struct.Struct("=8sIII4x")
+_BYTE_ORDER_CHECK = 0x01020304
+
+# (value, pattern) in order; the first match wins. Most browsers also
+# claim to be Chrome or Safari, so those come last.
+BROWSERS = [
+    ("Edge", re.compile(r"Edg(?:e|A|iOS)?/")),
+    ("Opera", re.compile(r"OPR/|Opera")),
+    ("Samsung Internet", re.compile(r"SamsungBrowser/")),
+    ("Firefox", re.compile(r"Firefox/|FxiOS/")),
+    ("Chrome", re.compile(r"Chrome/|CriOS/")),
+    ("Safari", re.compile(r"Version/[\d.]+.*Safari/")),
+    ("Internet Explorer", re.compile(r"MSIE |Trident/"))
+]
+OPERATING_SYSTEMS = [
+    ("iOS", re.compile(r"iPhone|iPad|iPod")),
+    ("Android", re.compile(r"Android")),
+    ("Windows", re.compile(r"Windows")),
+    ("ChromeOS", re.compile(r"CrOS")),
+    ("macOS", re.compile(r"Macintosh|Mac OS X")),
+    ("Linux", re.compile(r"Linux|X11"))
+]
+_BOT = re.compile(r"bot\b|bot/|crawl|spider|slurp|headless|curl/|wget/|python-requests", re.IGNORECASE)
+_TABLET = re.compile(r"iPad|Tablet|Android(?!.*Mobi)")
+_MOBILE = re.compile(r"Mobi|iPhone|iPod|Android")
+
+# Label of user agents no pattern matches
+OTHER = "Other"
+
+def _first_match(patterns, user_agent):
+    return next((value for value, pattern in patterns if pattern.search(user_agent)), OTHER)
+
+@lru_cache(maxsize=ENRICH_USER_AGENT_CACHE_SIZE)
+def parse_user_agent(user_agent):
+    """(browser, os, device) of a user agent string; all None without one.
+
+    device is Bot, Tablet, Mobile or Desktop.
+    """
+    if not user_agent:
+        return None, None, None
+    if _BOT.search(user_agent):
+        device = "Bot"
+    elif _TABLET.search(user_agent):
+        device = "Tablet"
+    elif _MOBILE.search(user_agent):
+        device = "Mobile"
+    else:
+        device = "Desktop"
+    return _first_match(BROWSERS, user_agent), _first_match(OPERATING_SYSTEMS, user_agent), device
+
+def ip_number(ip_address):
+    """An IPv4 address (or IPv4-mapped IPv6 address) as an integer; None otherwise"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip_address), "big")
+    except (OSError, TypeError, ValueError):
+        pass
+    try:
+        mapped = ipaddress.IPv6Address(ip_address).ipv4_mapped
+    except ValueError:
+        return None
+    return int(mapped) if mapped else None
+
+class IPRanges:
+    """Memory-mapped range file: IPv4 ranges and the country of each"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, order, self.count, names_size = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not an IP range file")
+        if order != _BYTE_ORDER_CHECK:
+            raise ValueError(f"{self.path} was built on a machine of another byte order; build it again")
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        self._starts = view[offset:offset + 4 * self.count].cast("I")
+        offset += 4 * self.count
+        self._ends = view[offset:offset + 4 * self.count].cast("I")
+        offset += 4 * self.count
+        self._countries = view[offset:offset + 2 * self.count].cast("H")
+        offset += 2 * self.count
+        self.names = bytes(view[offset:offset + names_size]).decode().split("\n")
+
+    def country(self, number):
+        """Country of an address from ip_number(), or None if no range holds it"""
+        index = bisect.bisect_right(self._starts, number) - 1
+        if index >= 0 and number <= self._ends[index]:
+            return self.names[self._countries[index]]
+        return None
+
+    def close(self):
+        for view in (self._starts, self._ends, self._countries):
+            view.release()
+        self._mmap.close()
+
+def _read_address(value):
+    return int(value) if value.isdigit() else ip_number(value)
+
+def build_ranges(csv_path, output=GEOIP_RANGES_PATH):
+    """Write the range file from a CSV of start, end, country code[, country name].
+
+    Start and end are addresses or integers. IPv6 rows and rows of unknown
+    countries ("-" or "ZZ") are skipped. The country is stored by name
+    where the CSV has one. Returns the number of ranges written.
+    """
+    ranges = []
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) < 3:
+                continue
+            start, end = _read_address(row[0].strip()), _read_address(row[1].strip())
+            code = row[2].strip()
+            if start is None or end is None or code in ("", "-", "ZZ"):
+                continue
+            name = row[3].strip() if len(row) > 3 and row[3].strip() not in ("", "-") else code
+            ranges.append((start, end, name))
+    ranges.sort()
+
+    names = {}
+    starts, ends, countries = array("I"), array("I"), array("H")
+    for start, end, name in ranges:
+        if starts and start <= ends[-1]:
+            raise ValueError(f"Overlapping ranges in {csv_path} at {ipaddress.IPv4Address(start)}")
+        starts.append(start)
+        ends.append(end)
+        countries.append(names.setdefault(name, len(names)))
+    encoded_names = "\n".join(names).encode()
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_name(output.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _BYTE_ORDER_CHECK, len(starts), len(encoded_names)))
+        for values in (starts, ends, countries):
+            values.tofile(file)
+        file.write(encoded_names)
+    tmp_path.replace(output)
+    return len(starts)
+
+class Enricher:
+    """Fills in browser, os, device and location of page_visits rows.
+
+    The range file is opened on first use and again whenever it changes,
+    so it can be rebuilt while the ingest service runs.
+    """
+
+    def __init__(self, ranges_path=GEOIP_RANGES_PATH, ip_cache_size=ENRICH_IP_CACHE_SIZE):
+        self.ranges_path = Path(ranges_path)
+        self.ranges = None
+        self._ranges_mtime = None
+        self._lock = threading.Lock()
+        self.country = lru_cache(maxsize=ip_cache_size)(self._country)
+
+    def _country(self, ip_address):
+        ranges = self.ranges
+        number = ip_number(ip_address) if ranges is not None else None
+        return ranges.country(number) if number is not None else None
+
+    def _check_ranges(self):
+        try:
+            mtime = self.ranges_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._ranges_mtime:
+            return
+        with self._lock:
+            if mtime == self._ranges_mtime:
+                return
+            # The previous mapping is left to the garbage collector, as
+            # other threads may still be searching it
+            self.ranges = IPRanges(self.ranges_path) if mtime is not None else None
+            self._ranges_mtime = mtime
+            self.country.cache_clear()
+
+    def enrich(self, rows):
+        """Fill in the rows (dicts with VisitDetail column names) in place and return them.
+
+        Values a row already has are kept.
+        """
+        self._check_ranges()
+        agents = {agent: parse_user_agent(agent) for agent in {row.get("user_agent") for row in rows} if agent}
+        countries = {
+            address: self.country(address)
+            for address in {row.get("ip_address") for row in rows if not row.get("location")} if address
+        }
+        for row in rows:
+            browser, os_name, device = agents.get(row.get("user_agent"), (None, None, None))
+            row["browser"] = row.get("browser") or browser
+            row["os"] = row.get("os") or os_name
+            row["device"] = row.get("device") or device
+            row["location"] = row.get("location") or countries.get(row.get("ip_address"))
+        return rows
+
+    def stats(self):
+        user_agents, addresses = parse_user_agent.cache_info(), self.country.cache_info()
+        return {
+            "ranges": self.ranges.count if self.ranges is not None else 0,
+            "user_agent_hits": user_agents.hits,
+            "user_agent_misses": user_agents.misses,
+            "ip_hits": addresses.hits,
+            "ip_misses": addresses.misses
+        }
+
+# Shared by every writer in this process
+enricher = Enricher()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.enrichment", description="Manage the IP range file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the range file from a country CSV")
+    build.add_argument("csv", help="CSV of start, end, country code[, country name]")
+    build.add_argument("--output", default=GEOIP_RANGES_PATH, help=f"default: {GEOIP_RANGES_PATH}")
+    lookup = commands.add_parser("lookup", help="print the country of IP addresses")
+    lookup.add_argument("addresses", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_ranges(args.csv, args.output)
+        print(f"Wrote {count:,} ranges to {args.output}.")
+    else:
+        for address in args.addresses:
+            print(f"{address}: {enricher.enrich([{'ip_address': address}])[0]['location'] or 'unknown'}")
+
+if __name__ == "__main__":
+    main()
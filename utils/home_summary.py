@@ -0,0 +1,128 @@
+# utils/home_summary.py
+"""
+Numbers shown on the Dashboard Home page.
+
+All tiles come from one SQL statement of scalar subqueries, so the page
+costs a single round trip however many tiles it has. Every number is a
+plain range count or probe of an index, never an aggregate that has to
+look at each row's columns:
+- visits today and up to the same time yesterday, and the latest visit,
+  from the page_visits timestamp index
+- sites with visits today, one index probe per site
+- checks and failed checks over the last UPTIME_WINDOW_HOURS and the
+  period before, from the checked_at index and the partial index of
+  failed checks
+- active projects, and outstanding and overdue invoices with their
+  total, from the status indexes of utils.invoices
+- active projects due in the next seven days, a range of the projects
+  (status, due_on) index
+
+The result is shared by all sessions for HOME_SUMMARY_TTL seconds, and
+only one thread computes it when it expires, so any number of users on
+the home page cost one query per window.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import exists, func, select
+
+from config import HOME_SUMMARY_TTL, UPTIME_WINDOW_HOURS
+from utils.cache import TTLCache
+from utils.db_utils import PageVisit, VisitUrl, UptimeCheck, Project
+from utils.invoices import summary_query as invoice_summary_query
+
+_summary_cache = TTLCache(maxsize=1, ttl=HOME_SUMMARY_TTL)
+# Held while the summary is computed, so concurrent misses wait for it
+_compute_lock = threading.Lock()
+
+def _count(*conditions):
+    return select(func.count()).where(*conditions).scalar_subquery()
+
+def _between(column, start, end):
+    return column >= start, column < end
+
+def summary_query(now):
+    """The home page numbers as one statement returning one row"""
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    period = timedelta(hours=UPTIME_WINDOW_HOURS)
+    today = now.date()
+
+    invoices = invoice_summary_query(now.date()).subquery("invoices")
+
+    return select(
+        _count(*_between(PageVisit.timestamp, day_start, now)).label("visits_today"),
+        _count(*_between(PageVisit.timestamp, day_start - timedelta(days=1), now - timedelta(days=1)))
+        .label("visits_yesterday"),
+        # Not max(): SQLite only reads max() off the index in a query of its own
+        select(PageVisit.timestamp).order_by(PageVisit.timestamp.desc()).limit(1).scalar_subquery()
+        .label("last_visit"),
+        select(func.count()).select_from(VisitUrl).where(
+            exists().where(PageVisit.url_id == VisitUrl.id, *_between(PageVisit.timestamp, day_start, now))
+        ).scalar_subquery().label("sites_today"),
+        _count(*_between(UptimeCheck.checked_at, now - period, now)).label("checks"),
+        # ~ok renders as "ok = 0", the condition of the failed checks index
+        _count(~UptimeCheck.ok, *_between(UptimeCheck.checked_at, now - period, now)).label("failed"),
+        _count(*_between(UptimeCheck.checked_at, now - 2 * period, now - period)).label("previous_checks"),
+        _count(~UptimeCheck.ok, *_between(UptimeCheck.checked_at, now - 2 * period, now - period))
+        .label("previous_failed"),
+        invoices.c.active_projects,
+        _count(Project.status == "active", *_between(Project.due_on, today, today + timedelta(days=7)))
+        .label("projects_due_this_week"),
+        invoices.c.outstanding,
+        invoices.c.outstanding_cents,
+        invoices.c.overdue
+    ).select_from(invoices)
+
+def load_home_summary(session, now=None):
+    """Compute the home page numbers as a dict.
+
+    Keys: visits_today, visits_yesterday (up to the same time of day),
+    last_visit, sites_today, uptime and previous_uptime (percent or None),
+    checks, active_projects, projects_due_this_week (active ones due in the
+    next seven days), and outstanding (invoices), outstanding_cents and
+    overdue.
+    """
+    now = now or datetime.now()
+    row = session.execute(summary_query(now)).one()._mapping
+    return {
+        "visits_today": row["visits_today"],
+        "visits_yesterday": row["visits_yesterday"],
+        "last_visit": row["last_visit"],
+        "sites_today": row["sites_today"],
+        "uptime": 100.0 * (1 - row["failed"] / row["checks"]) if row["checks"] else None,
+        "previous_uptime": (
+            100.0 * (1 - row["previous_failed"] / row["previous_checks"]) if row["previous_checks"] else None
+        ),
+        "checks": row["checks"],
+        "active_projects": row["active_projects"],
+        "projects_due_this_week": row["projects_due_this_week"],
+        "outstanding": row["outstanding"],
+        "outstanding_cents": row["outstanding_cents"],
+        "overdue": row["overdue"],
+        "computed_at": now,
+        "seconds": None
+    }
+
+def get_home_summary(session):
+    """The home page numbers, computed at most once per HOME_SUMMARY_TTL seconds.
+
+    The returned dict is shared between callers and must not be mutated.
+    """
+    summary = _summary_cache.get("home")
+    if summary is not None:
+        return summary
+    with _compute_lock:
+        # Another thread may have computed it while this one waited
+        summary = _summary_cache.get("home")
+        if summary is None:
+            start = time.perf_counter()
+            summary = load_home_summary(session)
+            summary["seconds"] = time.perf_counter() - start
+            _summary_cache.set("home", summary)
+    return summary
+
+def get_summary_cache_stats():
+    return _summary_cache.stats()
+
+def clear_summary_cache():
+    _summary_cache.clear()
@@ -0,0 +1,424 @@
+# utils/ingest.py
+"""
+Pageview ingestion service for the CodRon JavaScript tracker.
+
+The service is a plain ASGI application, so any ASGI server can host it:
+
+    python -m utils.ingest            # uses uvicorn
+    uvicorn utils.ingest:app --port 8502
+    python -m utils.ingest --replay   # write the dead-lettered batches
+
+Beacons are validated, put on a bounded in-memory queue and written to
+page_visits by a single writer task using group commits. Each batch gets
+its browser, OS, device and country from utils.enrichment on the way.
+
+Beacons are acknowledged before they are written. A batch that finds the
+database locked (a rollup rebuild or an archive run can hold the write
+lock for longer than the busy timeout) is retried with exponential
+backoff. Batches that still cannot be written are saved as JSON files in
+INGEST_DEAD_LETTER_DIR and listed on /health. The writer replays them
+when it starts, and so does ``--replay``; each file is deleted once its
+rows are written.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from config import (
+    INGEST_HOST,
+    INGEST_PORT,
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL_MS,
+    INGEST_QUEUE_SIZE,
+    INGEST_MAX_BODY_BYTES,
+    INGEST_WRITE_RETRIES,
+    INGEST_RETRY_BACKOFF,
+    INGEST_DEAD_LETTER_DIR
+)
+from utils.db_utils import init_db, PageVisit
+from utils.dimensions import interner
+from utils.enrichment import enricher
+
+# Maximum number of events accepted in one batched beacon
+MAX_EVENTS_PER_REQUEST = 500
+
+# Column sizes from the page_visits schema
+_MAX_LENGTHS = {"url": 255, "path": 255, "referrer": 255, "user_agent": 255, "ip_address": 50}
+
+TRACKER_JS = """
+(function(w, d) {
+  var endpoint = (d.currentScript && d.currentScript.src || '').replace(/tracker\\.js.*$/, 'collect');
+  function send(event) {
+    var body = JSON.stringify(event);
+    if (!(navigator.sendBeacon && navigator.sendBeacon(endpoint, body))) {
+      fetch(endpoint, {method: 'POST', body: body, keepalive: true});
+    }
+  }
+  function track(type) {
+    if (type !== 'pageview') return;
+    send({type: 'pageview', url: w.location.origin, path: w.location.pathname, referrer: d.referrer || null});
+  }
+  var queued = (w.codronTracker && w.codronTracker.q) || [];
+  w.codronTracker = function() { track.apply(null, arguments); };
+  for (var i = 0; i < queued.length; i++) track.apply(null, queued[i]);
+})(window, document);
+"""
+
+def _clean(value, field):
+    """Coerce an optional beacon field to a bounded string"""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' must be a string")
+    return value[:_MAX_LENGTHS[field]]
+
+def parse_beacon(body, user_agent=None, ip_address=None, received_at=None):
+    """Turn a beacon body into page_visits rows.
+
+    Accepts a single event object, a list of events or {"events": [...]}.
+    Raises ValueError for malformed payloads.
+    """
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Body is not valid JSON")
+
+    if isinstance(payload, dict) and "events" in payload:
+        payload = payload["events"]
+    events = payload if isinstance(payload, list) else [payload]
+    if not events:
+        raise ValueError("No events in request")
+    if len(events) > MAX_EVENTS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_EVENTS_PER_REQUEST} events per request")
+
+    received_at = received_at or datetime.now()
+    user_agent = _clean(user_agent, "user_agent")
+    rows = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError("Events must be JSON objects")
+        if event.get("type", "pageview") != "pageview":
+            raise ValueError(f"Unsupported event type: {event.get('type')!r}")
+        url = _clean(event.get("url"), "url")
+        path = _clean(event.get("path"), "path") or "/"
+        if url is None:
+            raise ValueError("'url' is required")
+        rows.append({
+            "url": url,
+            "path": path,
+            "referrer": _clean(event.get("referrer"), "referrer"),
+            "ip_address": _clean(ip_address, "ip_address"),
+            # Filled in by the writer, off the event loop
+            "location": None,
+            "device": None,
+            "user_agent": user_agent,
+            "timestamp": received_at
+        })
+    return rows
+
+def write_visits(engine, rows):
+    """Enrich and insert page_visits rows in one transaction"""
+    rows = enricher.enrich(rows)
+    # Attribute values become dimension ids first; known values come from
+    # the interner's cache without touching the database.
+    rows = interner.encode(engine, rows)
+    # One Core INSERT executed for the whole batch in a single transaction.
+    # Passing the rows as executemany parameters is several times faster on
+    # SQLite than compiling a multi-row VALUES clause for every batch.
+    with engine.begin() as conn:
+        conn.execute(insert(PageVisit.__table__), rows)
+
+# Dead letters: batches the writer gave up on, one JSON file each
+
+def save_dead_letter(rows, error, directory=INGEST_DEAD_LETTER_DIR):
+    """Save a batch that could not be written. Returns the file's path."""
+    directory.mkdir(parents=True, exist_ok=True)
+    failed_at = datetime.now()
+    path = directory / f"{failed_at:%Y%m%dT%H%M%S%f}-{os.getpid()}.json"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"failed_at": failed_at.isoformat(sep=" "), "error": error, "rows": rows}, f, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+def load_dead_letter(path):
+    """The failed_at, error and rows of a saved batch"""
+    with open(path) as f:
+        letter = json.load(f)
+    for row in letter["rows"]:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return letter
+
+def dead_letter_files(directory=INGEST_DEAD_LETTER_DIR):
+    """Saved batches, oldest first"""
+    return sorted(directory.glob("*.json")) if directory.exists() else []
+
+def replay_dead_letters(engine=None, directory=INGEST_DEAD_LETTER_DIR):
+    """Write the saved batches to page_visits, oldest first, deleting each
+    file once its rows are committed. Stops at the first batch that still
+    fails. Returns the number of rows written.
+
+    A crash between the commit and the delete replays that batch again.
+    """
+    engine = engine or init_db()
+    written = 0
+    for path in dead_letter_files(directory):
+        rows = load_dead_letter(path)["rows"]
+        write_visits(engine, rows)
+        path.unlink()
+        written += len(rows)
+    return written
+
+class QueueFullError(Exception):
+    """Raised when the ingest queue cannot take more events"""
+
+def is_transient(exc):
+    """Whether a failed write may succeed if tried again later"""
+    return isinstance(exc, OperationalError) and any(
+        reason in str(exc.orig).lower() for reason in ("database is locked", "database is busy")
+    )
+
+class BatchWriter:
+    """Group-commits queued rows to page_visits from a single writer task.
+
+    A batch is written when it reaches ``batch_size`` rows or when the oldest
+    queued row has waited ``flush_interval_ms``, whichever comes first.
+    """
+
+    def __init__(self, engine, batch_size=INGEST_BATCH_SIZE,
+                 flush_interval_ms=INGEST_FLUSH_INTERVAL_MS, queue_size=INGEST_QUEUE_SIZE,
+                 retries=INGEST_WRITE_RETRIES, retry_backoff=INGEST_RETRY_BACKOFF,
+                 dead_letter_dir=INGEST_DEAD_LETTER_DIR):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_dir = dead_letter_dir
+        self.stats = {
+            "accepted": 0, "rejected": 0, "written": 0, "batches": 0, "retries": 0, "errors": 0,
+            "dead_lettered": 0, "replayed": 0
+        }
+        # Seconds from enqueue to commit for the most recently written rows
+        self.write_latencies = deque(maxlen=100_000)
+        self._task = None
+
+    def submit(self, rows):
+        """Queue rows for writing. All or none are accepted."""
+        if self.queue.maxsize - self.queue.qsize() < len(rows):
+            self.stats["rejected"] += len(rows)
+            raise QueueFullError("Ingest queue is full")
+        enqueued_at = time.perf_counter()
+        for row in rows:
+            self.queue.put_nowait((row, enqueued_at))
+        self.stats["accepted"] += len(rows)
+
+    async def start(self):
+        if self._task is None:
+            # Batches saved by an earlier run go first
+            try:
+                self.stats["replayed"] += await asyncio.to_thread(replay_dead_letters, self.engine, self.dead_letter_dir)
+            except Exception as exc:
+                print(f"Could not replay the dead-lettered page visits yet: {exc}", file=sys.stderr)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the writer task"""
+        if self._task is not None:
+            await self.queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            # Take whatever is already queued without waiting
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _write(self, rows):
+        write_visits(self.engine, rows)
+
+    async def _write_with_retries(self, rows):
+        """Write rows, retrying while the database is locked"""
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.to_thread(self._write, rows)
+                return
+            except Exception as exc:
+                if attempt == self.retries or not is_transient(exc):
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    def dead_letter_summary(self):
+        """The saved batches not replayed yet as JSON-friendly dicts, oldest first"""
+        summary = []
+        for path in dead_letter_files(self.dead_letter_dir):
+            letter = load_dead_letter(path)
+            summary.append({"file": path.name, "failed_at": letter["failed_at"], "rows": len(letter["rows"]), "error": letter["error"]})
+        return summary
+
+    def _dead_letter(self, rows, exc):
+        # The driver's message only, without the SQL and its parameters
+        reason = getattr(exc, "orig", None) or exc
+        error = f"{type(reason).__name__}: {reason}"[:500]
+        try:
+            path = save_dead_letter(rows, error, self.dead_letter_dir)
+        except OSError as save_exc:
+            print(f"Lost {len(rows)} page visits: {error}; could not save them: {save_exc}", file=sys.stderr)
+            return
+        self.stats["dead_lettered"] += len(rows)
+        print(f"Failed to write {len(rows)} page visits, saved to {path}: {error}", file=sys.stderr)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            rows = [row for row, _ in batch]
+            try:
+                await self._write_with_retries(rows)
+                committed_at = time.perf_counter()
+                self.write_latencies.extend(committed_at - enqueued_at for _, enqueued_at in batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            except Exception as exc:
+                self.stats["errors"] += len(batch)
+                await asyncio.to_thread(self._dead_letter, rows, exc)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+class IngestApp:
+    """ASGI application exposing the tracker script and the collect endpoint"""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        # Concurrent first requests must not each start a writer
+        self._startup_lock = asyncio.Lock()
+
+    async def startup(self):
+        async with self._startup_lock:
+            if self.writer is None:
+                self.writer = BatchWriter(await asyncio.to_thread(init_db))
+            await self.writer.start()
+
+    async def shutdown(self):
+        if self.writer is not None:
+            await self.writer.stop()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        method, path = scope["method"], scope["path"]
+        if method == "OPTIONS":
+            await _respond(send, 204, b"")
+        elif path == "/collect" and method == "POST":
+            await self._collect(scope, receive, send)
+        elif path == "/tracker.js" and method == "GET":
+            await _respond(send, 200, TRACKER_JS.encode(), "application/javascript")
+        elif path == "/health" and method == "GET":
+            health = dict(
+                self.writer.stats,
+                queued=self.writer.queue.qsize(),
+                dead_letters=self.writer.dead_letter_summary()
+            ) if self.writer else {}
+            await _respond(send, 200, json.dumps(health).encode(), "application/json")
+        else:
+            await _respond(send, 404, b"Not found")
+
+    async def _collect(self, scope, receive, send):
+        if self.writer is None:
+            await self.startup()
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > INGEST_MAX_BODY_BYTES:
+                await _respond(send, 413, b"Request body too large")
+                return
+            if not message.get("more_body"):
+                break
+
+        headers = dict(scope.get("headers") or [])
+        user_agent = headers.get(b"user-agent", b"").decode("latin-1") or None
+        client = scope.get("client")
+        try:
+            rows = parse_beacon(body, user_agent, client[0] if client else None)
+            self.writer.submit(rows)
+        except ValueError as exc:
+            await _respond(send, 400, str(exc).encode())
+            return
+        except QueueFullError:
+            # Backpressure: ask the client to retry instead of buffering without bound
+            await _respond(send, 503, b"Busy, retry later", extra_headers=[(b"retry-after", b"1")])
+            return
+        await _respond(send, 202, b"")
+
+async def _respond(send, status, body, content_type="text/plain", extra_headers=()):
+    headers = [
+        (b"content-type", content_type.encode()),
+        (b"content-length", str(len(body)).encode()),
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+        (b"access-control-allow-headers", b"content-type"),
+        *extra_headers
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+app = IngestApp()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.ingest", description="Pageview ingest service.")
+    parser.add_argument("--replay", action="store_true", help="write the dead-lettered batches and exit")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        files = len(dead_letter_files())
+        print(f"Replayed {replay_dead_letters():,} page visits from {files} dead-lettered batches.")
+        return
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("Running the ingest service requires uvicorn: pip install uvicorn")
+    uvicorn.run(app, host=INGEST_HOST, port=INGEST_PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# utils/instrumentation.py
+"""
+Timing instrumentation for the dashboard.
+
+Timings are recorded by kind and name:
+- "rerun": a whole run of app.py
+- "section": a dashboard section's render function
+- "query": every SQL statement, through SQLAlchemy cursor events, named
+  by its verb and first table ("SELECT page_visits")
+- "chart": a chart drawn by utils.charts.show_chart
+- "auth": password hashing and login checks
+- "assistant": time to the first chunk of an AI Assistant answer, and
+  to the whole answer (utils/assistant.py)
+
+Each timing goes into a ring buffer of the most recent ones and into a
+cumulative histogram per (kind, name). The hidden Diagnostics page shows
+both and exports the histograms in the Prometheus text format.
+
+With CODRON_PROFILE_RERUN=cprofile (or pyinstrument, if installed) the
+next rerun of app.py is profiled and the profile saved in DIAGNOSTICS_DIR.
+
+    with timed("section", "Reports"):
+        render()
+
+    @timed("auth", "authenticate")
+    def authenticate(username, password): ...
+"""
+import bisect
+import functools
+import math
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import (
+    INSTRUMENTATION_ENABLED,
+    INSTRUMENTATION_BUFFER_SIZE,
+    INSTRUMENTATION_BUCKETS,
+    RERUN_PROFILER,
+    DIAGNOSTICS_DIR
+)
+
+RERUN_PROFILERS = ["cprofile", "pyinstrument"]
+
+class Histogram:
+    """Counts of timings at or below each bucket bound, plus their sum and maximum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One count per bound and a last one for larger timings (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction):
+        """Estimated quantile, interpolated within its bucket like Prometheus' histogram_quantile"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.max
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = min(self.bounds[index], self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+class Timings:
+    """Thread-safe ring buffer and histograms of recorded timings"""
+
+    def __init__(self, size=INSTRUMENTATION_BUFFER_SIZE, bounds=INSTRUMENTATION_BUCKETS):
+        self.bounds = tuple(bounds)
+        self._recent = deque(maxlen=size)
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, kind, name, seconds, detail=None):
+        with self._lock:
+            self._recent.append((time.time(), kind, name, seconds, detail))
+            histogram = self._histograms.get((kind, name))
+            if histogram is None:
+                histogram = self._histograms[(kind, name)] = Histogram(self.bounds)
+            histogram.observe(seconds)
+
+    def recent(self, limit=None, kind=None):
+        """(timestamp, kind, name, seconds, detail) of the latest timings, newest first"""
+        with self._lock:
+            items = list(self._recent)
+        items.reverse()
+        if kind is not None:
+            items = [item for item in items if item[1] == kind]
+        return items[:limit]
+
+    def summary(self):
+        """One dict per (kind, name): count, total, mean, p50, p95, p99 and max seconds"""
+        with self._lock:
+            rows = [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "count": histogram.count,
+                    "total": histogram.sum,
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "max": histogram.max
+                }
+                for (kind, name), histogram in self._histograms.items()
+            ]
+        rows.sort(key=lambda row: -row["total"])
+        return rows
+
+    def prometheus_text(self):
+        """The histograms in the Prometheus text exposition format"""
+        lines = [
+            "# HELP codron_duration_seconds Time spent in instrumented dashboard operations.",
+            "# TYPE codron_duration_seconds histogram"
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            for (kind, name), histogram in histograms:
+                labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+                cumulative = 0
+                for bound, count in zip(self.bounds + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    lines.append(f'codron_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"codron_duration_seconds_sum{{{labels}}} {histogram.sum!r}")
+                lines.append(f"codron_duration_seconds_count{{{labels}}} {histogram.count}")
+        lines += [
+            "# HELP codron_process_start_time_seconds Start time of the process since the Unix epoch.",
+            "# TYPE codron_process_start_time_seconds gauge",
+            f"codron_process_start_time_seconds {self.started_at!r}"
+        ]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._histograms.clear()
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Shared by all sessions and threads of the process
+timings = Timings()
+
+@contextmanager
+def timed(kind, name, detail=None):
+    """Record how long the block (or decorated function) takes, even if it raises"""
+    if not INSTRUMENTATION_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(kind, name, time.perf_counter() - start, detail)
+
+# SQL statements
+
+_STATEMENT_TABLE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?[\"`\[]?(\w+)", re.IGNORECASE
+)
+
+def query_name(statement):
+    """Short, low-cardinality name of a SQL statement: its verb and first table"""
+    words = statement.split(None, 1)
+    if not words:
+        return "EMPTY"
+    verb = words[0].upper()
+    match = _STATEMENT_TABLE.search(statement)
+    return f"{verb} {match.group(1)}" if match else verb
+
+# Statements mostly come from SQLAlchemy's compiled cache, so the same few
+# hundred strings are described over and over
+@functools.lru_cache(maxsize=1024)
+def _describe(statement):
+    return query_name(statement), " ".join(statement.split())[:300]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The execution context lives for one statement; a failed statement
+    # never reaches after_cursor_execute and its context is dropped
+    context._codron_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._codron_started
+    name, detail = _describe(statement)
+    timings.record("query", name, seconds, detail)
+
+def instrument_engine(engine):
+    """Time every statement executed through engine"""
+    from sqlalchemy import event
+
+    if not INSTRUMENTATION_ENABLED or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+# Profiles of single reruns
+
+_profile_lock = threading.Lock()
+# Reruns left to profile: the first one when the env var is set, more
+# when the Diagnostics page asks for them
+_profiles_pending = 1 if RERUN_PROFILER else 0
+
+def request_rerun_profile():
+    """Profile the next rerun of app.py with RERUN_PROFILER"""
+    global _profiles_pending
+    if RERUN_PROFILER not in RERUN_PROFILERS:
+        raise ValueError(f"Set CODRON_PROFILE_RERUN to one of {', '.join(RERUN_PROFILERS)}")
+    with _profile_lock:
+        _profiles_pending = 1
+
+def _take_profile_request():
+    global _profiles_pending
+    with _profile_lock:
+        if not _profiles_pending:
+            return False
+        _profiles_pending -= 1
+        return True
+
+@contextmanager
+def profile_rerun(label="rerun"):
+    """Profile the block if a rerun profile is pending; saves it in DIAGNOSTICS_DIR"""
+    if RERUN_PROFILER not in RERUN_PROFILERS or not _take_profile_request():
+        yield
+        return
+    DIAGNOSTICS_DIR.mkdir(parents=True, exist_ok=True)
+    path = DIAGNOSTICS_DIR / f"{label}-{datetime.now():%Y%m%d-%H%M%S}"
+    if RERUN_PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path.with_suffix(".html").write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path.with_suffix(".prof"))
+
+def rerun_profiles():
+    """Saved rerun profiles, newest first"""
+    if not DIAGNOSTICS_DIR.exists():
+        return []
+    return sorted(
+        (path for path in DIAGNOSTICS_DIR.iterdir() if path.suffix in (".prof", ".html")),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True
+    )
+
+def profile_summary(path, limit=30):
+    """The functions with the most cumulative time in a cProfile file, as text"""
+    import io
+    import pstats
+
+    buffer = io.StringIO()
+    pstats.Stats(str(path), stream=buffer).sort_stats("cumulative").print_stats(limit)
+    return buffer.getvalue()
@@ -0,0 +1,327 @@
+# utils/invoices.py
+"""
+Clients, projects and invoices of the Invoice & Project Tracker.
+
+Amounts are integer cents. An invoice's total_cents changes in the same
+transaction as its lines, so readers never add up lines. The outstanding,
+overdue and due-this-week totals are range sums over the
+(status, due_on, total_cents) index, which they read without touching
+the invoices themselves. Outstanding is overdue plus not yet due, so
+each index entry is read once.
+
+Lists are keyset-paginated like the visit explorer, so the last page
+costs the same as the first:
+
+    rows, cursor = list_invoices(session, status="sent")
+    rows, cursor = list_invoices(session, status="sent", after=cursor)  # next page
+
+    python -m utils.invoices --check   # compare every invoice total with its lines
+"""
+import argparse
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select, tuple_, update
+
+from config import INVOICE_PAGE_SIZE, INVOICE_DUE_DAYS, INVOICE_CURRENCY
+from utils.db_utils import init_db, session_scope, Client, Project, Invoice, InvoiceLine
+
+INVOICE_STATUSES = ("draft", "sent", "paid", "void")
+PROJECT_STATUSES = ("active", "on_hold", "completed")
+
+# Status of invoices waiting to be paid
+OUTSTANDING = "sent"
+
+INVOICE_COLUMNS = ["ID", "Number", "Client", "Project", "Status", "Issued", "Due", "Paid", "Total"]
+PROJECT_COLUMNS = ["ID", "Project", "Client", "Status", "Due"]
+LINE_COLUMNS = ["ID", "Description", "Quantity", "Unit price", "Amount"]
+
+def format_money(cents):
+    return f"{INVOICE_CURRENCY}{cents / 100:,.2f}"
+
+def _line(description, quantity, unit_price_cents):
+    description = (description or "").strip()
+    if not description:
+        raise ValueError("Invoice lines need a description")
+    if quantity <= 0:
+        raise ValueError("Quantities must be positive")
+    return {
+        "description": description,
+        "quantity": quantity,
+        "unit_price_cents": unit_price_cents,
+        "amount_cents": round(quantity * unit_price_cents)
+    }
+
+# Writes. Each runs in its own transaction, like utils.uptime's.
+
+def add_client(name, email=None, engine=None):
+    """Add a client. Returns its id."""
+    name = name.strip()
+    if not name:
+        raise ValueError("Clients need a name")
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        if conn.execute(select(Client.id).where(Client.name == name)).first():
+            raise ValueError(f"There is a client named {name} already")
+        return conn.execute(
+            insert(Client).values(name=name, email=email or None, created_at=datetime.now())
+        ).inserted_primary_key[0]
+
+def add_project(client_id, name, due_on=None, engine=None):
+    """Add an active project of a client. Returns its id."""
+    name = name.strip()
+    if not name:
+        raise ValueError("Projects need a name")
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        return conn.execute(insert(Project).values(
+            client_id=client_id, name=name, status="active", due_on=due_on, created_at=datetime.now()
+        )).inserted_primary_key[0]
+
+def set_project_status(project_id, status, engine=None):
+    if status not in PROJECT_STATUSES:
+        raise ValueError(f"Unknown project status: {status}")
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        conn.execute(update(Project).where(Project.id == project_id).values(status=status))
+
+def create_invoice(client_id, lines=(), project_id=None, issued_on=None, due_on=None, engine=None):
+    """Create a draft invoice from (description, quantity, unit_price_cents) lines.
+
+    It is due INVOICE_DUE_DAYS after it is issued unless ``due_on`` is
+    given, and numbered INV-<id>. Returns its id.
+    """
+    issued_on = issued_on or date.today()
+    due_on = due_on or issued_on + timedelta(days=INVOICE_DUE_DAYS)
+    if due_on < issued_on:
+        raise ValueError("Invoices cannot be due before they are issued")
+    lines = [_line(*line) for line in lines]
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        invoice_id = conn.execute(insert(Invoice).values(
+            # Replaced below, once the id is known
+            number=uuid.uuid4().hex,
+            client_id=client_id,
+            project_id=project_id,
+            status="draft",
+            issued_on=issued_on,
+            due_on=due_on,
+            total_cents=sum(line["amount_cents"] for line in lines),
+            created_at=datetime.now()
+        )).inserted_primary_key[0]
+        conn.execute(update(Invoice).where(Invoice.id == invoice_id).values(number=f"INV-{invoice_id:06d}"))
+        if lines:
+            conn.execute(insert(InvoiceLine), [dict(line, invoice_id=invoice_id) for line in lines])
+    return invoice_id
+
+def _change_draft_total(conn, invoice_id, cents):
+    # Changing the total first checks the status and takes the write lock
+    # in the same statement
+    updated = conn.execute(
+        update(Invoice).where(Invoice.id == invoice_id, Invoice.status == "draft")
+        .values(total_cents=Invoice.total_cents + cents)
+    ).rowcount
+    if not updated:
+        raise ValueError("Only draft invoices can be changed")
+
+def add_invoice_line(invoice_id, description, quantity, unit_price_cents, engine=None):
+    """Add a line to a draft invoice and its amount to the invoice's total. Returns the line's id."""
+    line = _line(description, quantity, unit_price_cents)
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        _change_draft_total(conn, invoice_id, line["amount_cents"])
+        return conn.execute(insert(InvoiceLine).values(invoice_id=invoice_id, **line)).inserted_primary_key[0]
+
+def remove_invoice_line(line_id, engine=None):
+    """Remove a line of a draft invoice and take its amount off the total"""
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        line = conn.execute(
+            select(InvoiceLine.invoice_id, InvoiceLine.amount_cents).where(InvoiceLine.id == line_id)
+        ).first()
+        if line is None:
+            raise ValueError("No such invoice line")
+        _change_draft_total(conn, line.invoice_id, -line.amount_cents)
+        conn.execute(delete(InvoiceLine).where(InvoiceLine.id == line_id))
+
+def set_invoice_status(invoice_id, status, paid_on=None, engine=None):
+    """Move an invoice to another status; paid ones are paid on ``paid_on``, today by default"""
+    if status not in INVOICE_STATUSES:
+        raise ValueError(f"Unknown invoice status: {status}")
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        conn.execute(update(Invoice).where(Invoice.id == invoice_id).values(
+            status=status, paid_on=(paid_on or date.today()) if status == "paid" else None
+        ))
+
+# Reads
+
+def _totals(name, *conditions):
+    """One-row subquery of the count (``name``) and total (``<name>_cents``) of matching invoices"""
+    return select(
+        func.count().label(name),
+        func.coalesce(func.sum(Invoice.total_cents), 0).label(f"{name}_cents")
+    ).where(*conditions).subquery(name)
+
+def summary_query(today):
+    """The tracker numbers as one statement returning one row"""
+    outstanding = Invoice.status == OUTSTANDING
+    overdue = _totals("overdue", outstanding, Invoice.due_on < today)
+    upcoming = _totals("upcoming", outstanding, Invoice.due_on >= today)
+    week = _totals("due_this_week", outstanding, Invoice.due_on >= today, Invoice.due_on < today + timedelta(days=7))
+    return select(
+        (overdue.c.overdue + upcoming.c.upcoming).label("outstanding"),
+        (overdue.c.overdue_cents + upcoming.c.upcoming_cents).label("outstanding_cents"),
+        overdue.c.overdue,
+        overdue.c.overdue_cents,
+        week.c.due_this_week,
+        week.c.due_this_week_cents,
+        select(func.count()).where(Invoice.status == "draft").scalar_subquery().label("drafts"),
+        select(func.count()).select_from(Project).where(Project.status == "active").scalar_subquery()
+        .label("active_projects")
+    ).select_from(overdue.join(upcoming, literal(True)).join(week, literal(True)))
+
+def get_invoice_summary(session, today=None):
+    """Counts and totals (in cents) of outstanding, overdue and due-this-week
+    invoices, the number of drafts and of active projects, as a dict.
+
+    Overdue invoices were due before ``today``; due this week means in the
+    seven days from ``today``.
+    """
+    return dict(session.execute(summary_query(today or date.today())).one()._mapping)
+
+def get_period_totals(session, start, end):
+    """Invoices issued and paid on the days in [start, end), as
+    {"issued": (count, cents), "paid": (count, cents)}; void ones are left out.
+    """
+    def totals(column):
+        return tuple(session.execute(
+            select(func.count(), func.coalesce(func.sum(Invoice.total_cents), 0))
+            .where(column >= start, column < end, Invoice.status != "void")
+        ).one())
+    return {"issued": totals(Invoice.issued_on), "paid": totals(Invoice.paid_on)}
+
+def _page(rows, page_size, key):
+    if len(rows) > page_size:
+        return rows[:page_size], key(rows[page_size - 1])
+    return rows, None
+
+def list_invoices(session, status=None, client_id=None, due_before=None, descending=False, after=None,
+                  page_size=INVOICE_PAGE_SIZE):
+    """One page of invoices by due date, as tuples in INVOICE_COLUMNS order.
+
+    ``after`` is the cursor returned for the previous page. Returns
+    ``(rows, cursor)`` where ``cursor`` is None on the last page.
+    """
+    query = (
+        select(
+            Invoice.id, Invoice.number, Client.name, Project.name, Invoice.status,
+            Invoice.issued_on, Invoice.due_on, Invoice.paid_on, Invoice.total_cents
+        )
+        .select_from(Invoice)
+        .join(Client, Client.id == Invoice.client_id)
+        .outerjoin(Project, Project.id == Invoice.project_id)
+    )
+    if status:
+        query = query.where(Invoice.status == status)
+    if client_id:
+        query = query.where(Invoice.client_id == client_id)
+    if due_before:
+        query = query.where(Invoice.due_on < due_before)
+    if after is not None:
+        # The bound on due_on alone lets SQLite seek the index to the cursor
+        position = tuple_(Invoice.due_on, Invoice.id)
+        if descending:
+            query = query.where(Invoice.due_on <= after[0], position < tuple(after))
+        else:
+            query = query.where(Invoice.due_on >= after[0], position > tuple(after))
+    order = (Invoice.due_on.desc(), Invoice.id.desc()) if descending else (Invoice.due_on, Invoice.id)
+    rows = [tuple(row) for row in session.execute(query.order_by(*order).limit(page_size + 1))]
+    return _page(rows, page_size, lambda row: (row[6], row[0]))
+
+def list_projects(session, status=None, client_id=None, after=None, page_size=INVOICE_PAGE_SIZE):
+    """One page of projects, newest first, as tuples in PROJECT_COLUMNS order.
+
+    Returns ``(rows, cursor)`` like list_invoices().
+    """
+    query = (
+        select(Project.id, Project.name, Client.name, Project.status, Project.due_on)
+        .select_from(Project)
+        .join(Client, Client.id == Project.client_id)
+    )
+    if status:
+        query = query.where(Project.status == status)
+    if client_id:
+        query = query.where(Project.client_id == client_id)
+    if after is not None:
+        query = query.where(Project.id < after)
+    rows = [tuple(row) for row in session.execute(query.order_by(Project.id.desc()).limit(page_size + 1))]
+    return _page(rows, page_size, lambda row: row[0])
+
+def get_clients(session):
+    """(id, name) of every client, by name"""
+    return [tuple(row) for row in session.execute(select(Client.id, Client.name).order_by(Client.name))]
+
+def get_projects(session, client_id=None):
+    """(id, client name, project name) of the active and on-hold projects"""
+    query = (
+        select(Project.id, Client.name, Project.name)
+        .join(Client, Client.id == Project.client_id)
+        .where(Project.status != "completed")
+        .order_by(Client.name, Project.name)
+    )
+    if client_id:
+        query = query.where(Project.client_id == client_id)
+    return [tuple(row) for row in session.execute(query)]
+
+def get_invoice(session, number):
+    """(invoice as a dict, lines as tuples in LINE_COLUMNS order), or None for an unknown number"""
+    invoice = session.execute(
+        select(Invoice.id, Invoice.number, Invoice.status, Invoice.total_cents).where(Invoice.number == number)
+    ).first()
+    if invoice is None:
+        return None
+    lines = session.execute(
+        select(
+            InvoiceLine.id, InvoiceLine.description, InvoiceLine.quantity,
+            InvoiceLine.unit_price_cents, InvoiceLine.amount_cents
+        ).where(InvoiceLine.invoice_id == invoice.id).order_by(InvoiceLine.id)
+    )
+    return dict(invoice._mapping), [tuple(line) for line in lines]
+
+def check_totals(session):
+    """Ids of invoices whose total differs from the sum of their lines"""
+    lines = (
+        select(InvoiceLine.invoice_id, func.sum(InvoiceLine.amount_cents).label("cents"))
+        .group_by(InvoiceLine.invoice_id)
+        .subquery()
+    )
+    return list(session.execute(
+        select(Invoice.id)
+        .outerjoin(lines, lines.c.invoice_id == Invoice.id)
+        .where(Invoice.total_cents != func.coalesce(lines.c.cents, 0))
+    ).scalars())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.invoices", description="Invoice & Project Tracker.")
+    parser.add_argument("--check", action="store_true", help="compare every invoice total with its lines")
+    args = parser.parse_args(argv)
+
+    init_db()
+    with session_scope() as session:
+        if args.check:
+            mismatched = check_totals(session)
+            if mismatched:
+                sys.exit(f"{len(mismatched):,} invoice totals differ from their lines: {mismatched[:20]}")
+            print("Every invoice total matches its lines.")
+            return
+        summary = get_invoice_summary(session)
+    print(
+        f"{summary['outstanding']:,} outstanding invoices ({format_money(summary['outstanding_cents'])}), "
+        f"{summary['overdue']:,} overdue ({format_money(summary['overdue_cents'])}), "
+        f"{summary['active_projects']:,} active projects"
+    )
+
+if __name__ == "__main__":
+    main()
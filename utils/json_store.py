@@ -0,0 +1,132 @@
+# utils/json_store.py
+"""
+Small JSON files shared by every Streamlit session (settings, users).
+
+- Writes go to a temporary file in the same directory that is then renamed
+  over the original, so readers see either the old or the new file, never
+  a partly written one.
+- Writers take an exclusive lock on a ``<name>.lock`` file next to the
+  store, which serializes read-modify-write updates across threads and
+  processes.
+- Parsed contents are cached per process and reused until the file's
+  inode, mtime or size changes.
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive inter-process lock on lock_path, held for the block"""
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            # LK_LOCK retries for ~10 s before giving up, so keep trying
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class JsonStore:
+    """A JSON document in a file, safe to share between sessions and processes.
+
+    ``default`` is a function returning the contents of a missing file.
+    """
+
+    def __init__(self, path, default=dict):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.default = default
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_stamp = None
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self):
+        """Parsed contents, from the cache when the file has not changed"""
+        stamp = self._stamp()
+        if stamp is None:
+            return self.default()
+        if stamp != self._cached_stamp:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._cached, self._cached_stamp = data, stamp
+        return self._cached
+
+    def exists(self):
+        return self.path.exists()
+
+    def read(self, copy_result=True):
+        """Current contents of the store.
+
+        Pass ``copy_result=False`` to get the cached object itself, which is
+        faster for large files but must not be modified.
+        """
+        with self._lock:
+            data = self._load()
+        return copy.deepcopy(data) if copy_result else data
+
+    def _write(self, data):
+        """Atomically replace the file and cache ``data``.
+
+        The store takes ownership of ``data``. The caller holds both locks.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._cached, self._cached_stamp = data, self._stamp()
+
+    def write(self, data):
+        """Replace the contents of the store"""
+        with self._lock, file_lock(self.lock_path):
+            self._write(copy.deepcopy(data))
+
+    def update(self, change):
+        """Read-modify-write under the lock.
+
+        ``change`` receives a copy of the current contents and returns the
+        new contents, or None after modifying them in place. Raising an
+        exception in ``change`` leaves the store untouched.
+        """
+        with self._lock, file_lock(self.lock_path):
+            data = copy.deepcopy(self._load())
+            result = change(data)
+            self._write(data if result is None else result)
\ No newline at end of file
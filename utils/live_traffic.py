@@ -0,0 +1,191 @@
+# utils/live_traffic.py
+"""
+Running aggregates of the visits of the last few minutes, for the live
+view of the analytics page.
+
+One LiveTraffic per process keeps a cursor on the last page_visits id it
+has seen. refresh() fetches only the rows above it, by primary key, and
+folds them into a ring buffer of per-minute counters (visits, paths,
+referrers and devices, each per site). A refresh therefore costs in
+proportion to the new traffic, not to the size of the table, and however
+many sessions watch the live view, the rows are fetched once.
+
+The first refresh, and one that finds more than LIVE_MAX_BEHIND rows
+pending, rebuilds the window from the timestamp index instead.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+from config import LIVE_WINDOW_MINUTES, LIVE_REFRESH_SECONDS, LIVE_FETCH_BATCH, LIVE_MAX_BEHIND
+from utils.analytics_queries import DIRECT_REFERRER
+from utils.db_utils import PageVisit, VisitDetail
+
+EPOCH = datetime(1970, 1, 1)
+
+# Label of visits without a device
+UNKNOWN_DEVICE = "Unknown"
+
+def minute_number(timestamp):
+    """Minutes since the epoch of a naive timestamp"""
+    return int((timestamp - EPOCH).total_seconds() // 60)
+
+class MinuteCounters:
+    """Ring buffer of per-minute counters over the last ``minutes`` minutes.
+
+    Slot ``minute % minutes`` holds one minute's counters and is reset
+    when a later minute reuses it. Counters are keyed by (site, value).
+    """
+
+    FIELDS = ("paths", "referrers", "devices")
+
+    def __init__(self, minutes=LIVE_WINDOW_MINUTES):
+        self.minutes = minutes
+        self._slots = [None] * minutes
+
+    def _new_slot(self, minute):
+        return {"minute": minute, "visits": Counter(), **{field: Counter() for field in self.FIELDS}}
+
+    def add(self, minute, url, path, referrer, device, count=1):
+        """Count visits in a minute; visits older than every slot's minute are dropped"""
+        index = minute % self.minutes
+        slot = self._slots[index]
+        if slot is None or slot["minute"] < minute:
+            slot = self._slots[index] = self._new_slot(minute)
+        elif slot["minute"] > minute:
+            return False
+        slot["visits"][url] += count
+        slot["paths"][url, path] += count
+        slot["referrers"][url, referrer] += count
+        slot["devices"][url, device] += count
+        return True
+
+    def window(self, now_minute):
+        """Slots of the minutes in (now_minute - minutes, now_minute]"""
+        return [
+            slot for slot in self._slots
+            if slot is not None and now_minute - self.minutes < slot["minute"] <= now_minute
+        ]
+
+    def clear(self):
+        self._slots = [None] * self.minutes
+
+class LiveTraffic:
+    """Tails page_visits into MinuteCounters; shared by all sessions of the process"""
+
+    def __init__(self, minutes=LIVE_WINDOW_MINUTES, min_interval=LIVE_REFRESH_SECONDS / 2,
+                 batch=LIVE_FETCH_BATCH, max_behind=LIVE_MAX_BEHIND):
+        self.counters = MinuteCounters(minutes)
+        self.min_interval = min_interval
+        self.batch = batch
+        self.max_behind = max_behind
+        self.cursor = None
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.last_rows = 0
+        self.last_seconds = 0.0
+        self.last_rebuilt = False
+
+    def _fold(self, rows):
+        # Several visits of the same minute and attributes are counted at once
+        counts = Counter(
+            (minute_number(timestamp), url, path, referrer or DIRECT_REFERRER, device or UNKNOWN_DEVICE)
+            for _, url, path, referrer, device, timestamp in rows
+        )
+        for key, count in counts.items():
+            self.counters.add(*key, count=count)
+
+    def _columns(self):
+        return select(
+            VisitDetail.id, VisitDetail.url, VisitDetail.path, VisitDetail.referrer,
+            VisitDetail.device, VisitDetail.timestamp
+        )
+
+    def _rebuild(self, session, now):
+        """Count the window's visits from the timestamp index and move the cursor to the newest"""
+        high = session.execute(select(func.max(PageVisit.id))).scalar() or 0
+        start = now - timedelta(minutes=self.counters.minutes)
+        rows = session.execute(
+            self._columns().where(VisitDetail.timestamp >= start, VisitDetail.id <= high)
+        ).all()
+        self.counters.clear()
+        self._fold(rows)
+        self.cursor = high
+        return len(rows)
+
+    def _tail(self, session):
+        """Fold the rows above the cursor, one batch at a time in id order"""
+        fetched = 0
+        while True:
+            rows = session.execute(
+                self._columns().where(VisitDetail.id > self.cursor).order_by(VisitDetail.id).limit(self.batch)
+            ).all()
+            if not rows:
+                return fetched
+            self._fold(rows)
+            self.cursor = rows[-1][0]
+            fetched += len(rows)
+            if len(rows) < self.batch:
+                return fetched
+
+    def refresh(self, session, now=None, force=False):
+        """Fold new visits into the counters. Returns the number of rows read.
+
+        Calls within min_interval of the last refresh return 0 at once, so
+        sessions polling together cost one fetch.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.min_interval:
+                return 0
+            start = time.perf_counter()
+            rebuild = self.cursor is None
+            if not rebuild:
+                high = session.execute(select(func.max(PageVisit.id))).scalar() or 0
+                # The table was emptied or replaced, or too much is pending
+                rebuild = high < self.cursor or high - self.cursor > self.max_behind
+            rows = self._rebuild(session, now or datetime.now()) if rebuild else self._tail(session)
+            self._last_refresh = time.monotonic()
+            self.last_rows = rows
+            self.last_seconds = time.perf_counter() - start
+            self.last_rebuilt = rebuild
+            return rows
+
+    def snapshot(self, url=None, now=None, top=10):
+        """Aggregates of the window, for one site or all of them.
+
+        Returns {"per_minute": [(minute, visits)] oldest first with empty
+        minutes included, "visits": total, "paths", "referrers" and
+        "devices": [(value, visits)] most visited first, "cursor", and the
+        last refresh's "rows", "seconds" and "rebuilt"}.
+        """
+        now_minute = minute_number(now or datetime.now())
+        with self._lock:
+            slots = self.counters.window(now_minute)
+            per_minute = {}
+            totals = {field: Counter() for field in MinuteCounters.FIELDS}
+            for slot in slots:
+                per_minute[slot["minute"]] = (
+                    slot["visits"][url] if url else sum(slot["visits"].values())
+                )
+                for field in MinuteCounters.FIELDS:
+                    for (site, value), count in slot[field].items():
+                        if url is None or site == url:
+                            totals[field][value] += count
+            info = {
+                "cursor": self.cursor,
+                "rows": self.last_rows,
+                "seconds": self.last_seconds,
+                "rebuilt": self.last_rebuilt
+            }
+        minutes = range(now_minute - self.counters.minutes + 1, now_minute + 1)
+        return {
+            "per_minute": [(EPOCH + timedelta(minutes=minute), per_minute.get(minute, 0)) for minute in minutes],
+            "visits": sum(per_minute.values()),
+            **{field: totals[field].most_common(top) for field in MinuteCounters.FIELDS},
+            **info
+        }
+
+# Shared by all sessions of the Streamlit server
+live_traffic = LiveTraffic()
@@ -0,0 +1,480 @@
+# utils/migrations.py
+import re
+from datetime import datetime
+from sqlalchemy import text
+
+from config import PAGE_VISITS_REFERRER_DEVICE_INDEX
+
+# Ordered list of (version, description, function) tuples. Each function
+# receives a connection inside the transaction that records its version.
+MIGRATIONS = []
+
+# Versions whose new tables are filled by rebuilding the rollups once all
+# migrations have been applied
+REBUILDS_ROLLUPS = set()
+
+def migration(version, description, rebuild_rollups=False):
+    """Register a schema migration. Versions must be strictly increasing.
+
+    With ``rebuild_rollups`` the rollups and sketches are recomputed after
+    the upgrade, with the code and schema of the latest version.
+    """
+    def decorator(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append((version, description, func))
+        if rebuild_rollups:
+            REBUILDS_ROLLUPS.add(version)
+        return func
+    return decorator
+
+# Migrations use literal DDL instead of the ORM models so that they keep
+# describing the schema as it was at that version.
+
+@migration(1, "Create page_visits table")
+def _create_page_visits(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS page_visits (
+            id INTEGER NOT NULL,
+            url VARCHAR(255) NOT NULL,
+            path VARCHAR(255) NOT NULL,
+            referrer VARCHAR(255),
+            ip_address VARCHAR(50),
+            location VARCHAR(100),
+            device VARCHAR(100),
+            user_agent VARCHAR(255),
+            timestamp DATETIME,
+            PRIMARY KEY (id)
+        )
+    """))
+
+@migration(2, "Index page_visits for time-range, per-site and per-path filters")
+def _index_page_visits(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_timestamp ON page_visits (timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_url_timestamp ON page_visits (url, timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_path_timestamp ON page_visits (path, timestamp)"))
+
+def _create_rollup_table(conn, table):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER NOT NULL,
+            bucket DATETIME NOT NULL,
+            url VARCHAR(255) NOT NULL,
+            path VARCHAR(255) NOT NULL,
+            referrer VARCHAR(255) NOT NULL DEFAULT '',
+            device VARCHAR(100) NOT NULL DEFAULT '',
+            location VARCHAR(100) NOT NULL DEFAULT '',
+            visits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_{table}_key UNIQUE (bucket, url, path, referrer, device, location)
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_url_bucket ON {table} (url, bucket)"))
+
+@migration(3, "Add hourly and daily page visit rollups")
+def _create_rollups(conn):
+    _create_rollup_table(conn, "page_visit_rollups_hourly")
+    _create_rollup_table(conn, "page_visit_rollups_daily")
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name VARCHAR(50) NOT NULL,
+            last_visit_id INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME,
+            PRIMARY KEY (name)
+        )
+    """))
+    conn.execute(text("INSERT OR IGNORE INTO rollup_state (name, last_visit_id) VALUES ('page_visits', 0)"))
+
+@migration(4, "Add the manifest of archived page visit files")
+def _create_archive_manifest(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS page_visit_archive_files (
+            id INTEGER NOT NULL,
+            path VARCHAR(255) NOT NULL,
+            day VARCHAR(10) NOT NULL,
+            rows INTEGER NOT NULL,
+            min_visit_id INTEGER NOT NULL,
+            max_visit_id INTEGER NOT NULL,
+            min_timestamp DATETIME NOT NULL,
+            max_timestamp DATETIME NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_page_visit_archive_files_path UNIQUE (path)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_page_visit_archive_files_day ON page_visit_archive_files (day)"
+    ))
+
+# Attribute -> dimension table of its distinct values (migration 5)
+_DIMENSION_TABLES = {
+    "url": "visit_urls",
+    "path": "visit_paths",
+    "referrer": "visit_referrers",
+    "location": "visit_locations",
+    "device": "visit_devices",
+    "user_agent": "visit_user_agents"
+}
+
+@migration(5, "Store repeated page visit attributes in dimension tables")
+def _normalize_page_visits(conn):
+    for table in _DIMENSION_TABLES.values():
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER NOT NULL,
+                value VARCHAR(255) NOT NULL,
+                PRIMARY KEY (id),
+                CONSTRAINT uq_{table}_value UNIQUE (value)
+            )
+        """))
+
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(page_visits)"))}
+    if "url_id" not in columns:
+        for attribute, table in _DIMENSION_TABLES.items():
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {table} (value) "
+                f"SELECT DISTINCT {attribute} FROM page_visits WHERE {attribute} IS NOT NULL"
+            ))
+        # SQLite cannot change column types in place, so the table is rebuilt
+        # with the same ids
+        conn.execute(text("""
+            CREATE TABLE page_visits_normalized (
+                id INTEGER NOT NULL,
+                url_id INTEGER NOT NULL REFERENCES visit_urls (id),
+                path_id INTEGER NOT NULL REFERENCES visit_paths (id),
+                referrer_id INTEGER REFERENCES visit_referrers (id),
+                ip_address VARCHAR(50),
+                location_id INTEGER REFERENCES visit_locations (id),
+                device_id INTEGER REFERENCES visit_devices (id),
+                user_agent_id INTEGER REFERENCES visit_user_agents (id),
+                timestamp DATETIME,
+                PRIMARY KEY (id)
+            )
+        """))
+        conn.execute(text("""
+            INSERT INTO page_visits_normalized
+            SELECT v.id, u.id, p.id, r.id, v.ip_address, l.id, d.id, a.id, v.timestamp
+            FROM page_visits AS v
+            JOIN visit_urls AS u ON u.value = v.url
+            JOIN visit_paths AS p ON p.value = v.path
+            LEFT JOIN visit_referrers AS r ON r.value = v.referrer
+            LEFT JOIN visit_locations AS l ON l.value = v.location
+            LEFT JOIN visit_devices AS d ON d.value = v.device
+            LEFT JOIN visit_user_agents AS a ON a.value = v.user_agent
+            ORDER BY v.id
+        """))
+        conn.execute(text("DROP TABLE page_visits"))
+        conn.execute(text("ALTER TABLE page_visits_normalized RENAME TO page_visits"))
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_timestamp ON page_visits (timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_url_timestamp ON page_visits (url_id, timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_page_visits_path_timestamp ON page_visits (path_id, timestamp)"))
+    # The visits with their attribute values, as page_visits used to store them
+    conn.execute(text("""
+        CREATE VIEW IF NOT EXISTS page_visit_details AS
+        SELECT v.id AS id, u.value AS url, p.value AS path, r.value AS referrer,
+               v.ip_address AS ip_address, l.value AS location, d.value AS device,
+               a.value AS user_agent, v.timestamp AS timestamp,
+               v.url_id AS url_id, v.path_id AS path_id, v.referrer_id AS referrer_id,
+               v.location_id AS location_id, v.device_id AS device_id, v.user_agent_id AS user_agent_id
+        FROM page_visits AS v
+        JOIN visit_urls AS u ON u.id = v.url_id
+        JOIN visit_paths AS p ON p.id = v.path_id
+        LEFT JOIN visit_referrers AS r ON r.id = v.referrer_id
+        LEFT JOIN visit_locations AS l ON l.id = v.location_id
+        LEFT JOIN visit_devices AS d ON d.id = v.device_id
+        LEFT JOIN visit_user_agents AS a ON a.id = v.user_agent_id
+    """))
+
+@migration(6, "Add uptime targets and check results")
+def _create_uptime_tables(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS uptime_targets (
+            id INTEGER NOT NULL,
+            url VARCHAR(255) NOT NULL,
+            interval_seconds INTEGER NOT NULL,
+            enabled BOOLEAN NOT NULL,
+            next_check_at DATETIME,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_uptime_targets_url UNIQUE (url)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_uptime_targets_next_check_at ON uptime_targets (next_check_at)"
+    ))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS uptime_checks (
+            id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL REFERENCES uptime_targets (id),
+            checked_at DATETIME NOT NULL,
+            ok BOOLEAN NOT NULL,
+            status_code INTEGER,
+            response_ms FLOAT,
+            attempts INTEGER NOT NULL,
+            error VARCHAR(255),
+            PRIMARY KEY (id)
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_uptime_checks_checked_at ON uptime_checks (checked_at)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_uptime_checks_target_checked_at ON uptime_checks (target_id, checked_at)"
+    ))
+
+# The sketches of the visits already rolled up come from the rebuild
+@migration(7, "Add unique visitor and top value sketches per day and site", rebuild_rollups=True)
+def _create_visit_sketches(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS page_visit_sketches (
+            id INTEGER NOT NULL,
+            day VARCHAR(10) NOT NULL,
+            url VARCHAR(255) NOT NULL,
+            visits INTEGER NOT NULL,
+            visitors BLOB NOT NULL,
+            paths BLOB NOT NULL,
+            referrers BLOB NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_page_visit_sketches_day_url UNIQUE (day, url)
+        )
+    """))
+
+@migration(8, "Index failed uptime checks")
+def _index_failed_uptime_checks(conn):
+    # Failed checks are rare, so the index is small and counting them over
+    # a period never reads the checks themselves
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_uptime_checks_failed ON uptime_checks (checked_at) WHERE ok = 0"
+    ))
+
+# The user agent patterns of utils/enrichment.py as they were at version 9,
+# so the backfill gives the same answer whenever the migration runs.
+# (value, pattern) in order; the first match wins.
+_V9_BROWSERS = [
+    ("Edge", re.compile(r"Edg(?:e|A|iOS)?/")),
+    ("Opera", re.compile(r"OPR/|Opera")),
+    ("Samsung Internet", re.compile(r"SamsungBrowser/")),
+    ("Firefox", re.compile(r"Firefox/|FxiOS/")),
+    ("Chrome", re.compile(r"Chrome/|CriOS/")),
+    ("Safari", re.compile(r"Version/[\d.]+.*Safari/")),
+    ("Internet Explorer", re.compile(r"MSIE |Trident/"))
+]
+_V9_OPERATING_SYSTEMS = [
+    ("iOS", re.compile(r"iPhone|iPad|iPod")),
+    ("Android", re.compile(r"Android")),
+    ("Windows", re.compile(r"Windows")),
+    ("ChromeOS", re.compile(r"CrOS")),
+    ("macOS", re.compile(r"Macintosh|Mac OS X")),
+    ("Linux", re.compile(r"Linux|X11"))
+]
+
+def _v9_match(patterns, user_agent):
+    return next((value for value, pattern in patterns if pattern.search(user_agent)), "Other")
+
+@migration(9, "Add the browser and operating system of page visits")
+def _add_browsers(conn):
+    for table in ("visit_browsers", "visit_operating_systems"):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER NOT NULL,
+                value VARCHAR(255) NOT NULL,
+                PRIMARY KEY (id),
+                CONSTRAINT uq_{table}_value UNIQUE (value)
+            )
+        """))
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(page_visits)"))}
+    if "browser_id" not in columns:
+        conn.execute(text("ALTER TABLE page_visits ADD COLUMN browser_id INTEGER REFERENCES visit_browsers (id)"))
+        conn.execute(text("ALTER TABLE page_visits ADD COLUMN os_id INTEGER REFERENCES visit_operating_systems (id)"))
+
+    # Visits so far get them from their user agent: each distinct user agent
+    # is parsed once and the visits are updated in one pass
+    parsed = {
+        user_agent_id: (_v9_match(_V9_BROWSERS, value), _v9_match(_V9_OPERATING_SYSTEMS, value))
+        for user_agent_id, value in conn.execute(text("SELECT id, value FROM visit_user_agents")) if value
+    }
+    for table, position in (("visit_browsers", 0), ("visit_operating_systems", 1)):
+        values = {values[position] for values in parsed.values() if values[position]}
+        if values:
+            conn.execute(text(f"INSERT OR IGNORE INTO {table} (value) VALUES (:value)"), [{"value": v} for v in values])
+    browsers = dict(conn.execute(text("SELECT value, id FROM visit_browsers")).all())
+    systems = dict(conn.execute(text("SELECT value, id FROM visit_operating_systems")).all())
+    conn.execute(text(
+        "CREATE TEMP TABLE user_agent_browsers (user_agent_id INTEGER PRIMARY KEY, browser_id INTEGER, os_id INTEGER)"
+    ))
+    if parsed:
+        conn.execute(text("INSERT INTO user_agent_browsers VALUES (:user_agent_id, :browser_id, :os_id)"), [
+            {"user_agent_id": user_agent_id, "browser_id": browsers.get(browser), "os_id": systems.get(os_name)}
+            for user_agent_id, (browser, os_name) in parsed.items()
+        ])
+    conn.execute(text("""
+        UPDATE page_visits SET browser_id = b.browser_id, os_id = b.os_id
+        FROM user_agent_browsers AS b
+        WHERE b.user_agent_id = page_visits.user_agent_id AND page_visits.browser_id IS NULL
+    """))
+    conn.execute(text("DROP TABLE user_agent_browsers"))
+
+    conn.execute(text("DROP VIEW IF EXISTS page_visit_details"))
+    conn.execute(text("""
+        CREATE VIEW page_visit_details AS
+        SELECT v.id AS id, u.value AS url, p.value AS path, r.value AS referrer,
+               v.ip_address AS ip_address, l.value AS location, d.value AS device,
+               a.value AS user_agent, v.timestamp AS timestamp,
+               v.url_id AS url_id, v.path_id AS path_id, v.referrer_id AS referrer_id,
+               v.location_id AS location_id, v.device_id AS device_id, v.user_agent_id AS user_agent_id,
+               b.value AS browser, o.value AS os, v.browser_id AS browser_id, v.os_id AS os_id
+        FROM page_visits AS v
+        JOIN visit_urls AS u ON u.id = v.url_id
+        JOIN visit_paths AS p ON p.id = v.path_id
+        LEFT JOIN visit_referrers AS r ON r.id = v.referrer_id
+        LEFT JOIN visit_locations AS l ON l.id = v.location_id
+        LEFT JOIN visit_devices AS d ON d.id = v.device_id
+        LEFT JOIN visit_user_agents AS a ON a.id = v.user_agent_id
+        LEFT JOIN visit_browsers AS b ON b.id = v.browser_id
+        LEFT JOIN visit_operating_systems AS o ON o.id = v.os_id
+    """))
+
+@migration(10, "Add clients, projects and invoices")
+def _create_invoice_tables(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255),
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_clients_name UNIQUE (name)
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER NOT NULL,
+            client_id INTEGER NOT NULL REFERENCES clients (id),
+            name VARCHAR(255) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            due_on DATE,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id)
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_projects_status_due_on ON projects (status, due_on)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_projects_client_id ON projects (client_id)"))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER NOT NULL,
+            number VARCHAR(50) NOT NULL,
+            client_id INTEGER NOT NULL REFERENCES clients (id),
+            project_id INTEGER REFERENCES projects (id),
+            status VARCHAR(20) NOT NULL,
+            issued_on DATE NOT NULL,
+            due_on DATE NOT NULL,
+            paid_on DATE,
+            total_cents INTEGER NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_invoices_number UNIQUE (number)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_invoices_status_due_on ON invoices (status, due_on, total_cents)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoices_due_on ON invoices (due_on)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoices_issued_on ON invoices (issued_on)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoices_paid_on ON invoices (paid_on)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoices_client_id ON invoices (client_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoices_project_id ON invoices (project_id)"))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS invoice_lines (
+            id INTEGER NOT NULL,
+            invoice_id INTEGER NOT NULL REFERENCES invoices (id),
+            description VARCHAR(255) NOT NULL,
+            quantity FLOAT NOT NULL,
+            unit_price_cents INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            PRIMARY KEY (id)
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invoice_lines_invoice_id ON invoice_lines (invoice_id)"))
+
+@migration(11, "Add the AI Assistant response cache")
+def _create_assistant_responses(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS assistant_responses (
+            key VARCHAR(64) NOT NULL,
+            provider VARCHAR(100) NOT NULL,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            hits INTEGER NOT NULL,
+            created_at DATETIME NOT NULL,
+            last_used_at DATETIME NOT NULL,
+            PRIMARY KEY (key)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_assistant_responses_last_used_at ON assistant_responses (last_used_at, size_bytes)"
+    ))
+
+# Indexes that can be switched on or off in config.py. They are synced on
+# every upgrade instead of being versioned.
+OPTIONAL_INDEXES = {
+    "ix_page_visits_referrer_device": (
+        PAGE_VISITS_REFERRER_DEVICE_INDEX,
+        "CREATE INDEX IF NOT EXISTS ix_page_visits_referrer_device ON page_visits (referrer_id, device_id)"
+    )
+}
+
+def _ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """))
+
+def get_schema_version(engine):
+    """Return the highest applied migration version (0 for a new database)"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+def sync_optional_indexes(engine):
+    """Create enabled optional indexes and drop disabled ones"""
+    with engine.begin() as conn:
+        for name, (enabled, ddl) in OPTIONAL_INDEXES.items():
+            if enabled:
+                conn.execute(text(ddl))
+            else:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def upgrade(engine):
+    """Apply all pending migrations in order. Returns the applied versions."""
+    current = get_schema_version(engine)
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        # Migrations are idempotent, so one interrupted before its version row
+        # was recorded is simply applied again on the next upgrade
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now().isoformat(sep=" ")}
+            )
+        applied.append(version)
+    sync_optional_indexes(engine)
+    # Not for a new database, whose rollups are still empty
+    if current and REBUILDS_ROLLUPS.intersection(applied):
+        from utils.rollups import rebuild_rollups
+        rebuild_rollups(engine)
+    return applied
+
+if __name__ == "__main__":
+    from utils.db_utils import get_engine
+    engine = get_engine()
+    applied = upgrade(engine)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    print(f"Database is at schema version {get_schema_version(engine)}.")
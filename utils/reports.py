@@ -0,0 +1,497 @@
+# utils/reports.py
+"""
+Daily, weekly and monthly summary reports, generated in worker processes.
+
+A report job runs in steps on a process pool, so the Streamlit script
+thread only submits it and polls its status:
+
+1. fold new visits into the rollups
+2. compute every section (traffic, devices, pages, uptime, invoices) in
+   parallel, each in its own worker
+3. render the sections as HTML, PDF and CSV
+
+Finished reports are cached by (report type, user, last day covered).
+
+    job_id = report_jobs.submit("Weekly Summary", "admin")
+    report_jobs.status(job_id)   # {"state": "running", "done": 3, "total": 7, ...}
+    report_jobs.result(job_id)   # (report, {"html": ..., "pdf": ..., "csv": ...}) once done
+"""
+import base64
+import csv
+import html
+import io
+import multiprocessing
+import threading
+import time as timer
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time, timedelta
+
+from config import (
+    REPORT_WORKERS,
+    REPORT_START_METHOD,
+    REPORT_CACHE_SIZE,
+    REPORT_CACHE_TTL
+)
+from utils.cache import TTLCache
+
+# Report type -> days covered, ending with yesterday
+REPORT_PERIODS = {
+    "Daily Summary": 1,
+    "Weekly Summary": 7,
+    "Monthly Summary": 30
+}
+
+# Rows of a table shown in the PDF; HTML and CSV have them all
+PDF_TABLE_ROWS = 15
+
+def report_window(period, now=None):
+    """(start, end) of the complete days a report covers; end is exclusive"""
+    end = datetime.combine((now or datetime.now()).date(), time.min)
+    return end - timedelta(days=REPORT_PERIODS[period]), end
+
+# Sections. Each takes a session and the report window and returns a dict
+# with "metrics" ((label, value) pairs), "tables" (dicts with title,
+# columns, rows and optionally the utils.charts kind drawn from them) and
+# an optional "note".
+
+def _change(current, previous):
+    if not previous:
+        return None
+    return f"{100 * (current - previous) / previous:+.1f}%"
+
+def _traffic_section(session, start, end):
+    from utils.analytics_queries import get_key_metrics, get_visits_per_day
+
+    filters = {"start": start, "end": end}
+    metrics = get_key_metrics(session, filters)
+    previous = get_key_metrics(session, {"start": start - (end - start), "end": start})
+    return {
+        "metrics": [
+            ("Visits", metrics["total_visits"]),
+            ("Change from previous period", _change(metrics["total_visits"], previous["total_visits"])),
+            ("Unique visitors", metrics["unique_visitors"]),
+            ("Sites with visits", metrics["unique_urls"])
+        ],
+        "tables": [{
+            "title": "Visits per day",
+            "columns": ["Date", "Visits"],
+            "rows": get_visits_per_day(session, filters),
+            "chart": "visits_over_time"
+        }]
+    }
+
+def _devices_section(session, start, end):
+    from utils.analytics_queries import get_device_counts, get_location_counts
+
+    filters = {"start": start, "end": end}
+    return {
+        "metrics": [],
+        "tables": [
+            {"title": "Visits by device", "columns": ["Device", "Visits"], "rows": get_device_counts(session, filters)},
+            {
+                "title": "Visits by location",
+                "columns": ["Location", "Visits"],
+                "rows": get_location_counts(session, filters, limit=20)
+            }
+        ]
+    }
+
+def _pages_section(session, start, end):
+    from utils.analytics_queries import get_key_metrics, get_page_counts, get_referrer_counts
+
+    filters = {"start": start, "end": end}
+    metrics = get_key_metrics(session, filters)
+    return {
+        "metrics": [("Most popular page", metrics["top_path"]), ("Top referrer", metrics["top_referrer"])],
+        "tables": [
+            {"title": "Top pages", "columns": ["Page", "Visits"], "rows": get_page_counts(session, filters, limit=20)},
+            {
+                "title": "Top referrers",
+                "columns": ["Referrer", "Visits"],
+                "rows": get_referrer_counts(session, filters, limit=10)
+            }
+        ]
+    }
+
+def _uptime_section(session, start, end):
+    from utils.uptime import get_target_status, get_uptime_summary
+
+    hours = (end - start).total_seconds() / 3600
+    summary = get_uptime_summary(session, hours=hours, now=end)
+    targets = get_target_status(session, hours=hours, now=end)
+    return {
+        "metrics": [
+            ("Uptime (%)", None if summary["uptime"] is None else round(summary["uptime"], 2)),
+            ("Previous period (%)", None if summary["previous"] is None else round(summary["previous"], 2)),
+            ("Checks", summary["checks"])
+        ],
+        "tables": [{
+            "title": "Monitored websites",
+            "columns": ["URL", "Uptime (%)", "Latest status", "Latest check"],
+            "rows": [
+                (
+                    target["url"],
+                    None if target["uptime"] is None else round(target["uptime"], 2),
+                    "Not checked" if target["ok"] is None else ("Up" if target["ok"] else "Down"),
+                    target["checked_at"]
+                )
+                for target in targets
+            ]
+        }]
+    }
+
+def _invoices_section(session, start, end):
+    from utils.invoices import OUTSTANDING, format_money, get_invoice_summary, get_period_totals, list_invoices
+
+    totals = get_period_totals(session, start.date(), end.date())
+    summary = get_invoice_summary(session, today=end.date())
+    overdue, _ = list_invoices(session, status=OUTSTANDING, due_before=end.date(), page_size=20)
+    return {
+        "metrics": [
+            ("Invoiced", f"{format_money(totals['issued'][1])} ({totals['issued'][0]:,})"),
+            ("Paid", f"{format_money(totals['paid'][1])} ({totals['paid'][0]:,})"),
+            ("Outstanding", f"{format_money(summary['outstanding_cents'])} ({summary['outstanding']:,})"),
+            ("Overdue", f"{format_money(summary['overdue_cents'])} ({summary['overdue']:,})")
+        ],
+        "tables": [{
+            "title": "Longest overdue invoices",
+            "columns": ["Number", "Client", "Project", "Due", "Total"],
+            "rows": [
+                (number, client, project, due_on, format_money(total))
+                for _, number, client, project, _, _, due_on, _, total in overdue
+            ]
+        }],
+        "note": "Outstanding and overdue invoices are as of the report's creation."
+    }
+
+# Section name -> (title, function), in report order
+SECTIONS = {
+    "traffic": ("Traffic", _traffic_section),
+    "devices": ("Devices & Locations", _devices_section),
+    "pages": ("Pages & Referrers", _pages_section),
+    "uptime": ("Uptime", _uptime_section),
+    "invoices": ("Invoices", _invoices_section)
+}
+
+# Worker steps. They run in the pool's processes, which open their own
+# database engine, so arguments and results are plain picklable values.
+
+def prepare_report_data():
+    """Fold visits recorded since the last refresh into the rollups"""
+    from utils.rollups import refresh_rollups
+    return refresh_rollups()
+
+def compute_section(name, start, end):
+    """One section of a report as a dict (see SECTIONS)"""
+    from utils.db_utils import session_scope
+
+    title, function = SECTIONS[name]
+    with session_scope() as session:
+        section = function(session, start, end)
+    # Make the rows plain tuples of plain values
+    for table in section["tables"]:
+        table["rows"] = [tuple(row) for row in table["rows"]]
+    return dict(section, name=name, title=title)
+
+def _text(value):
+    if value is None:
+        return "n/a"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+def _table_frame(table):
+    import pandas as pd
+    return pd.DataFrame(table["rows"], columns=table["columns"])
+
+def to_html(report):
+    """A self-contained HTML page with the report's sections and charts"""
+    from utils.charts import render_chart
+
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+        f"<title>{html.escape(report['title'])}</title>",
+        "<style>body{font-family:sans-serif;margin:2em;}table{border-collapse:collapse;margin:0.5em 0 1.5em;}"
+        "td,th{border:1px solid #ccc;padding:4px 8px;text-align:left;}th{background:#f3f3f3;}"
+        ".metrics{display:flex;gap:2em;}.metric b{display:block;font-size:1.4em;}</style></head><body>",
+        f"<h1>{html.escape(report['title'])}</h1>",
+        f"<p>{html.escape(report['subtitle'])}</p>"
+    ]
+    for section in report["sections"]:
+        parts.append(f"<h2>{html.escape(section['title'])}</h2>")
+        if section["metrics"]:
+            parts.append("<div class='metrics'>")
+            for label, value in section["metrics"]:
+                parts.append(f"<div class='metric'>{html.escape(label)}<b>{html.escape(_text(value))}</b></div>")
+            parts.append("</div>")
+        if section.get("note"):
+            parts.append(f"<p><i>{html.escape(section['note'])}</i></p>")
+        for table in section["tables"]:
+            parts.append(f"<h3>{html.escape(table['title'])}</h3>")
+            if table.get("chart") and table["rows"]:
+                png = render_chart(table["chart"], _table_frame(table), "matplotlib")
+                parts.append(f"<img alt='{html.escape(table['title'])}' src='data:image/png;base64,{base64.b64encode(png).decode()}'>")
+            parts.append("<table><tr>" + "".join(f"<th>{html.escape(column)}</th>" for column in table["columns"]) + "</tr>")
+            for row in table["rows"]:
+                parts.append("<tr>" + "".join(f"<td>{html.escape(_text(value))}</td>" for value in row) + "</tr>")
+            parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+def to_csv(report):
+    """Every section's metrics and tables, one block after the other"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([report["title"], report["subtitle"]])
+    for section in report["sections"]:
+        writer.writerow([])
+        writer.writerow([section["title"]])
+        for label, value in section["metrics"]:
+            writer.writerow([label, "" if value is None else value])
+        if section.get("note"):
+            writer.writerow([section["note"]])
+        for table in section["tables"]:
+            writer.writerow([])
+            writer.writerow([table["title"]])
+            writer.writerow(table["columns"])
+            writer.writerows(["" if value is None else value for value in row] for row in table["rows"])
+    return buffer.getvalue()
+
+def to_pdf(report):
+    """One A4 page per section, drawn with matplotlib"""
+    import pandas as pd
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        for section in report["sections"]:
+            fig = Figure(figsize=(8.27, 11.69))
+            fig.text(0.08, 0.95, f"{report['title']}: {section['title']}", fontsize=15, weight="bold")
+            fig.text(0.08, 0.925, report["subtitle"], fontsize=9, color="gray")
+            y = 0.89
+            for label, value in section["metrics"]:
+                fig.text(0.08, y, f"{label}: {_text(value)}", fontsize=11)
+                y -= 0.022
+            if section.get("note"):
+                fig.text(0.08, y, section["note"], fontsize=10, style="italic")
+                y -= 0.022
+            for table in section["tables"]:
+                if table.get("chart") and table["rows"]:
+                    frame = _table_frame(table)
+                    ax = fig.add_axes([0.1, y - 0.25, 0.82, 0.22])
+                    ax.plot(pd.to_datetime(frame.iloc[:, 0]), frame.iloc[:, 1])
+                    ax.set_title(table["title"], loc="left", fontsize=10)
+                    fig.autofmt_xdate()
+                    y -= 0.3
+                    continue
+                rows = table["rows"][:PDF_TABLE_ROWS]
+                height = 0.02 * (len(rows) + 1)
+                ax = fig.add_axes([0.08, y - height - 0.02, 0.84, height])
+                ax.axis("off")
+                title = table["title"]
+                if len(table["rows"]) > len(rows):
+                    title += f" (first {len(rows)} of {len(table['rows']):,})"
+                ax.set_title(title, loc="left", fontsize=10)
+                if rows:
+                    cells = ax.table(
+                        cellText=[[_text(value) for value in row] for row in rows],
+                        colLabels=table["columns"],
+                        cellLoc="left",
+                        bbox=[0, 0, 1, 1]
+                    )
+                    cells.auto_set_font_size(False)
+                    cells.set_fontsize(8)
+                y -= height + 0.06
+            pdf.savefig(fig)
+    return buffer.getvalue()
+
+def render_report(report):
+    """All output formats of a report: {"html": str, "pdf": bytes, "csv": str}"""
+    return {"html": to_html(report), "pdf": to_pdf(report), "csv": to_csv(report)}
+
+def build_report(period, user, now=None):
+    """A whole report in the calling process, without the pool"""
+    start, end = report_window(period, now)
+    prepare_report_data()
+    report = _new_report(period, user, start, end)
+    report["sections"] = [compute_section(name, start, end) for name in SECTIONS]
+    return report, render_report(report)
+
+def _new_report(period, user, start, end):
+    return {
+        "title": period,
+        "subtitle": f"{start:%Y-%m-%d} to {end - timedelta(days=1):%Y-%m-%d} for {user}, "
+                    f"generated {datetime.now():%Y-%m-%d %H:%M}",
+        "period": period,
+        "user": user,
+        "start": start,
+        "end": end,
+        "sections": []
+    }
+
+class ReportJobs:
+    """Report jobs running on a pool of worker processes.
+
+    submit() returns a job id at once; every step of the job runs in a
+    worker and the next steps are submitted from the previous ones'
+    completion callbacks. status() is cheap enough to poll every second.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, cache_size=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL):
+        self.workers = workers
+        self.ttl = ttl
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        # Cache key -> id of the job computing it, so a report is computed once
+        self._running = {}
+        self._reports = TTLCache(maxsize=cache_size, ttl=ttl)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(REPORT_START_METHOD)
+                )
+            return self._executor
+
+    def submit(self, period, user, now=None, force=False):
+        """Start a report job, or reuse a cached or running one. Returns the job id."""
+        if period not in REPORT_PERIODS:
+            raise ValueError(f"Unknown report type: {period}")
+        start, end = report_window(period, now)
+        key = (period, user, end.date())
+        job = {
+            "id": uuid.uuid4().hex,
+            "key": key,
+            "state": "queued",
+            "done": 0,
+            "total": len(SECTIONS) + 2,
+            "error": None,
+            "cached": False,
+            "submitted_at": timer.time(),
+            "finished_at": None,
+            "report": _new_report(period, user, start, end),
+            "outputs": None
+        }
+        with self._lock:
+            self._forget_old_jobs()
+            cached = None if force else self._reports.get(key)
+            if cached is not None:
+                job.update(state="done", done=job["total"], cached=True, finished_at=job["submitted_at"])
+                job["report"], job["outputs"] = cached
+                self._jobs[job["id"]] = job
+                return job["id"]
+            if not force and key in self._running:
+                return self._running[key]
+            self._jobs[job["id"]] = job
+            self._running[key] = job["id"]
+        self._then(job, prepare_report_data, callback=self._prepared)
+        return job["id"]
+
+    def _forget_old_jobs(self):
+        cutoff = timer.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if (job["finished_at"] or timer.time()) < cutoff]:
+            del self._jobs[job_id]
+
+    def _then(self, job, function, *args, callback):
+        """Run function(*args) in a worker, then callback(job, result) unless the job failed"""
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as exc:
+                self._fail(job, exc)
+                return
+            with self._lock:
+                if job["state"] == "failed":
+                    return
+                job["done"] += 1
+                job["state"] = "running"
+            try:
+                callback(job, result)
+            except Exception as exc:
+                self._fail(job, exc)
+
+        try:
+            self._pool().submit(function, *args).add_done_callback(done)
+        except Exception as exc:
+            # For example a broken pool after a worker crashed
+            self._fail(job, exc)
+
+    def _fail(self, job, exc):
+        with self._lock:
+            if isinstance(exc, BrokenProcessPool):
+                # A worker died; later jobs get a new pool
+                self._executor = None
+            if job["state"] != "failed":
+                job.update(state="failed", error=f"{type(exc).__name__}: {exc}", finished_at=timer.time())
+                self._running.pop(job["key"], None)
+
+    def _prepared(self, job, _):
+        report = job["report"]
+        results = {}
+        for name in SECTIONS:
+            self._then(
+                job, compute_section, name, report["start"], report["end"],
+                callback=lambda job, section: self._section_done(job, section, results)
+            )
+
+    def _section_done(self, job, section, results):
+        with self._lock:
+            results[section["name"]] = section
+            complete = len(results) == len(SECTIONS)
+        if complete:
+            job["report"]["sections"] = [results[name] for name in SECTIONS]
+            self._then(job, render_report, job["report"], callback=self._rendered)
+
+    def _rendered(self, job, outputs):
+        with self._lock:
+            job.update(state="done", outputs=outputs, finished_at=timer.time())
+            self._reports.set(job["key"], (job["report"], outputs))
+            self._running.pop(job["key"], None)
+
+    def status(self, job_id):
+        """Progress of a job as a dict, or None for an unknown id.
+
+        state is "queued", "running", "done" or "failed"; done and total
+        count the job's steps.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            finished = job["finished_at"] or timer.time()
+            return {
+                "id": job["id"],
+                "period": job["report"]["period"],
+                "user": job["report"]["user"],
+                "state": job["state"],
+                "done": job["done"],
+                "total": job["total"],
+                "error": job["error"],
+                "cached": job["cached"],
+                "seconds": finished - job["submitted_at"]
+            }
+
+    def result(self, job_id):
+        """(report, outputs) of a finished job, None while it is not done"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] != "done":
+                return None
+            return job["report"], job["outputs"]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# Shared by all sessions of the Streamlit server
+report_jobs = ReportJobs()
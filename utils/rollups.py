@@ -0,0 +1,223 @@
+# utils/rollups.py
+"""
+Incrementally maintained hourly and daily page visit rollups.
+
+Each refresh folds the page_visits rows added since the last refresh into
+page_visit_rollups_hourly and page_visit_rollups_daily, tracked by a
+high-water mark on page_visits.id in rollup_state. The same transaction
+adds them to the per-day sketches of utils/visit_sketches.py.
+
+    python -m utils.rollups            # refresh
+    python -m utils.rollups --check    # compare rollups with a full recompute
+    python -m utils.rollups --rebuild  # recompute the rollups from scratch
+"""
+import sys
+import threading
+from datetime import datetime
+from sqlalchemy import text
+
+from config import ROLLUP_CHUNK_ROWS
+from utils.db_utils import init_db
+from utils.visit_sketches import fold_archive, fold_visits
+
+STATE_NAME = "page_visits"
+
+# Rollup table -> SQLite format string that truncates a timestamp to its bucket.
+# The format matches how SQLAlchemy stores DateTime values in SQLite.
+ROLLUP_TABLES = {
+    "page_visit_rollups_hourly": "%Y-%m-%d %H:00:00.000000",
+    "page_visit_rollups_daily": "%Y-%m-%d 00:00:00.000000"
+}
+
+# Serializes refreshes within this process; the watermark update below
+# guards against other processes.
+_refresh_lock = threading.Lock()
+
+def _bucket_counts_sql(bucket_format, where):
+    """SELECT of visit counts per bucket and attributes for matching rows.
+
+    Visits are counted per attribute id first, so the dimension tables are
+    joined once per group instead of once per visit.
+    """
+    return f"""
+        SELECT c.bucket, u.value AS url, p.value AS path,
+               COALESCE(r.value, '') AS referrer,
+               COALESCE(d.value, '') AS device,
+               COALESCE(l.value, '') AS location,
+               SUM(c.visits) AS visits
+        FROM (
+            SELECT strftime('{bucket_format}', timestamp) AS bucket, url_id, path_id,
+                   referrer_id, device_id, location_id, COUNT(*) AS visits
+            FROM page_visits
+            WHERE {where}
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) AS c
+        JOIN visit_urls AS u ON u.id = c.url_id
+        JOIN visit_paths AS p ON p.id = c.path_id
+        LEFT JOIN visit_referrers AS r ON r.id = c.referrer_id
+        LEFT JOIN visit_devices AS d ON d.id = c.device_id
+        LEFT JOIN visit_locations AS l ON l.id = c.location_id
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+def get_watermark(conn):
+    """Id of the last page_visits row included in the rollups"""
+    return conn.execute(
+        text("SELECT last_visit_id FROM rollup_state WHERE name = :name"),
+        {"name": STATE_NAME}
+    ).scalar() or 0
+
+def _fold_range(conn, low, high):
+    """Add page_visits rows with low < id <= high to every rollup table and the sketches.
+
+    Returns False without changing anything if another writer has already
+    moved the watermark past ``low``.
+    """
+    # Advancing the watermark first takes SQLite's write lock, so a concurrent
+    # refresh either waits for this transaction or finds the watermark moved.
+    moved = conn.execute(
+        text("""
+            UPDATE rollup_state SET last_visit_id = :high, updated_at = :now
+            WHERE name = :name AND last_visit_id = :low
+        """),
+        {"high": high, "low": low, "name": STATE_NAME, "now": datetime.now().isoformat(sep=" ")}
+    ).rowcount
+    if not moved:
+        return False
+
+    for table, bucket_format in ROLLUP_TABLES.items():
+        conn.execute(
+            text(f"""
+                INSERT INTO {table} (bucket, url, path, referrer, device, location, visits)
+                {_bucket_counts_sql(bucket_format, "id > :low AND id <= :high")}
+                ON CONFLICT (bucket, url, path, referrer, device, location)
+                DO UPDATE SET visits = visits + excluded.visits
+            """),
+            {"low": low, "high": high}
+        )
+    fold_visits(conn, low, high)
+    return True
+
+def refresh_rollups(engine=None, chunk_rows=ROLLUP_CHUNK_ROWS):
+    """Fold new page_visits rows into the rollups. Returns the rows processed."""
+    engine = engine or init_db()
+    processed = 0
+    with _refresh_lock:
+        with engine.connect() as conn:
+            max_id = conn.execute(text("SELECT MAX(id) FROM page_visits")).scalar() or 0
+            low = get_watermark(conn)
+        # Bounded chunks keep each write transaction short
+        while low < max_id:
+            high = min(low + chunk_rows, max_id)
+            with engine.begin() as conn:
+                if not _fold_range(conn, low, high):
+                    break
+            processed += high - low
+            low = high
+    return processed
+
+def rebuild_rollups(engine=None):
+    """Empty the rollups and sketches and recompute them from all page_visits rows and the archive"""
+    from utils.archive import has_archive, iter_rollup_counts
+
+    engine = engine or init_db()
+    with _refresh_lock:
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE rollup_state SET last_visit_id = 0, updated_at = :now WHERE name = :name"),
+                {"name": STATE_NAME, "now": datetime.now().isoformat(sep=" ")}
+            )
+            archived = has_archive(conn)
+            for table in ROLLUP_TABLES:
+                conn.execute(text(f"DELETE FROM {table}"))
+                # Archived visits are no longer in page_visits
+                for counts in iter_rollup_counts(conn, table) if archived else ():
+                    conn.execute(
+                        text(f"""
+                            INSERT INTO {table} (bucket, url, path, referrer, device, location, visits)
+                            VALUES (:bucket, :url, :path, :referrer, :device, :location, :visits)
+                            ON CONFLICT (bucket, url, path, referrer, device, location)
+                            DO UPDATE SET visits = visits + excluded.visits
+                        """),
+                        counts
+                    )
+            conn.execute(text("DELETE FROM page_visit_sketches"))
+            if archived:
+                fold_archive(conn)
+    return refresh_rollups(engine)
+
+def check_rollups(engine=None):
+    """Compare every rollup table with a full recompute from page_visits and the archive.
+
+    Only rows up to the watermark are compared. Returns a dict mapping each
+    table to a list of (bucket, url, path, referrer, device, location,
+    expected_visits, actual_visits) mismatches.
+    """
+    from utils.archive import has_archive, iter_rollup_counts
+
+    engine = engine or init_db()
+    mismatches = {}
+    with engine.connect() as conn:
+        watermark = get_watermark(conn)
+        archived = has_archive(conn)
+        for table, bucket_format in ROLLUP_TABLES.items():
+            expected = _bucket_counts_sql(bucket_format, "id <= :watermark")
+            if archived:
+                conn.execute(text("DROP TABLE IF EXISTS temp.archived_counts"))
+                conn.execute(text(
+                    "CREATE TEMP TABLE archived_counts (bucket, url, path, referrer, device, location, visits)"
+                ))
+                for counts in iter_rollup_counts(conn, table):
+                    conn.execute(
+                        text("""
+                            INSERT INTO archived_counts
+                            VALUES (:bucket, :url, :path, :referrer, :device, :location, :visits)
+                        """),
+                        counts
+                    )
+                expected = f"""
+                    SELECT bucket, url, path, referrer, device, location, SUM(visits) AS visits
+                    FROM ({expected} UNION ALL SELECT * FROM archived_counts)
+                    GROUP BY 1, 2, 3, 4, 5, 6
+                """
+            rows = conn.execute(
+                text(f"""
+                    WITH expected AS ({expected}),
+                    actual AS (
+                        SELECT strftime('%Y-%m-%d %H:%M:%S.000000', bucket) AS bucket,
+                               url, path, referrer, device, location, visits
+                        FROM {table}
+                    ),
+                    differences AS (
+                        SELECT * FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+                        UNION
+                        SELECT * FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+                    )
+                    SELECT d.bucket, d.url, d.path, d.referrer, d.device, d.location,
+                           COALESCE(e.visits, 0), COALESCE(a.visits, 0)
+                    FROM (SELECT DISTINCT bucket, url, path, referrer, device, location FROM differences) AS d
+                    LEFT JOIN expected AS e USING (bucket, url, path, referrer, device, location)
+                    LEFT JOIN actual AS a USING (bucket, url, path, referrer, device, location)
+                    ORDER BY d.bucket
+                """),
+                {"watermark": watermark}
+            ).all()
+            mismatches[table] = [tuple(row) for row in rows]
+        if archived:
+            conn.execute(text("DROP TABLE temp.archived_counts"))
+            conn.commit()
+    return mismatches
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        print(f"Rebuilt rollups from {rebuild_rollups():,} page visits.")
+    elif "--check" in sys.argv:
+        refresh_rollups()
+        problems = check_rollups()
+        for table, rows in problems.items():
+            print(f"{table}: {'consistent' if not rows else f'{len(rows)} mismatched buckets'}")
+            for row in rows[:20]:
+                print(f"    {row[:6]} expected {row[6]}, found {row[7]}")
+        sys.exit(1 if any(problems.values()) else 0)
+    else:
+        print(f"Folded {refresh_rollups():,} new page visits into the rollups.")
@@ -1,93 +1,393 @@
 # utils/sample_data.py
-import sys
-import os
+"""
+Sample page visits.
+
+generate_sample_analytics_data() adds 100 visits for the demo button on the
+analytics page. generate_bulk_visits() builds large, repeatable datasets for
+load testing and benchmarks:
+
+    python -m utils.sample_data                    # the 100 demo visits
+    python -m utils.sample_data --rows 10000000 --seed 42 --end 2024-06-01
+    python -m utils.sample_data --size large --replace --bulk-load
+"""
+import argparse
 import random
+import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
 
-# Add parent directory to path to import modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.db_utils import get_db_session, PageVisit
+from sqlalchemy import insert
+
+from config import SAMPLE_DATA_CHUNK_ROWS
+from utils.db_utils import init_db, session_scope, PageVisit
+from utils.dimensions import interner
+from utils.enrichment import enricher, parse_user_agent
+
+# Named dataset sizes for --size
+DATASET_SIZES = {
+    "small": 100_000,
+    "medium": 1_000_000,
+    "large": 10_000_000,
+    "xlarge": 50_000_000
+}
+
+# Traffic shape of the bulk generator. Sites and pages are picked with
+# Zipfian popularity (rank ** -zipf_exponent), the other attributes with the
+# given weights. None is a visit without a referrer.
+DEFAULT_PROFILE = {
+    "sites": ["https://example.com", "https://mywebsite.io", "https://codronblog.com"],
+    "pages_per_site": 200,
+    "zipf_exponent": 1.1,
+    "referrers": {
+        None: 40,
+        "https://google.com": 35,
+        "https://twitter.com": 8,
+        "https://facebook.com": 7,
+        "https://linkedin.com": 6,
+        "https://news.ycombinator.com": 4
+    },
+    "devices": {"Desktop": 50, "Mobile": 45, "Tablet": 5},
+    "locations": {
+        "United States": 35,
+        "India": 15,
+        "UK": 10,
+        "Germany": 10,
+        "Canada": 8,
+        "South Africa": 7,
+        "Australia": 5,
+        "Other": 10
+    },
+    # Relative traffic per hour of day (0-23) and per weekday (Monday first)
+    "hourly_weights": [
+        2, 1, 1, 1, 1, 2, 4, 6, 8, 10, 11, 12,
+        12, 12, 12, 11, 10, 10, 9, 9, 8, 6, 4, 3
+    ],
+    "weekday_weights": [10, 10, 10, 10, 9, 6, 5]
+}
+
+USER_AGENTS = {
+    "Desktop": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mobile": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Tablet": "Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1"
+}
+
+INSERT_VISITS_SQL = (
+    "INSERT INTO page_visits (url_id, path_id, referrer_id, ip_address, location_id, device_id, user_agent_id, timestamp, "
+    "browser_id, os_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
 
 def generate_sample_analytics_data():
     """Generate sample website analytics data for demo purposes."""
-    with get_db_session() as session:
+    engine = init_db()
+    with session_scope() as session:
         # Check if we already have data
         if session.query(PageVisit).count() > 0:
             print("Analytics data already exists.")
             return
+    
+    # Sample websites and pages
+    websites = [
+        "example.com",
+        "mywebsite.io",
+        "codronblog.com"
+    ]
+    
+    pages = [
+        "/",
+        "/about",
+        "/blog",
+        "/contact",
+        "/products",
+        "/services"
+    ]
+    
+    referrers = [
+        "https://google.com",
+        "https://facebook.com",
+        "https://twitter.com",
+        "https://linkedin.com",
+        "direct",
+        None
+    ]
+    
+    devices = [
+        "Desktop",
+        "Mobile",
+        "Tablet"
+    ]
+    
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 14_4 like Mac OS X)",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+        "Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36"
+    ]
+    
+    # Generate 100 sample visits
+    sample_visits = []
+    for _ in range(100):
+        # Random dates in the last 30 days
+        random_days = random.randint(0, 30)
+        random_hours = random.randint(0, 23)
+        random_minutes = random.randint(0, 59)
+        visit_time = datetime.now() - timedelta(
+            days=random_days,
+            hours=random_hours,
+            minutes=random_minutes
+        )
         
-        # Sample websites and pages
-        websites = [
-            "example.com",
-            "mywebsite.io",
-            "codronblog.com"
-        ]
-        
-        pages = [
-            "/",
-            "/about",
-            "/blog",
-            "/contact",
-            "/products",
-            "/services"
-        ]
-        
-        referrers = [
-            "https://google.com",
-            "https://facebook.com",
-            "https://twitter.com",
-            "https://linkedin.com",
-            "direct",
-            None
-        ]
-        
-        devices = [
-            "Desktop",
-            "Mobile",
-            "Tablet"
-        ]
+        website = random.choice(websites)
+        page = random.choice(pages)
         
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Mozilla/5.0 (iPhone; CPU iPhone OS 14_4 like Mac OS X)",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
-            "Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36"
-        ]
+        visit = dict(
+            url=f"https://{website}",
+            path=page,
+            referrer=random.choice(referrers),
+            ip_address=f"192.168.{random.randint(1, 255)}.{random.randint(1, 255)}",
+            location=random.choice(["United States", "Canada", "UK", "Germany", "India", "Australia"]),
+            device=random.choice(devices),
+            user_agent=random.choice(user_agents),
+            timestamp=visit_time
+        )
         
-        # Generate 100 sample visits
-        sample_visits = []
-        for _ in range(100):
-            # Random dates in the last 30 days
-            random_days = random.randint(0, 30)
-            random_hours = random.randint(0, 23)
-            random_minutes = random.randint(0, 59)
-            visit_time = datetime.now() - timedelta(
-                days=random_days,
-                hours=random_hours,
-                minutes=random_minutes
-            )
-            
-            website = random.choice(websites)
-            page = random.choice(pages)
-            
-            visit = PageVisit(
-                url=f"https://{website}",
-                path=page,
-                referrer=random.choice(referrers),
-                ip_address=f"192.168.{random.randint(1, 255)}.{random.randint(1, 255)}",
-                location=random.choice(["United States", "Canada", "UK", "Germany", "India", "Australia"]),
-                device=random.choice(devices),
-                user_agent=random.choice(user_agents),
-                timestamp=visit_time
-            )
-            
-            sample_visits.append(visit)
-        
-        # Add to database
-        session.add_all(sample_visits)
-        session.commit()
-        print(f"Added {len(sample_visits)} sample page visits.")
+        sample_visits.append(visit)
+    
+    # Add to database, with the browser and OS of each user agent
+    with engine.begin() as conn:
+        conn.execute(insert(PageVisit), interner.encode(engine, enricher.enrich(sample_visits)))
+    print(f"Added {len(sample_visits)} sample page visits.")
+
+def _page_paths(count):
+    """Site paths, most popular first"""
+    common = ["/", "/blog", "/about", "/products", "/services", "/contact", "/pricing"]
+    return (common + [f"/blog/post-{i}" for i in range(1, count)])[:count]
+
+def _normalized(weights):
+    import numpy as np
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+def _choice(rng, values, weights, size):
+    """Weighted random pick of ``size`` values, as a NumPy object array"""
+    import numpy as np
+    choices = np.empty(len(values), dtype=object)
+    choices[:] = values
+    return choices[rng.choice(len(values), size=size, p=_normalized(weights))]
+
+def _zipf_weights(count, exponent):
+    import numpy as np
+    return 1.0 / np.arange(1, count + 1) ** exponent
+
+def _profile_ids(engine, profile):
+    """Dimension ids of every attribute value the profile can produce"""
+    return {
+        "url": interner.ids(engine, "url", profile["sites"]),
+        "path": interner.ids(engine, "path", _page_paths(profile["pages_per_site"])),
+        "referrer": interner.ids(engine, "referrer", list(profile["referrers"])),
+        "device": interner.ids(engine, "device", list(profile["devices"])),
+        "location": interner.ids(engine, "location", list(profile["locations"])),
+        "user_agent": interner.ids(engine, "user_agent", list(USER_AGENTS.values())),
+        "browser": interner.ids(engine, "browser", [parse_user_agent(agent)[0] for agent in USER_AGENTS.values()]),
+        "os": interner.ids(engine, "os", [parse_user_agent(agent)[1] for agent in USER_AGENTS.values()])
+    }
+
+def _visit_rows(rng, profile, days, end, ids):
+    """Random visits on the given days, as tuples in INSERT_VISITS_SQL order.
+
+    ``days`` holds the (sorted) day of every visit as datetime64[D] and
+    ``ids`` the dimension ids from _profile_ids. The visits are returned in
+    time order, with none at or after ``end``.
+    """
+    import numpy as np
+
+    size = len(days)
+
+    sites = profile["sites"]
+    site = rng.choice(len(sites), size=size, p=_normalized(_zipf_weights(len(sites), profile["zipf_exponent"])))
+    paths = _page_paths(profile["pages_per_site"])
+    page = rng.choice(len(paths), size=size, p=_normalized(_zipf_weights(len(paths), profile["zipf_exponent"])))
+
+    def id_choice(attribute):
+        weights = profile[f"{attribute}s"]
+        return _choice(rng, [ids[attribute].get(value) for value in weights], list(weights.values()), size)
+
+    urls = np.array([ids["url"][value] for value in sites])[site]
+    paths = np.array([ids["path"][value] for value in paths])[page]
+    referrers = id_choice("referrer")
+    devices = id_choice("device")
+    locations = id_choice("location")
+    device_agents = {
+        ids["device"][device]: ids["user_agent"][USER_AGENTS[device]]
+        for device in profile["devices"] if device in USER_AGENTS
+    }
+    user_agents = np.vectorize(device_agents.get, otypes=[object])(devices)
+    # The browser and OS follow from the user agent, as at ingest
+    agent_browsers, agent_systems = {}, {}
+    for agent in USER_AGENTS.values():
+        browser, os_name, _ = parse_user_agent(agent)
+        agent_browsers[ids["user_agent"][agent]] = ids["browser"][browser]
+        agent_systems[ids["user_agent"][agent]] = ids["os"][os_name]
+    browsers = np.vectorize(agent_browsers.get, otypes=[object])(user_agents)
+    systems = np.vectorize(agent_systems.get, otypes=[object])(user_agents)
+    ip_addresses = np.char.add(
+        "10.",
+        np.char.add(
+            np.char.add(rng.integers(0, 256, size).astype(str), "."),
+            np.char.add(np.char.add(rng.integers(0, 256, size).astype(str), "."), rng.integers(1, 255, size).astype(str))
+        )
+    ).astype(object)
+
+    # An hour weighted by time of day and a random offset within it. On the
+    # last, partial day, visits that would land after ``end`` are spread
+    # evenly over the part of the day before it instead.
+    day_starts = days.astype("datetime64[us]")
+    hour = rng.choice(24, size=size, p=_normalized(profile["hourly_weights"]))
+    timestamps = (
+        day_starts
+        + (hour * 3_600_000_000).astype("timedelta64[us]")
+        + rng.integers(0, 3_600_000_000, size).astype("timedelta64[us]")
+    )
+    end_us = np.datetime64(end, "us")
+    late = timestamps >= end_us
+    if late.any():
+        room = (end_us - day_starts[late]).astype("int64")
+        timestamps[late] = day_starts[late] + rng.integers(0, room).astype("timedelta64[us]")
+    timestamps.sort()
+    # Stored in the same text format SQLAlchemy uses for DateTime on SQLite
+    timestamps = np.char.replace(np.datetime_as_string(timestamps, unit="us"), "T", " ").astype(object)
+
+    return list(zip(
+        urls.tolist(), paths.tolist(), referrers.tolist(), ip_addresses.tolist(),
+        locations.tolist(), devices.tolist(), user_agents.tolist(), timestamps.tolist(),
+        browsers.tolist(), systems.tolist()
+    ))
+
+@contextmanager
+def _without_indexes(engine):
+    """Drop the page_visits indexes for the duration of a bulk load.
+
+    Rebuilding an index once from sorted data is much cheaper than
+    maintaining it row by row. The indexes are recreated from their
+    original SQL even if the load fails.
+    """
+    with engine.begin() as conn:
+        indexes = conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'page_visits' AND sql IS NOT NULL"
+        ).all()
+        for name, _ in indexes:
+            conn.exec_driver_sql(f'DROP INDEX "{name}"')
+    try:
+        yield
+    finally:
+        with engine.begin() as conn:
+            for _, sql in indexes:
+                conn.exec_driver_sql(sql)
+
+def generate_bulk_visits(rows, seed=0, days=90, end=None, profile=None, engine=None,
+                         chunk_rows=SAMPLE_DATA_CHUNK_ROWS, bulk_load=False, progress=None):
+    """Insert ``rows`` synthetic page visits spread over ``days`` days before ``end``.
+
+    The same seed, size, end, profile and chunk size always produce the same
+    visits. ``end`` defaults to now; pass it explicitly for repeatable
+    datasets. Rows are generated with NumPy and inserted in chunks with one
+    executemany per transaction. With ``bulk_load`` (SQLite only) the
+    page_visits indexes are dropped during the load and rebuilt afterwards.
+    ``progress`` is called with the number of rows inserted so far after
+    every chunk.
+
+    Returns the insert rate in rows per second, including index rebuilds.
+    """
+    import numpy as np
+
+    engine = engine or init_db()
+    profile = {**DEFAULT_PROFILE, **(profile or {})}
+    end = end or datetime.now()
+    rng = np.random.default_rng(seed)
+
+    # Split the visits over the calendar days up to ``end`` by weekday
+    # weight, then generate them day by day so that ids follow time order
+    # like they do for real traffic
+    first_day = np.datetime64((end - timedelta(days=days)).date(), "D")
+    last_day = np.datetime64((end - timedelta(microseconds=1)).date(), "D")
+    calendar = np.arange(first_day, last_day + 1)
+    weekdays = (calendar.view("int64") - 4) % 7  # 1970-01-01 was a Thursday
+    day_weights = np.asarray(profile["weekday_weights"], dtype=float)[weekdays]
+    visits_before_day_end = np.cumsum(rng.multinomial(rows, _normalized(day_weights)))
+    ids = _profile_ids(engine, profile)
+
+    started = time.perf_counter()
+    with _without_indexes(engine) if bulk_load else nullcontext():
+        inserted = 0
+        while inserted < rows:
+            size = min(chunk_rows, rows - inserted)
+            positions = np.arange(inserted, inserted + size)
+            days_of_visits = calendar[np.searchsorted(visits_before_day_end, positions, side="right")]
+            batch = _visit_rows(rng, profile, days_of_visits, end, ids)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(INSERT_VISITS_SQL, batch)
+            inserted += size
+            if progress:
+                progress(inserted)
+    elapsed = time.perf_counter() - started
+    return rows / elapsed if elapsed else float("inf")
+
+def delete_all_visits(engine=None):
+    """Remove every page visit, archived ones included, and empty the rollups"""
+    from utils.archive import delete_archive
+    from utils.rollups import rebuild_rollups
+    engine = engine or init_db()
+    # The archive goes first: new visits would otherwise get ids it already has
+    delete_archive(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM page_visits")
+    # Row ids start again from 1, below the old rollup watermark
+    rebuild_rollups(engine)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic page visits.")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, help="number of visits to generate")
+    size.add_argument("--size", choices=DATASET_SIZES, help="named dataset size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=90, help="days of traffic before --end")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="end of the traffic window (default: now)")
+    parser.add_argument("--replace", action="store_true", help="delete existing visits first, archived ones too")
+    parser.add_argument("--bulk-load", action="store_true", help="drop and rebuild the indexes around the load (SQLite)")
+    parser.add_argument("--skip-rollups", action="store_true", help="do not refresh the rollups afterwards")
+    args = parser.parse_args(argv)
+
+    engine = init_db()
+    # Without a size, add the demo visits as before
+    if args.rows is None and args.size is None:
+        generate_sample_analytics_data()
+        print("Sample data generated successfully.")
+        return
+
+    rows = args.rows or DATASET_SIZES[args.size]
+    if args.replace:
+        delete_all_visits(engine)
+
+    def progress(inserted):
+        print(f"\r{inserted:,} / {rows:,} visits", end="", flush=True)
+
+    rate = generate_bulk_visits(
+        rows,
+        seed=args.seed,
+        days=args.days,
+        end=args.end,
+        engine=engine,
+        bulk_load=args.bulk_load,
+        progress=progress
+    )
+    print(f"\nInserted {rows:,} visits at {rate:,.0f} rows/s.")
+
+    if not args.skip_rollups:
+        from utils.rollups import refresh_rollups
+        started = time.perf_counter()
+        folded = refresh_rollups(engine)
+        elapsed = time.perf_counter() - started
+        print(f"Folded {folded:,} visits into the rollups at {folded / elapsed if elapsed else 0:,.0f} rows/s.")
 
 if __name__ == "__main__":
-    generate_sample_analytics_data()
-    print("Sample data generated successfully.")
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,221 @@
+# utils/session_store.py
+"""
+Server-side per-user session contexts.
+
+A UserContext is created once at login and looked up by a random session
+id kept in ``st.session_state`` on every rerun. It holds the user's
+settings and a small memo of per-user results, so reruns do not rebuild
+them. Contexts idle for longer than SESSION_IDLE_TIMEOUT are dropped, and
+when all contexts together exceed SESSION_STORE_MAX_BYTES the least
+recently used ones are dropped first. A dropped context is rebuilt on the
+user's next rerun.
+"""
+import copy
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    SESSION_IDLE_TIMEOUT,
+    SESSION_STORE_MAX_BYTES,
+    SESSION_MEMO_SIZE,
+    load_user_settings
+)
+
+def deep_sizeof(value, seen=None):
+    """Approximate memory footprint of an object graph in bytes"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    # pandas objects know their own size, including object columns
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage) and hasattr(value, "dtypes"):
+        usage = memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    return size
+
+class UserContext:
+    """Everything about a logged-in user that survives between reruns"""
+
+    def __init__(self, username, session_id=None):
+        self.session_id = session_id or secrets.token_urlsafe(16)
+        self.username = username
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self._settings = None
+        self._settings_source = None
+        self._settings_bytes = 0
+        self._memo = OrderedDict()
+        self._memo_bytes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self):
+        """The user's settings, re-copied only when the settings file changes"""
+        shared = load_user_settings(shared=True)
+        if shared is not self._settings_source:
+            self._settings = copy.deepcopy(shared)
+            self._settings_source = shared
+            self._settings_bytes = deep_sizeof(self._settings)
+        return self._settings
+
+    @property
+    def enabled_modules(self):
+        return self.settings.get("enabled_modules", {})
+
+    def memo(self, key, compute):
+        """Return the remembered result for key, computing it on a miss.
+
+        Keeps the SESSION_MEMO_SIZE most recently used results.
+        """
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        value = compute()
+        size = deep_sizeof(value)
+        with self._lock:
+            self._memo[key] = value
+            self._memo_bytes[key] = size
+            self._memo.move_to_end(key)
+            while len(self._memo) > SESSION_MEMO_SIZE:
+                old_key, _ = self._memo.popitem(last=False)
+                del self._memo_bytes[old_key]
+        return value
+
+    def clear_memo(self):
+        with self._lock:
+            self._memo.clear()
+            self._memo_bytes.clear()
+
+    def memory_bytes(self):
+        """Approximate memory held by this context"""
+        with self._lock:
+            return sum(self._memo_bytes.values()) + self._settings_bytes
+
+class SessionStore:
+    """Thread-safe map of session id -> UserContext with eviction"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, max_bytes=SESSION_STORE_MAX_BYTES):
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+        # Least recently seen first
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.idle_evictions = 0
+        self.memory_evictions = 0
+
+    def _evict_idle(self, now):
+        while self._contexts:
+            session_id, context = next(iter(self._contexts.items()))
+            if now - context.last_seen <= self.idle_timeout:
+                break
+            del self._contexts[session_id]
+            self.idle_evictions += 1
+
+    def create(self, username):
+        """Start a context for a user who just logged in"""
+        context = UserContext(username)
+        with self._lock:
+            self._evict_idle(time.time())
+            self._contexts[context.session_id] = context
+            self.created += 1
+        return context
+
+    def get(self, session_id, username):
+        """Context of a session, rebuilt for username if it was evicted"""
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            context = self._contexts.get(session_id)
+            if context is None or context.username != username:
+                context = UserContext(username, session_id)
+                self._contexts[session_id] = context
+                self.created += 1
+            context.last_seen = now
+            self._contexts.move_to_end(session_id)
+        return context
+
+    def discard(self, session_id):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+
+    def enforce_memory_cap(self):
+        """Drop least recently seen contexts until the total fits the cap.
+
+        The most recent context is kept but its memo is cleared if it
+        alone is over the cap.
+        """
+        with self._lock:
+            contexts = list(self._contexts.values())
+        sizes = {context.session_id: context.memory_bytes() for context in contexts}
+        total = sum(sizes.values())
+        with self._lock:
+            for context in contexts[:-1]:
+                if total <= self.max_bytes:
+                    break
+                if self._contexts.pop(context.session_id, None) is not None:
+                    total -= sizes[context.session_id]
+                    self.memory_evictions += 1
+        if contexts and total > self.max_bytes:
+            contexts[-1].clear_memo()
+
+    def stats(self):
+        """Live sessions, their memory and eviction counters"""
+        now = time.time()
+        with self._lock:
+            contexts = list(self._contexts.values())
+        sessions = [
+            {
+                "username": context.username,
+                "idle_seconds": now - context.last_seen,
+                "age_seconds": now - context.created_at,
+                "memory_bytes": context.memory_bytes()
+            }
+            for context in contexts
+        ]
+        return {
+            "live_sessions": len(sessions),
+            "memory_bytes": sum(session["memory_bytes"] for session in sessions),
+            "max_bytes": self.max_bytes,
+            "created": self.created,
+            "idle_evictions": self.idle_evictions,
+            "memory_evictions": self.memory_evictions,
+            "sessions": sessions
+        }
+
+# Shared by all sessions served by this process
+session_store = SessionStore()
+
+def start_session(username):
+    """Create a context at login and remember its id in the browser session"""
+    import streamlit as st
+    context = session_store.create(username)
+    st.session_state.session_id = context.session_id
+    return context
+
+def end_session():
+    import streamlit as st
+    session_id = st.session_state.get("session_id")
+    if session_id is not None:
+        session_store.discard(session_id)
+        st.session_state.session_id = None
+
+def get_current_context():
+    """Context of the logged-in user of this rerun, or None"""
+    import streamlit as st
+    if not st.session_state.get("authenticated"):
+        return None
+    session_id = st.session_state.get("session_id")
+    if session_id is None:
+        return start_session(st.session_state.username)
+    return session_store.get(session_id, st.session_state.username)
\ No newline at end of file
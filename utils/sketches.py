@@ -0,0 +1,301 @@
+# utils/sketches.py
+"""
+Mergeable summaries of data seen in chunks.
+
+- HyperLogLog: approximate number of distinct values
+- KLLSketch: approximate quantiles of numbers
+- CountMinSketch: approximate count of any value
+- SpaceSaving: the most frequent values and their approximate counts
+
+All take whole NumPy arrays at a time, use memory independent of the
+number of values added, and can be merged, so chunks (or buckets) can be
+summarized separately and combined later. Values are hashed with
+pandas.util.hash_array, which is stable across processes.
+"""
+import heapq
+import json
+import math
+import struct
+
+import numpy as np
+
+def hash_values(values):
+    """64-bit hashes of an array of values, stable across processes"""
+    import pandas as pd
+    values = np.asarray(values)
+    if values.dtype.kind in "SU":
+        values = values.astype(object)
+    return pd.util.hash_array(values, categorize=False)
+
+class HyperLogLog:
+    """Distinct count estimate with a relative error of about 1.04 / sqrt(2 ** precision)"""
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        """Add an array of values; duplicates and order do not matter"""
+        self.add_hashes(hash_values(values))
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        # The first ``precision`` bits pick a register, which keeps the
+        # longest run of leading zeros seen in the remaining bits
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Exact: rest has at most 60 bits, and floor(log2) only needs its magnitude
+        with np.errstate(divide="ignore"):
+            rank = bits - np.floor(np.log2(rest.astype(np.float64)))
+        rank = np.where(rest == 0, bits + 1, rank).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls(data[0])
+        sketch.registers = np.frombuffer(data, dtype=np.uint8, offset=1).copy()
+        return sketch
+
+class KLLSketch:
+    """Quantile estimate with a rank error of roughly 1.7 / k.
+
+    Values are kept in levels of compactors; an item at level h stands
+    for 2 ** h values. A full level is sorted and every other item, from
+    a random start, moves up a level. The exact minimum and maximum are
+    tracked separately.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller, never below 8 items
+        depth = len(self.levels) - level - 1
+        return max(8, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def add(self, values):
+        """Add an array of numbers; NaNs are ignored"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so the weights add up
+                keep = items[:1] if len(items) % 2 else items[:0]
+                items = items[len(keep):]
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        for bound, pick in (("min", min), ("max", max)):
+            values = [value for value in (getattr(self, bound), getattr(other, bound)) if value is not None]
+            setattr(self, bound, pick(values) if values else None)
+        self._compress()
+        return self
+
+    def quantiles(self, fractions):
+        """Approximate values at the given fractions (0 to 1) of the sorted data"""
+        if not self.count:
+            return [None] * len(fractions)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min)
+            elif fraction >= 1:
+                result.append(self.max)
+            else:
+                position = np.searchsorted(cumulative, fraction * cumulative[-1], side="left")
+                result.append(float(items[min(position, len(items) - 1)]))
+        return result
+
+
+class CountMinSketch:
+    """Counts that are never too low and, with probability 1 - delta, too high
+    by at most epsilon times the total count.
+
+    ``depth`` rows of ``width`` counters; every value adds to one counter
+    per row and its estimate is the smallest of them.
+    """
+
+    def __init__(self, width=272, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon, delta):
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _columns(self, values):
+        # Double hashing: row i uses h1 + i * h2 (Kirsch and Mitzenmacher)
+        hashes = hash_values(values)
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low + rows * high) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, values, counts=None):
+        """Add an array of values, each ``counts`` times (once by default)"""
+        values = np.asarray(values)
+        if not len(values):
+            return
+        counts = np.ones(len(values), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        columns = self._columns(values)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, values):
+        """Estimated counts of an array of values"""
+        values = np.asarray(values)
+        if not len(values):
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(values)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge Count-Min sketches of different sizes")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_bytes(self):
+        return struct.pack("<IIq", self.width, self.depth, self.total) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        width, depth, total = struct.unpack_from("<IIq", data)
+        sketch = cls(width, depth)
+        sketch.total = total
+        sketch.table = np.frombuffer(data, dtype=np.int64, offset=16).reshape(depth, width).copy()
+        return sketch
+
+class SpaceSaving:
+    """The ``capacity`` most frequent values with counts that are never too
+    low and too high by at most total / capacity.
+
+    ``floor`` bounds the count of every value that is not kept; merging
+    two summaries credits each with the other's floor for the values it
+    lacks (Cafaro et al.), so merged summaries keep the same guarantee.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def add(self, values, counts=None):
+        """Add an array of values, each ``counts`` times (once by default)"""
+        values = np.asarray(values, dtype=object)
+        if counts is None:
+            values, counts = np.unique(values, return_counts=True)
+        exact = SpaceSaving(None)
+        for value, count in zip(values.tolist(), np.asarray(counts).tolist()):
+            exact.counts[value] = exact.counts.get(value, 0) + count
+            exact.errors[value] = 0
+        exact.total = sum(exact.counts.values())
+        return self.merge(exact)
+
+    def merge(self, other):
+        for value in other.counts.keys() - self.counts.keys():
+            self.counts[value] = self.errors[value] = self.floor
+        for value in self.counts.keys() - other.counts.keys():
+            self.counts[value] += other.floor
+            self.errors[value] += other.floor
+        for value, count in other.counts.items():
+            self.counts[value] += count
+            self.errors[value] += other.errors[value]
+        self.floor += other.floor
+        self.total += other.total
+        if self.capacity is not None and len(self.counts) > self.capacity:
+            kept = heapq.nlargest(self.capacity + 1, self.counts.items(), key=lambda item: item[1])
+            # Values left out count at most as much as the largest of them
+            self.floor = max(self.floor, kept.pop()[1])
+            self.counts = dict(kept)
+            self.errors = {value: self.errors[value] for value in self.counts}
+        return self
+
+    def top(self, n=None):
+        """(value, count, error) of the most frequent values, largest count first.
+
+        The true count of each value lies between count - error and count.
+        """
+        items = sorted(self.counts.items(), key=lambda item: (-item[1], str(item[0])))
+        return [(value, count, self.errors[value]) for value, count in items[:n]]
+
+    def to_bytes(self):
+        return json.dumps({
+            "capacity": self.capacity,
+            "floor": self.floor,
+            "total": self.total,
+            "items": [[value, count, self.errors[value]] for value, count in self.counts.items()]
+        }).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        state = json.loads(data)
+        summary = cls(state["capacity"])
+        summary.floor = state["floor"]
+        summary.total = state["total"]
+        for value, count, error in state["items"]:
+            summary.counts[value] = count
+            summary.errors[value] = error
+        return summary
\ No newline at end of file
@@ -0,0 +1,512 @@
+# utils/uptime.py
+"""
+Concurrent uptime and SEO checks of websites.
+
+Targets live in uptime_targets, each with its own check interval. The
+scheduler wakes up every UPTIME_TICK_SECONDS, checks all targets that are
+due at once with asyncio and appends the results to uptime_checks, which
+feeds the dashboard's "Website Uptime" metric:
+
+    python -m utils.uptime add https://example.com [--interval 60]
+    python -m utils.uptime                           # run the scheduler
+    python -m utils.uptime check https://example.com # check once, store nothing
+
+Requests go through HttpPool, a small HTTP/1.1 client on asyncio streams
+that keeps connections alive per host and limits how many requests run
+against one host at a time. A failed attempt (no response, a timeout or a
+5xx status) is retried with exponential backoff and jitter.
+"""
+import argparse
+import asyncio
+import random
+import re
+import ssl
+import sys
+import time
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from sqlalchemy import case, func, insert, select, update
+
+from config import (
+    UPTIME_CONCURRENCY,
+    UPTIME_PER_HOST_LIMIT,
+    UPTIME_TIMEOUT,
+    UPTIME_RETRIES,
+    UPTIME_RETRY_BACKOFF,
+    UPTIME_DEFAULT_INTERVAL,
+    UPTIME_TICK_SECONDS,
+    UPTIME_WINDOW_HOURS,
+    UPTIME_MAX_BODY_BYTES
+)
+from utils.db_utils import init_db, UptimeTarget, UptimeCheck
+
+USER_AGENT = "CodRon-Uptime/1.0"
+
+# Redirects followed by the SEO analysis
+MAX_REDIRECTS = 5
+
+# Longest status line or header line accepted from a server
+_MAX_LINE_BYTES = 16 * 1024
+
+class HttpError(Exception):
+    """Raised for responses that are not valid HTTP/1.x"""
+
+class HttpPool:
+    """Keep-alive HTTP/1.1 connections, pooled per (scheme, host, port).
+
+    At most ``per_host`` requests run against one host at a time, so the
+    pool never holds more than that many connections per host either.
+    """
+
+    def __init__(self, per_host=UPTIME_PER_HOST_LIMIT, timeout=UPTIME_TIMEOUT, max_body=UPTIME_MAX_BODY_BYTES):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_body = max_body
+        # (scheme, host, port) -> idle (reader, writer) pairs
+        self._idle = {}
+        self._limits = {}
+        self._ssl_context = None
+        self.stats = {"requests": 0, "connections": 0, "reused": 0}
+
+    async def request(self, url, method="GET"):
+        """(status, headers, body) of one request; header names are lowercase.
+
+        The body is cut off after ``max_body`` bytes. Raises OSError,
+        asyncio.TimeoutError or HttpError if no valid response arrives
+        within ``timeout`` seconds.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Not an http(s) URL: {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host = parts.netloc.rsplit("@", 1)[-1]
+        payload = (
+            f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+            "Accept: */*\r\nAccept-Encoding: identity\r\n\r\n"
+        ).encode("latin-1")
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.per_host))
+        async with limit:
+            self.stats["requests"] += 1
+            return await asyncio.wait_for(self._send(key, payload, method), self.timeout)
+
+    async def _send(self, key, payload, method):
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            reader, writer = idle.pop()
+            if writer.is_closing() or reader.at_eof():
+                writer.close()
+                continue
+            try:
+                response = await self._exchange(key, reader, writer, payload, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed the idle connection first; try a fresh one
+                continue
+            self.stats["reused"] += 1
+            return response
+        reader, writer = await asyncio.open_connection(
+            key[1], key[2], ssl=self._ssl() if key[0] == "https" else None
+        )
+        self.stats["connections"] += 1
+        return await self._exchange(key, reader, writer, payload, method)
+
+    async def _exchange(self, key, reader, writer, payload, method):
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status, headers, body, keep_alive = await _read_response(reader, method, self.max_body)
+        except BaseException:
+            # Includes the cancellation by wait_for: the connection may be mid-response
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle[key].append((reader, writer))
+        else:
+            writer.close()
+        return status, headers, body
+
+    def _ssl(self):
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    async def close(self):
+        writers = [writer for connections in self._idle.values() for _, writer in connections]
+        self._idle.clear()
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+
+async def _read_line(reader):
+    line = await reader.readuntil(b"\n")
+    if len(line) > _MAX_LINE_BYTES:
+        raise HttpError("Header line too long")
+    return line.rstrip(b"\r\n").decode("latin-1")
+
+async def _read_response(reader, method, max_body):
+    """(status, headers, body, keep_alive) of one response on a connection"""
+    try:
+        while True:
+            status_line = await _read_line(reader)
+            match = re.match(r"HTTP/1\.(\d) (\d{3})", status_line)
+            if not match:
+                raise HttpError(f"Bad status line: {status_line[:80]!r}")
+            status = int(match.group(2))
+            headers = {}
+            while True:
+                line = await _read_line(reader)
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            # 1xx responses are followed by the real one
+            if not 100 <= status < 200:
+                break
+    except asyncio.LimitOverrunError:
+        raise HttpError("Header line too long")
+
+    keep_alive = match.group(1) == "1" and headers.get("connection", "").lower() != "close"
+    if method == "HEAD" or status in (204, 304):
+        return status, headers, b"", keep_alive
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await _read_line(reader)).split(";", 1)[0], 16)
+            if size == 0:
+                while await _read_line(reader):
+                    pass
+                break
+            chunk = await reader.readexactly(size + 2)
+            body += chunk[:-2]
+            if len(body) > max_body:
+                return status, headers, bytes(body[:max_body]), False
+        return status, headers, bytes(body), keep_alive
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length > max_body:
+            return status, headers, await reader.readexactly(max_body), False
+        return status, headers, await reader.readexactly(length), keep_alive
+    # Delimited by the end of the connection
+    return status, headers, await reader.read(max_body), False
+
+async def check_url(pool, url, retries=UPTIME_RETRIES, backoff=UPTIME_RETRY_BACKOFF):
+    """Check one URL, retrying failures. Returns an uptime_checks row without target_id."""
+    checked_at = datetime.now()
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        start = time.perf_counter()
+        try:
+            status, _, _ = await pool.request(url, "GET")
+            error = f"HTTP {status}" if status >= 400 else None
+        except asyncio.TimeoutError:
+            status, error = None, f"Timed out after {pool.timeout} s"
+        except (OSError, EOFError, HttpError, ValueError, asyncio.LimitOverrunError) as exc:
+            # EOFError is a connection closed mid-response
+            status, error = None, (str(exc) or type(exc).__name__)[:255]
+        # Client errors are an answer from a working server; only retry
+        # when there was no answer or the server failed
+        if status is not None and status < 500:
+            break
+    return {
+        "checked_at": checked_at,
+        "ok": status is not None and status < 400,
+        "status_code": status,
+        "response_ms": (time.perf_counter() - start) * 1000,
+        "attempts": attempt + 1,
+        "error": error
+    }
+
+async def check_urls(urls, pool=None, concurrency=UPTIME_CONCURRENCY, **options):
+    """Check many URLs concurrently, results in the order of ``urls``"""
+    own_pool = pool is None
+    pool = pool or HttpPool()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def limited(url):
+        async with limit:
+            return await check_url(pool, url, **options)
+
+    try:
+        return await asyncio.gather(*(limited(url) for url in urls))
+    finally:
+        if own_pool:
+            await pool.close()
+
+def add_target(url, interval_seconds=UPTIME_DEFAULT_INTERVAL, engine=None):
+    """Start checking a URL, or change its interval if it is checked already"""
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise ValueError("The URL must start with http:// or https://")
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        updated = conn.execute(
+            update(UptimeTarget).where(UptimeTarget.url == url)
+            .values(interval_seconds=interval_seconds, enabled=True)
+        ).rowcount
+        if not updated:
+            conn.execute(insert(UptimeTarget).values(
+                url=url, interval_seconds=interval_seconds, enabled=True, created_at=datetime.now()
+            ))
+
+def remove_target(target_id, engine=None):
+    """Stop checking a target. Its past results are kept."""
+    engine = engine or init_db()
+    with engine.begin() as conn:
+        conn.execute(update(UptimeTarget).where(UptimeTarget.id == target_id).values(enabled=False))
+
+def _due_targets(engine, now, due_only=True):
+    query = (
+        select(UptimeTarget.id, UptimeTarget.url, UptimeTarget.interval_seconds)
+        .where(UptimeTarget.enabled.is_(True))
+    )
+    if due_only:
+        query = query.where((UptimeTarget.next_check_at.is_(None)) | (UptimeTarget.next_check_at <= now))
+    with engine.connect() as conn:
+        return conn.execute(query).all()
+
+def _store_results(engine, targets, results, now):
+    """Append check results and schedule each target's next check, in one transaction"""
+    with engine.begin() as conn:
+        conn.execute(insert(UptimeCheck), [
+            dict(result, target_id=target.id) for target, result in zip(targets, results)
+        ])
+        # Targets checked together with the same interval are due together
+        # again, so one UPDATE per interval schedules them all
+        by_interval = {}
+        for target in targets:
+            by_interval.setdefault(target.interval_seconds, []).append(target.id)
+        for interval, ids in by_interval.items():
+            conn.execute(
+                update(UptimeTarget).where(UptimeTarget.id.in_(ids))
+                .values(next_check_at=now + timedelta(seconds=interval))
+            )
+
+async def run_due_checks(engine=None, pool=None, now=None, due_only=True):
+    """Check every target that is due and store the results. Returns the number checked.
+
+    With ``due_only=False`` every enabled target is checked right away.
+    """
+    engine = engine or await asyncio.to_thread(init_db)
+    now = now or datetime.now()
+    targets = await asyncio.to_thread(_due_targets, engine, now, due_only)
+    if not targets:
+        return 0
+    results = await check_urls([target.url for target in targets], pool)
+    await asyncio.to_thread(_store_results, engine, targets, results, now)
+    return len(targets)
+
+async def run_scheduler(engine=None, tick=UPTIME_TICK_SECONDS):
+    """Check due targets forever, with one connection pool for all rounds"""
+    engine = engine or await asyncio.to_thread(init_db)
+    pool = HttpPool()
+    try:
+        while True:
+            started = time.perf_counter()
+            checked = await run_due_checks(engine, pool)
+            if checked:
+                print(f"Checked {checked:,} targets in {time.perf_counter() - started:.1f} s")
+            await asyncio.sleep(max(0.0, tick - (time.perf_counter() - started)))
+    finally:
+        await pool.close()
+
+def get_uptime_summary(session, hours=UPTIME_WINDOW_HOURS, now=None):
+    """Share of successful checks in the last ``hours`` and the ``hours`` before.
+
+    Returns {"uptime": percent or None, "previous": percent or None,
+    "checks": checks in the last period}; None means no checks.
+    """
+    now = now or datetime.now()
+    period = timedelta(hours=hours)
+    current = UptimeCheck.checked_at >= now - period
+    row = session.execute(
+        select(
+            func.count().filter(current),
+            func.sum(case((UptimeCheck.ok, 1), else_=0)).filter(current),
+            func.count().filter(~current),
+            func.sum(case((UptimeCheck.ok, 1), else_=0)).filter(~current)
+        ).where(UptimeCheck.checked_at >= now - 2 * period, UptimeCheck.checked_at < now)
+    ).one()
+    checks, ok, previous_checks, previous_ok = row
+    return {
+        "uptime": 100.0 * ok / checks if checks else None,
+        "previous": 100.0 * previous_ok / previous_checks if previous_checks else None,
+        "checks": checks
+    }
+
+def get_target_status(session, hours=UPTIME_WINDOW_HOURS, now=None):
+    """Every enabled target with its latest check and uptime over the last ``hours``"""
+    since = (now or datetime.now()) - timedelta(hours=hours)
+    latest = (
+        select(UptimeCheck.target_id, func.max(UptimeCheck.id).label("check_id"))
+        .group_by(UptimeCheck.target_id)
+        .subquery()
+    )
+    window = (
+        select(
+            UptimeCheck.target_id,
+            func.count().label("checks"),
+            func.sum(case((UptimeCheck.ok, 1), else_=0)).label("ok")
+        )
+        .where(UptimeCheck.checked_at >= since)
+        .group_by(UptimeCheck.target_id)
+        .subquery()
+    )
+    rows = session.execute(
+        select(
+            UptimeTarget.id,
+            UptimeTarget.url,
+            UptimeTarget.interval_seconds,
+            UptimeCheck.checked_at,
+            UptimeCheck.ok,
+            UptimeCheck.status_code,
+            UptimeCheck.response_ms,
+            UptimeCheck.error,
+            window.c.checks,
+            window.c.ok
+        )
+        .outerjoin(latest, latest.c.target_id == UptimeTarget.id)
+        .outerjoin(UptimeCheck, UptimeCheck.id == latest.c.check_id)
+        .outerjoin(window, window.c.target_id == UptimeTarget.id)
+        .where(UptimeTarget.enabled.is_(True))
+        .order_by(UptimeTarget.url)
+    ).all()
+    return [
+        {
+            "id": row[0],
+            "url": row[1],
+            "interval_seconds": row[2],
+            "checked_at": row[3],
+            "ok": row[4],
+            "status_code": row[5],
+            "response_ms": row[6],
+            "error": row[7],
+            "uptime": 100.0 * row[9] / row[8] if row[8] else None
+        }
+        for row in rows
+    ]
+
+class _SeoParser(HTMLParser):
+    """Collects the tags an SEO check looks at"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.meta = {}
+        self.canonical = None
+        self.h1_count = 0
+        self.images_without_alt = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "title" and self.title is None:
+            self._in_title = True
+            self.title = ""
+        elif tag == "meta" and attrs.get("name"):
+            self.meta[attrs["name"].lower()] = attrs.get("content") or ""
+        elif tag == "link" and "canonical" in (attrs.get("rel") or "").lower().split():
+            self.canonical = attrs.get("href")
+        elif tag == "h1":
+            self.h1_count += 1
+        elif tag == "img" and not attrs.get("alt"):
+            self.images_without_alt += 1
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+async def analyze_seo(url, pool=None):
+    """Fetch a page, following redirects, and report common on-page SEO issues"""
+    own_pool = pool is None
+    pool = pool or HttpPool()
+    try:
+        start = time.perf_counter()
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, body = await pool.request(url)
+            if status in (301, 302, 303, 307, 308) and headers.get("location"):
+                url = urljoin(url, headers["location"])
+                continue
+            break
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        if own_pool:
+            await pool.close()
+
+    charset = re.search(r"charset=([\w-]+)", headers.get("content-type", ""))
+    try:
+        html = body.decode(charset.group(1) if charset else "utf-8", errors="replace")
+    except LookupError:
+        html = body.decode("utf-8", errors="replace")
+    parser = _SeoParser()
+    parser.feed(html)
+    title = (parser.title or "").strip()
+    description = parser.meta.get("description", "").strip()
+
+    issues = []
+    if status >= 400:
+        issues.append(f"The page returned HTTP {status}")
+    if not urlsplit(url).scheme == "https":
+        issues.append("The page is not served over HTTPS")
+    if not title:
+        issues.append("Missing <title>")
+    elif not 10 <= len(title) <= 60:
+        issues.append(f"Title is {len(title)} characters; 10-60 is recommended")
+    if not description:
+        issues.append("Missing meta description")
+    elif not 50 <= len(description) <= 160:
+        issues.append(f"Meta description is {len(description)} characters; 50-160 is recommended")
+    if parser.h1_count != 1:
+        issues.append(f"{parser.h1_count} <h1> headings; one is recommended")
+    if "viewport" not in parser.meta:
+        issues.append("Missing viewport meta tag for mobile devices")
+    if not parser.canonical:
+        issues.append("Missing canonical link")
+    if parser.images_without_alt:
+        issues.append(f"{parser.images_without_alt} images without alt text")
+    if elapsed_ms > 2000:
+        issues.append(f"Slow response: {elapsed_ms:,.0f} ms")
+    return {
+        "url": url,
+        "status_code": status,
+        "response_ms": elapsed_ms,
+        "title": title,
+        "description": description,
+        "h1_count": parser.h1_count,
+        "canonical": parser.canonical,
+        "issues": issues
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.uptime", description="Website uptime checks.")
+    commands = parser.add_subparsers(dest="command")
+    add = commands.add_parser("add", help="start checking a URL")
+    add.add_argument("url")
+    add.add_argument("--interval", type=int, default=UPTIME_DEFAULT_INTERVAL,
+                     help=f"seconds between checks (default: {UPTIME_DEFAULT_INTERVAL})")
+    check = commands.add_parser("check", help="check URLs once without storing the results")
+    check.add_argument("urls", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        add_target(args.url, args.interval)
+        print(f"Checking {args.url} every {args.interval} s.")
+    elif args.command == "check":
+        for url, result in zip(args.urls, asyncio.run(check_urls(args.urls))):
+            outcome = "up" if result["ok"] else f"DOWN ({result['error']})"
+            print(f"{url}: {outcome}, {result['response_ms']:.0f} ms, {result['attempts']} attempts")
+    else:
+        try:
+            asyncio.run(run_scheduler())
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# utils/visit_explorer.py
+"""
+Keyset-paginated access to raw page visits.
+
+Instead of OFFSET, each page continues after the sort key of the last row of
+the previous page, so fetching page 10,000 costs the same as page 1 and the
+database only ever returns the rows that are shown. Visits moved to the
+Parquet archive (utils/archive.py) are merged in by the same sort key:
+
+    rows, cursor = fetch_page(session, filters)
+    rows, cursor = fetch_page(session, filters, after=cursor)  # next page
+
+    python -m utils.visit_explorer visits.csv  # export every visit as CSV
+"""
+import csv
+import io
+import itertools
+import sys
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Join
+
+from config import EXPLORER_PAGE_SIZE, EXPLORER_EXPORT_CHUNK_ROWS
+from utils.db_utils import PageVisit, VisitUrl, VisitPath, VisitReferrer, VisitDevice, VisitLocation
+from utils.analytics_queries import apply_filters, referrer_label
+from utils.archive import fetch_archived_page, has_archive
+
+COLUMNS = ["ID", "URL", "Path", "Referrer", "Device", "Location", "Timestamp"]
+
+# Sort option -> key columns. Every key ends in id so that it is unique, and
+# matches a page_visits index (SQLite indexes end in the rowid implicitly).
+# url and path sort by value, read in order from the dimension table.
+SORT_KEYS = {
+    "timestamp": (PageVisit.timestamp, PageVisit.id),
+    "url": (VisitUrl.value, PageVisit.timestamp, PageVisit.id),
+    "path": (VisitPath.value, PageVisit.timestamp, PageVisit.id)
+}
+
+# Dimension tables joined for display: (model, page_visits column, outer join)
+_DISPLAY_JOINS = [
+    (VisitUrl, PageVisit.url_id, False),
+    (VisitPath, PageVisit.path_id, False),
+    (VisitReferrer, PageVisit.referrer_id, True),
+    (VisitDevice, PageVisit.device_id, True),
+    (VisitLocation, PageVisit.location_id, True)
+]
+
+# Sort option -> positions of its key columns in COLUMNS
+SORT_KEY_POSITIONS = {
+    "timestamp": (6, 0),
+    "url": (1, 6, 0),
+    "path": (2, 6, 0)
+}
+
+class _CrossJoin(Join):
+    """A join whose left table SQLite keeps as the outer loop"""
+    inherit_cache = True
+
+@compiles(_CrossJoin)
+def _compile_cross_join(join, compiler, asfrom=False, from_linter=None, **kw):
+    # SQLCompiler.visit_join with the join keyword replaced
+    if from_linter:
+        from_linter.edges.update(itertools.product(join.left._from_objects, join.right._from_objects))
+    return (
+        join.left._compiler_dispatch(compiler, asfrom=True, from_linter=from_linter, **kw)
+        + " CROSS JOIN "
+        + join.right._compiler_dispatch(compiler, asfrom=True, from_linter=from_linter, **kw)
+        + " ON "
+        + join.onclause._compiler_dispatch(compiler, from_linter=from_linter, **kw)
+    )
+
+def _visits_from(sort):
+    """page_visits joined with the dimension tables it displays.
+
+    The inner joins are CROSS JOINs so that SQLite keeps the tables in the
+    order given, whatever its statistics say about the small dimension
+    tables: page_visits first, read in timestamp order through its index.
+    For url and path, the sort dimension comes first instead, so that
+    SQLite walks its values in order and each value's visits through the
+    (id, timestamp) index, instead of sorting every visit.
+    """
+    joins = _DISPLAY_JOINS
+    visits = PageVisit.__table__
+    if sort != "timestamp":
+        model, column, _ = next(join for join in joins if join[0].value is SORT_KEYS[sort][0])
+        visits = _CrossJoin(model.__table__, visits, model.id == column)
+        joins = [join for join in joins if join[0] is not model]
+    for model, column, outer in joins:
+        if outer:
+            visits = visits.join(model.__table__, model.id == column, isouter=True)
+        else:
+            visits = _CrossJoin(visits, model.__table__, model.id == column)
+    return visits
+
+def _visits_query(filters, sort, descending, after):
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    key = SORT_KEYS[sort]
+    if after is not None and sort == "timestamp":
+        # Rows past the cursor already satisfy the time bound on the cursor's
+        # side. Dropping it leaves SQLite one range to seek the index with.
+        filters = dict(filters or {})
+        filters.pop("end" if descending else "start", None)
+    query = select(
+        PageVisit.id,
+        VisitUrl.value.label("url"),
+        VisitPath.value.label("path"),
+        referrer_label(VisitReferrer.value).label("referrer"),
+        VisitDevice.value.label("device"),
+        VisitLocation.value.label("location"),
+        PageVisit.timestamp
+    ).select_from(_visits_from(sort))
+    query = apply_filters(query, filters)
+    if after is not None:
+        position = tuple_(*key)
+        # The redundant bound on the leading key column lets SQLite seek
+        # the index to the cursor
+        if descending:
+            query = query.where(key[0] <= after[0], position < tuple(after))
+        else:
+            query = query.where(key[0] >= after[0], position > tuple(after))
+    return query.order_by(*(column.desc() if descending else column.asc() for column in key))
+
+def _cursor(row, sort):
+    """Sort key values of a row, to continue the next page after it"""
+    return tuple(row[position] for position in SORT_KEY_POSITIONS[sort])
+
+def fetch_page(session, filters=None, sort="timestamp", descending=True, after=None, page_size=EXPLORER_PAGE_SIZE):
+    """One page of visits as plain tuples in COLUMNS order.
+
+    ``after`` is the cursor returned for the previous page. Returns
+    ``(rows, cursor)`` where ``cursor`` is None on the last page.
+    """
+    query = _visits_query(filters, sort, descending, after).limit(page_size + 1)
+    rows = [tuple(row) for row in session.execute(query).all()]
+    if has_archive(session):
+        # With a full page from page_visits, only archived rows that sort
+        # before its last row can make it onto the page
+        until = _cursor(rows[-1], sort) if len(rows) > page_size else None
+        rows += fetch_archived_page(session, filters, sort, descending, after, page_size + 1, until)
+        positions = SORT_KEY_POSITIONS[sort]
+        rows.sort(key=lambda row: tuple(row[position] for position in positions), reverse=descending)
+        rows = rows[:page_size + 1]
+    cursor = _cursor(rows[page_size - 1], sort) if len(rows) > page_size else None
+    return rows[:page_size], cursor
+
+def iter_csv(session, filters=None, sort="timestamp", descending=True, chunk_rows=EXPLORER_EXPORT_CHUNK_ROWS):
+    """Yield all matching visits as CSV text, one chunk of rows at a time.
+
+    Run inside a single session so the export reads one consistent snapshot.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(session, filters, sort, descending, after=cursor, page_size=chunk_rows)
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if cursor is None:
+            return
+
+def export_csv(session, file, filters=None, sort="timestamp", descending=True):
+    """Write all matching visits to a binary file as UTF-8 CSV"""
+    for chunk in iter_csv(session, filters, sort, descending):
+        file.write(chunk.encode("utf-8"))
+
+if __name__ == "__main__":
+    from utils.db_utils import init_db, session_scope
+
+    if len(sys.argv) != 2:
+        print("Usage: python -m utils.visit_explorer <output.csv>")
+        sys.exit(2)
+    init_db()
+    with session_scope() as session, open(sys.argv[1], "wb") as f:
+        export_csv(session, f)
+    print(f"Exported page visits to {sys.argv[1]}")
\ No newline at end of file
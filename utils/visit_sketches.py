@@ -0,0 +1,247 @@
+# utils/visit_sketches.py
+"""
+Unique visitor and top value sketches per day and site.
+
+For every (day, site) bucket page_visit_sketches keeps
+- a HyperLogLog of the visitors, identified by (ip_address, user_agent)
+- Space-Saving summaries of the most visited paths and referrers, with
+  Count-Min sketches that tighten their counts
+
+They are folded in the same transaction as the rollups (utils/rollups.py),
+so they cover exactly the visits below the rollup watermark, archived
+visits included. Any range of days is answered by merging its buckets,
+without reading single visits. The error bounds are set in config.py.
+
+    python -m utils.visit_sketches    # compare the sketches with exact counts
+"""
+import struct
+import sys
+import zlib
+from datetime import timedelta
+from sqlalchemy import select, text
+
+from config import SKETCH_HLL_PRECISION, SKETCH_TOP_K, SKETCH_CMS_EPSILON, SKETCH_CMS_DELTA
+from utils.db_utils import VisitSketch, init_db
+from utils.sketches import HyperLogLog, CountMinSketch, SpaceSaving, hash_values
+
+class TopValues:
+    """Most frequent values: Space-Saving picks them, Count-Min caps their counts"""
+
+    def __init__(self, summary=None, counts=None):
+        self.summary = summary or SpaceSaving(SKETCH_TOP_K)
+        self.counts = counts or CountMinSketch.from_error(SKETCH_CMS_EPSILON, SKETCH_CMS_DELTA)
+
+    def add(self, values, counts):
+        self.summary.add(values, counts)
+        self.counts.add(values, counts)
+
+    def merge(self, other):
+        self.summary.merge(other.summary)
+        self.counts.merge(other.counts)
+        return self
+
+    def top(self, n=None):
+        """(value, estimate, lower bound) of the n most frequent values, most frequent first"""
+        import numpy as np
+
+        candidates = self.summary.top()
+        capped = self.counts.estimate(np.array([value for value, _, _ in candidates], dtype=object))
+        items = [
+            (value, min(count, int(cap)), count - error)
+            for (value, count, error), cap in zip(candidates, capped)
+        ]
+        items.sort(key=lambda item: (-item[1], item[0]))
+        return items[:n]
+
+    def to_bytes(self):
+        summary = self.summary.to_bytes()
+        return zlib.compress(struct.pack("<I", len(summary)) + summary + self.counts.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        (length,) = struct.unpack_from("<I", data)
+        return cls(SpaceSaving.from_bytes(data[4:4 + length]), CountMinSketch.from_bytes(data[4 + length:]))
+
+class VisitSketches:
+    """Sketches of the visits in one bucket, or merged over several"""
+
+    def __init__(self):
+        self.visits = 0
+        self.visitors = HyperLogLog(SKETCH_HLL_PRECISION)
+        self.paths = TopValues()
+        self.referrers = TopValues()
+
+    def add(self, frame, visitor_hashes):
+        """Add visits given as a DataFrame with path and referrer columns"""
+        self.visits += len(frame)
+        self.visitors.add_hashes(visitor_hashes)
+        for column, top in (("path", self.paths), ("referrer", self.referrers)):
+            counts = frame[column].value_counts()
+            top.add(counts.index.to_numpy(dtype=object), counts.to_numpy())
+
+    def merge(self, other):
+        self.visits += other.visits
+        self.visitors.merge(other.visitors)
+        self.paths.merge(other.paths)
+        self.referrers.merge(other.referrers)
+        return self
+
+    def to_row(self):
+        return {
+            "visits": self.visits,
+            "visitors": zlib.compress(self.visitors.to_bytes()),
+            "paths": self.paths.to_bytes(),
+            "referrers": self.referrers.to_bytes()
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        sketches = cls()
+        sketches.visits = row.visits
+        sketches.visitors = HyperLogLog.from_bytes(zlib.decompress(row.visitors))
+        sketches.paths = TopValues.from_bytes(row.paths)
+        sketches.referrers = TopValues.from_bytes(row.referrers)
+        return sketches
+
+def _fold_frame(conn, frame):
+    """Merge visits into their stored buckets.
+
+    ``frame`` has day (YYYY-MM-DD), url, path, referrer, ip_address and
+    user_agent columns.
+    """
+    from utils.analytics_queries import DIRECT_REFERRER
+
+    if frame.empty:
+        return
+    frame = frame.assign(referrer=frame["referrer"].fillna("").replace("", DIRECT_REFERRER))
+    # One string per visitor: pandas' combined hash of several columns
+    # mixes its high bits poorly, and HyperLogLog picks registers by them
+    visitor_hashes = hash_values(
+        (frame["ip_address"].fillna("") + "\x1f" + frame["user_agent"].fillna("")).to_numpy(dtype=object)
+    )
+    for (day, url), positions in frame.groupby(["day", "url"], sort=False).indices.items():
+        sketches = VisitSketches()
+        sketches.add(frame.iloc[positions], visitor_hashes[positions])
+        stored = conn.execute(
+            select(VisitSketch.visits, VisitSketch.visitors, VisitSketch.paths, VisitSketch.referrers)
+            .where(VisitSketch.day == day, VisitSketch.url == url)
+        ).first()
+        if stored is not None:
+            sketches.merge(VisitSketches.from_row(stored))
+        conn.execute(
+            text("""
+                INSERT INTO page_visit_sketches (day, url, visits, visitors, paths, referrers)
+                VALUES (:day, :url, :visits, :visitors, :paths, :referrers)
+                ON CONFLICT (day, url) DO UPDATE SET
+                    visits = excluded.visits, visitors = excluded.visitors,
+                    paths = excluded.paths, referrers = excluded.referrers
+            """),
+            {"day": day, "url": url, **sketches.to_row()}
+        )
+
+def fold_visits(conn, low, high):
+    """Add page_visits rows with low < id <= high to their buckets"""
+    import pandas as pd
+
+    # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' text, so the day
+    # is a prefix; substr() is much cheaper than date() per row
+    rows = conn.execute(
+        text("""
+            SELECT substr(v.timestamp, 1, 10) AS day, u.value AS url, p.value AS path, r.value AS referrer,
+                   v.ip_address, a.value AS user_agent
+            FROM page_visits AS v
+            JOIN visit_urls AS u ON u.id = v.url_id
+            JOIN visit_paths AS p ON p.id = v.path_id
+            LEFT JOIN visit_referrers AS r ON r.id = v.referrer_id
+            LEFT JOIN visit_user_agents AS a ON a.id = v.user_agent_id
+            WHERE v.id > :low AND v.id <= :high
+        """),
+        {"low": low, "high": high}
+    )
+    _fold_frame(conn, pd.DataFrame(rows.all(), columns=list(rows.keys())))
+
+def fold_archive(conn):
+    """Add all archived visits to their buckets, one file at a time"""
+    import pyarrow.compute as pc
+    from utils.archive import _archive_files, _read
+
+    for file in _archive_files(conn):
+        table = _read([file], columns=["url", "path", "referrer", "ip_address", "user_agent", "timestamp"])
+        day = pc.strftime(table["timestamp"], format="%Y-%m-%d")
+        _fold_frame(conn, table.drop_columns(["timestamp"]).append_column("day", day).to_pandas())
+
+def merged_sketches(conn, filters=None):
+    """Sketches of the visits matching the url, start and end filters.
+
+    Other filters are ignored. Like utils.analytics_queries.visit_counts,
+    start and end apply at day granularity.
+    """
+    filters = filters or {}
+    query = select(VisitSketch.visits, VisitSketch.visitors, VisitSketch.paths, VisitSketch.referrers)
+    if filters.get("url"):
+        query = query.where(VisitSketch.url == filters["url"])
+    if filters.get("start") is not None:
+        query = query.where(VisitSketch.day >= filters["start"].date().isoformat())
+    if filters.get("end") is not None:
+        # end is exclusive
+        query = query.where(VisitSketch.day <= (filters["end"] - timedelta(microseconds=1)).date().isoformat())
+    merged = VisitSketches()
+    for row in conn.execute(query):
+        merged.merge(VisitSketches.from_row(row))
+    return merged
+
+def check_sketches(engine=None, top=10):
+    """Compare the sketches of every site's full history with exact counts.
+
+    Prints the estimates next to the exact values and returns the number of
+    estimates outside their error bounds. Unique visitors are allowed three
+    standard errors, and at least three visitors: a few visitors can share
+    a register in small buckets.
+    """
+    import pandas as pd
+    from utils.analytics_queries import DIRECT_REFERRER
+    from utils.archive import _archive_files, _read
+
+    engine = engine or init_db()
+    columns = ["url", "path", "referrer", "ip_address", "user_agent"]
+    with engine.connect() as conn:
+        watermark = conn.execute(text("SELECT last_visit_id FROM rollup_state WHERE name = 'page_visits'")).scalar()
+        frames = [pd.DataFrame(
+            conn.execute(
+                text(f"SELECT {', '.join(columns)} FROM page_visit_details WHERE id <= :watermark"),
+                {"watermark": watermark or 0}
+            ).all(),
+            columns=columns
+        )]
+        frames += [_read([file], columns=columns).to_pandas() for file in _archive_files(conn)]
+        visits = pd.concat(frames, ignore_index=True)
+        visits["referrer"] = visits["referrer"].fillna("").replace("", DIRECT_REFERRER)
+        visits[["ip_address", "user_agent"]] = visits[["ip_address", "user_agent"]].fillna("")
+
+        failures = 0
+        for url, site in visits.groupby("url"):
+            sketches = merged_sketches(conn, {"url": url})
+            exact = len(site.drop_duplicates(["ip_address", "user_agent"]))
+            estimate = sketches.visitors.count()
+            allowed = max(3 * 1.04 / len(sketches.visitors.registers) ** 0.5 * exact, 3)
+            ok = abs(estimate - exact) <= allowed
+            failures += not ok
+            print(f"{url}: {sketches.visits:,} visits, {estimate:,} unique visitors (exact {exact:,})"
+                  f"{'' if ok else ' OUT OF BOUNDS'}")
+            for column, top_values in (("path", sketches.paths), ("referrer", sketches.referrers)):
+                counts = site[column].value_counts()
+                for value, count, lower in top_values.top(top):
+                    ok = lower <= counts.get(value, 0) <= count
+                    failures += not ok
+                    print(f"    {column} {value}: {count:,} (exact {counts.get(value, 0):,})"
+                          f"{'' if ok else ' OUT OF BOUNDS'}")
+    return failures
+
+if __name__ == "__main__":
+    from utils.rollups import refresh_rollups
+
+    refresh_rollups()
+    failures = check_sketches()
+    print(f"\n{failures} estimate{'' if failures == 1 else 's'} outside their error bounds")
+    sys.exit(1 if failures else 0)